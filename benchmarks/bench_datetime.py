@@ -0,0 +1,41 @@
+"""日期时间解析的微基准：对比dateutil.parser.parse（旧实现）与models.DatetimeParser
+
+分别测试每次都是新字符串（不命中缓存，只靠fromisoformat/学到的格式）和重复字符串（命中LRU缓存）两种情况。
+运行方式（项目根目录）: python benchmarks/bench_datetime.py
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'gettnship')]
+
+from dateutil import parser
+
+from sf_spider.items.models import DatetimeParser
+
+START = datetime(2025, 9, 18, 8, 15, 32)
+# 接口中常见的两种写法：ISO格式和美式12小时制
+FORMATS = {'ISO格式': '%Y-%m-%d %H:%M:%S', '美式格式': '%m/%d/%Y %I:%M %p'}
+
+
+def main(count=20000):
+    for label, fmt in FORMATS.items():
+        values = [(START + timedelta(seconds=61 * index)).strftime(fmt) for index in range(count)]
+        fast = DatetimeParser(memo_size=count)
+        uncached = DatetimeParser(memo_size=1)
+        assert [fast(value) for value in values] == [parser.parse(value) for value in values]
+
+        cases = [
+            ('dateutil', lambda: [parser.parse(value) for value in values]),
+            ('DatetimeParser', lambda: [uncached(value) for value in values]),
+            ('DatetimeParser(缓存命中)', lambda: [fast(value) for value in values]),
+        ]
+        for name, func in cases:
+            seconds = min(timeit.repeat(func, number=1, repeat=5))
+            print(f"[{label}] {name}: {seconds / count * 1e6:.2f} 微秒/条")
+
+
+if __name__ == '__main__':
+    main()
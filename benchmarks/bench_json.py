@@ -0,0 +1,78 @@
+"""JSON序列化的微基准：对比标准库json与orjson在每条数据上的开销
+
+覆盖的场景：jsonb字段序列化、登录cookies序列化和Redis任务解码。
+任务去重指纹固定使用标准库json（与JSON_SERIALIZER无关），不在此对比。
+运行方式（项目根目录）: python benchmarks/bench_json.py
+"""
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'gettnship')]
+
+from sf_spider import serializers
+
+# 接口返回的一条典型运单数据（作为jsonb字段保存时的大小）
+SHIPMENT = {
+    'batch_id': 2025091812,
+    'hash_id': '9f2c1d7e4b6a8c0d2e4f6a8b0c2d4e6f',
+    'platform': 'gettnship',
+    'carrier': 'ups-v2',
+    'label_created': '2025-09-18 08:15:32',
+    'expected_delivery': '2025-09-22',
+    'zip_code': '34109',
+    'tracking_number': '1Z999AA10123456784',
+    'update_date': '2025-09-19 21:40:05',
+    'status_category': 'In Transit',
+    'status': 'Departed from Facility',
+    'origin_city': 'Naples',
+    'destination_city': 'Los Angeles',
+    'events': [
+        {'time': f'2025-09-1{day} 0{day}:00:00', 'location': '洛杉矶, CA', 'description': 'Arrived at Facility'}
+        for day in range(8)
+    ],
+}
+
+# 登录后保存的cookies
+COOKIES = [
+    {'name': f'cookie_{index}', 'value': 'x' * 64, 'domain': '.gettnship.com', 'path': '/',
+     'expires': 1790000000.5, 'httpOnly': True, 'secure': True, 'sameSite': 'Lax'}
+    for index in range(12)
+]
+
+# Redis队列中的一条任务
+TASK = {
+    'batch_id': 202509181,
+    'config_key': 'gettnship_user_money',
+    'carrier': 'ups-v2',
+    'zip_code': '34109',
+    'start_date_1': '2025-09-15',
+    'start_date_2': '2025-09-18',
+}
+TASK_DATA = json.dumps(TASK, ensure_ascii=False).encode('utf-8')
+
+
+def main(number=20000):
+    backends = [serializers.StdlibJSONSerializer()]
+    if serializers.orjson is not None:
+        backends.append(serializers.OrjsonSerializer())
+    else:
+        print("未安装orjson，只测试标准库json")
+
+    cases = [
+        ('jsonb字段', lambda: json.dumps(SHIPMENT, ensure_ascii=False), lambda s: s.dumps(SHIPMENT)),
+        ('登录cookies', lambda: json.dumps(COOKIES, ensure_ascii=False, indent=2), lambda s: s.dumps(COOKIES)),
+        ('任务解码', lambda: json.loads(TASK_DATA.decode('utf-8')), lambda s: s.loads(TASK_DATA)),
+    ]
+    for label, legacy, func in cases:
+        seconds = min(timeit.repeat(legacy, number=number, repeat=5))
+        print(f"[{label}] 旧实现: {seconds / number * 1e6:.2f} 微秒/条")
+        for backend in backends:
+            seconds = min(timeit.repeat(lambda: func(backend), number=number, repeat=5))
+            print(f"[{label}] {backend.name}: {seconds / number * 1e6:.2f} 微秒/条")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""记录类的微基准：对比scrapy Item与record_class生成的记录在创建和Pipeline取值上的开销
+
+运行方式（项目根目录）: python benchmarks/bench_records.py
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'gettnship'), os.path.join(ROOT, 'benchmarks')]
+
+from bench_validation import SHIPMENT
+from gettnship.items.shipments import GettnshipShipmentsItem, GettnshipShipmentsRecord
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+
+def memory_per_object(factory, count=10000):
+    """创建count个对象后平均每个对象占用的内存（字节）"""
+    tracemalloc.start()
+    objects = [factory() for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return size / count
+
+
+def main(number=20000):
+    pipeline = UniversalPostgreSQLPipeline()
+    for name, cls in (('scrapy Item', GettnshipShipmentsItem), ('记录类', GettnshipShipmentsRecord)):
+        item = cls(**SHIPMENT)
+        assert pipeline._prepare_rows(item, None)[2][0] == pipeline._prepare_rows(GettnshipShipmentsItem(**SHIPMENT), None)[2][0]
+        seconds = min(timeit.repeat(lambda: cls(**SHIPMENT), number=number, repeat=5))
+        print(f"[{name}] 创建: {seconds / number * 1e6:.2f} 微秒/条")
+        seconds = min(timeit.repeat(lambda: pipeline._prepare_rows(item, None), number=number, repeat=5))
+        print(f"[{name}] Pipeline取值: {seconds / number * 1e6:.2f} 微秒/条")
+        print(f"[{name}] 内存: {memory_per_object(lambda: cls(**SHIPMENT)):.0f} 字节/条")
+
+
+if __name__ == '__main__':
+    main()
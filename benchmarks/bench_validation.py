@@ -0,0 +1,109 @@
+"""Item字段验证的微基准：对比逐字段查询字段定义（旧实现）与写入前按列验证整个批次（含process_item取出数据行的开销）
+
+运行方式（项目根目录）: python benchmarks/bench_validation.py
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'gettnship')]
+
+from gettnship.items.shipments import GettnshipShipmentsItem
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+# 接口返回的一条典型运单数据
+SHIPMENT = {
+    'batch_id': 2025091812,
+    'hash_id': '9f2c1d7e4b6a8c0d2e4f6a8b0c2d4e6f',
+    'platform': 'gettnship',
+    'carrier': 'ups-v2',
+    'label_created': '2025-09-18 08:15:32',
+    'expected_delivery': '2025-09-22',
+    'zip_code': '34109',
+    'tracking_number_reality': '1Z999AA10123456784',
+    'tracking_number': '1Z999AA10123456784',
+    'shipped_date': '2025-09-18 10:02:11',
+    'weight': '2.5 LBS',
+    'update_date': '2025-09-19 21:40:05',
+    'status_category': 'In Transit',
+    'status': 'Departed from Facility',
+    'origin_state': 'FL',
+    'origin_country': 'US',
+    'origin_city': 'Naples',
+    'destination_state': 'CA',
+    'destination_city': 'Los Angeles',
+    'dest_country': 'US',
+    'delivery_proof': '',
+    'class_of_mail_code': 'GND',
+}
+
+
+def legacy_validate(item):
+    """旧实现：每个Item逐字段查询字段定义"""
+    validated_data = {}
+    for field_name in item.fields:
+        field = item.fields[field_name]
+        value = item.get(field_name)
+        if value is None:
+            if field.get('required', False):
+                raise ValueError(f"字段 {field_name} 为必填项")
+            if 'default' in field:
+                value = field['default']
+            elif 'default_factory' in field:
+                value = field['default_factory']()
+            else:
+                validated_data[field_name] = None
+                continue
+        expected_type = field.get('type')
+        if expected_type and not isinstance(value, expected_type):
+            if value is None and field.get('null', True):
+                pass
+            else:
+                parser_func = field.get('parser_func')
+                if parser_func and isinstance(value, str):
+                    value = parser_func(value)
+                    if not isinstance(value, expected_type):
+                        raise ValueError(f"解析后的值类型应为{expected_type.__name__}")
+                else:
+                    value = expected_type(value)
+        max_length = field.get('max_length')
+        if max_length:
+            if isinstance(value, (str, list, dict)) and len(value) > max_length:
+                raise ValueError(f"字段 {field_name} 超过限制")
+        validated_data[field_name] = value
+    return validated_data
+
+
+def legacy_is_valid_database_item(item):
+    required_attrs = ['TABLE', 'AUTO_CREATE_TABLE', 'ADD_AUTO_INCREMENT_ID', 'INDEXES', 'UNIQUE_CONSTRAINTS']
+    return all(hasattr(item, attr) for attr in required_attrs)
+
+
+def main(number=20000, batch_size=100):
+    pipeline = UniversalPostgreSQLPipeline()
+    raw_item = GettnshipShipmentsItem(**SHIPMENT)
+    # 日期已解析的数据，用于单独衡量验证本身的开销（不含dateutil解析）
+    parsed_item = GettnshipShipmentsItem(**legacy_validate(raw_item))
+
+    for label, item in (('原始数据', raw_item), ('日期已解析', parsed_item)):
+        seconds = min(timeit.repeat(
+            lambda: (legacy_is_valid_database_item(item), legacy_validate(item)), number=number, repeat=5,
+        ))
+        print(f"[{label}] 旧实现: {seconds / number * 1e6:.2f} 微秒/条")
+
+        # 按列验证：process_item只取出原始数据行，整个批次在写入前一次验证
+        rows = [pipeline._prepare_rows(item, None)[2][0] for _ in range(batch_size)]
+        validated, errors = pipeline._validate_rows(GettnshipShipmentsItem, rows)
+        assert not errors and dict(zip(pipeline.item_columns[GettnshipShipmentsItem], validated[0])) == legacy_validate(item)
+        seconds = min(timeit.repeat(
+            lambda: (
+                [pipeline._prepare_rows(item, None) for _ in range(batch_size)],
+                pipeline._validate_rows(GettnshipShipmentsItem, rows),
+            ),
+            number=number // batch_size, repeat=5,
+        ))
+        print(f"[{label}] 按列验证: {seconds / number * 1e6:.2f} 微秒/条")
+
+if __name__ == '__main__':
+    main()
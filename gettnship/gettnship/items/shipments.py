@@ -4,10 +4,9 @@
 # https://docs.scrapy.org/en/latest/topics/items.html
 import datetime
 
-from dateutil import parser
-
 from sf_spider.items.items import BaseItem
 from sf_spider.items import models
+from sf_spider.items.records import record_class
 
 
 class GettnshipShipmentsItem(BaseItem):
@@ -21,22 +20,35 @@ class GettnshipShipmentsItem(BaseItem):
     # 索引和约束配置
     # INDEXES = ['label_created', 'expected_delivery', 'carrier']
     # UNIQUE_CONSTRAINTS = [['tracking_number', 'hash_id']]  # 运单号和哈希ID组合唯一
-    parser_func_datetime = lambda str_data: parser.parse(str_data) if str_data else None
-    parser_func_date = lambda str_data: parser.parse(str_data).date() if str_data else None
+    # PARTITION_KEY = 'batch_id'  # 按批次ID范围分区（需要新建为分区表，可用 python -m sf_spider.schema 迁移）
+    # PARTITION_INTERVAL = 1000  # 每个分区1000个批次
+    # PARTITION_RETENTION = 30  # schema detach 时保留最近30个分区
+
+    # 写入配置：单个批次数据量大，使用COPY代替逐行INSERT
+    WRITE_MODE = 'copy'
+    COPY_FORMAT = 'text'  # 表非自动创建，列类型不保证与TYPE_MAPPING一致，使用text格式
+
+    # 最新状态：sf_spider_shipment_latest 每个运单号只保留一行当前状态，状态未变化的运单不再写入历史表
+    # （表非自动创建，状态表需提前执行 python -m sf_spider.schema apply 创建）
+    LATEST_STATE_KEY = 'tracking_number'
+    LATEST_STATE_FIELDS = ['status_category', 'status', 'update_date']
+    # 变化检测：重叠的查询窗口会重复返回相同的运单，内容（不含batch_id）未变化时在验证前跳过
+    CHANGE_KEY = ['tracking_number']
+    CHANGE_IGNORE_FIELDS = ['batch_id']
 
     batch_id = models.IntField(verbose_name='批次ID')
     hash_id = models.CharField(max_length=248, unique=True, default='', verbose_name='哈希ID')
     platform = models.CharField(max_length=32, blank=True, null=True, verbose_name='平台')
     carrier = models.CharField(max_length=32, blank=True, null=True, verbose_name='承运商')
-    label_created = models.DateTimeField(blank=True, null=True, verbose_name='标签创建时间', parser_func=parser_func_datetime)
-    expected_delivery = models.DateField(blank=True, null=True, verbose_name='预计送达时间', parser_func=parser_func_date)
+    label_created = models.DateTimeField(blank=True, null=True, verbose_name='标签创建时间', parser_func=models.DatetimeParser())
+    expected_delivery = models.DateField(blank=True, null=True, verbose_name='预计送达时间', parser_func=models.DatetimeParser(date_only=True))
     zip_code = models.CharField(max_length=10, blank=True, null=True, verbose_name='收件人邮编')
 
     tracking_number_reality = models.CharField(max_length=50, blank=True, null=True, verbose_name='运单号(实际)')
     tracking_number = models.CharField(max_length=50, blank=True, null=True, verbose_name='运单号')
-    shipped_date = models.DateTimeField(blank=True, null=True, verbose_name='发货时间', parser_func=parser_func_datetime)
+    shipped_date = models.DateTimeField(blank=True, null=True, verbose_name='发货时间', parser_func=models.DatetimeParser())
     weight = models.CharField(max_length=50, blank=True, null=True, verbose_name='重量')
-    update_date = models.DateTimeField(blank=True, null=True, verbose_name='更新时间', parser_func=parser_func_datetime)
+    update_date = models.DateTimeField(blank=True, null=True, verbose_name='更新时间', parser_func=models.DatetimeParser())
     status_category = models.CharField(max_length=50, blank=True, null=True, verbose_name='物流状态分类')
     status = models.CharField(max_length=50, blank=True, null=True, verbose_name='物流状态')
     origin_state = models.CharField(max_length=50, blank=True, null=True, verbose_name='出发州/省')
@@ -50,5 +62,5 @@ class GettnshipShipmentsItem(BaseItem):
     class_of_mail_code = models.CharField(max_length=100, blank=True, null=True, verbose_name='邮件类别代码')
 
 
-
-
+# 每个接口响应包含大量运单，爬虫yield轻量记录，Pipeline按GettnshipShipmentsItem的配置写入
+GettnshipShipmentsRecord = record_class(GettnshipShipmentsItem)
@@ -16,3 +16,10 @@ class GettnshipLoginPipeline(UniversalPostgreSQLPipeline):
 
 class GettnshipBatchPipeline(UniversalPostgreSQLPipeline):
     BATCH_SIZE = 100  # 批量插入大小
+    ASYNC_WRITE = True  # 后台线程写入，解析不等待数据库提交
+    BATCH_MAX_AGE = 60  # 队列空闲时最多缓存60秒
+    BATCH_MAX_BYTES = 4 * 1024 * 1024  # 缓存数据超过约4MB时写入
+    BISECT_ON_ERROR = True  # 个别行出错时只丢弃错误行
+    DEAD_LETTER_FILE = 'logs/gettnship_dead_letter.jsonl'
+    JOURNAL_DIR = 'logs/journal'  # 缓存数据落盘，进程重启或数据库断开后重放
+    # PROCESS_POOL_WORKERS = 2  # 字段验证和COPY编码放到工作进程，解析线程只缓存原始数据
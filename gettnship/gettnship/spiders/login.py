@@ -1,4 +1,3 @@
-import json
 import time
 from datetime import datetime
 
@@ -6,6 +5,7 @@ import httpx
 import scrapy
 from playwright.async_api import Page
 
+from sf_spider import serializers
 from sf_spider.actions.httpx_actions import HttpxAction
 from sf_spider.actions.playwright_actions import PlaywrightActions
 from sf_spider.base_spider import BaseSpider
@@ -103,7 +103,7 @@ class GettnshipLoginSpider(BaseSpider, PlaywrightActions, HttpxAction):
             await self.async_update_config(config_key=task['config_key'], value=user)
 
             # 输出结果
-            user['cookies'] = json.dumps(user['cookies'], ensure_ascii=False, indent=2)
+            user['cookies'] = serializers.dumps(user['cookies'])
             yield GettnshipLoginItem(**user)
         except Exception as e:
             raise ValueError(f'登录失败: {e}')
@@ -10,7 +10,8 @@ from sf_spider.actions.playwright_actions import PlaywrightActions
 from sf_spider.base_spider import BaseSpider
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
-from gettnship.items.shipments import GettnshipShipmentsItem
+from sf_spider.items.records import ItemBatch
+from gettnship.items.shipments import GettnshipShipmentsItem, GettnshipShipmentsRecord
 
 
 class GettnshipShipmentsSpider(BaseSpider, PlaywrightActions, HttpxAction):
@@ -78,12 +79,16 @@ class GettnshipShipmentsSpider(BaseSpider, PlaywrightActions, HttpxAction):
         task = response.meta['task']
         data = json.loads(response.text)
         shipments = data.get('data', {}).get('data', [])
+        # 一个响应中的全部运单打包为一个ItemBatch，只经过一次Pipeline
+        batch = ItemBatch(GettnshipShipmentsItem)
         for shipment in shipments:
             shipment.update(
                 zip_code=task['zip_code'],
                 batch_id=task['batch_id'],
             )
-            yield GettnshipShipmentsItem(**shipment)
+            batch.append(GettnshipShipmentsRecord(**shipment))
+        if batch:
+            yield batch
 
 
 if __name__ == '__main__':
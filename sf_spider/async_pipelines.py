@@ -0,0 +1,273 @@
+"""基于asyncio的PostgreSQL Pipeline（psycopg3异步驱动），写入与下载在同一事件循环中并发进行"""
+import asyncio
+import time
+from contextlib import contextmanager
+
+import psycopg
+from psycopg.types.json import Jsonb
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.defer import deferred_from_coro
+from scrapy.utils.reactor import is_asyncio_reactor_installed
+from twisted.internet import task
+
+from sf_spider import latest_state, partitions, serializers
+from sf_spider.items import records
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+
+class AsyncPostgreSQLPipeline(UniversalPostgreSQLPipeline):
+    """UniversalPostgreSQLPipeline的asyncio版本，需要使用asyncio reactor
+
+    Item的配置（TABLE、INDEXES、UNIQUE_CONSTRAINTS、AUTO_CREATE_TABLE、WRITE_MODE、ON_CONFLICT等）与同步版本相同。
+    process_item是协程：批次交给写入协程后立即返回，只有待写入批次超过WRITE_QUEUE_SIZE时才等待（背压）。
+    表结构检查频率很低，由写入协程在批次写入前放到线程中使用同步连接执行，不阻塞事件循环。
+    本地日志（JOURNAL_DIR）、二分定位错误行（BISECT_ON_ERROR）、暂存表写入（WRITE_MODE = 'staging'）
+    、最新状态表（LATEST_STATE_KEY）和进程池验证（PROCESS_POOL_WORKERS）仅同步版本支持；
+    重复执行的语句由psycopg3自动在服务端预编译，不需要USE_PREPARED_STATEMENTS。
+    不支持的写入方式在启动时（settings）或首次收到该Item类时给出警告，改为upsert（配置了ON_CONFLICT）或insert。
+    """
+    SUPPORTED_WRITE_MODES = ('insert', 'copy', 'upsert')  # 异步版本支持的写入方式
+
+    def __init__(self):
+        if not is_asyncio_reactor_installed():
+            raise NotConfigured("AsyncPostgreSQLPipeline需要使用asyncio reactor（TWISTED_REACTOR）")
+        super().__init__()
+        self.aconn = None  # 写入协程使用的异步连接
+        self.last_used = None  # 异步连接最近一次使用的时间，用于空闲健康检查
+        self.write_task = None  # 写入协程
+        self.checked_item_classes = set()  # 已检查过配置的Item类
+
+    def open_spider(self, spider):
+        return deferred_from_coro(self._open_spider(spider))
+
+    async def _open_spider(self, spider):
+        """爬虫启动时建立异步连接并启动写入协程"""
+        self.spider = spider
+        self.logger = spider.logger
+        self.stats = spider.crawler.stats if getattr(spider, 'crawler', None) else None
+        self._connect_signals(spider)
+        if self.JOURNAL_DIR or self.BISECT_ON_ERROR:
+            spider.logger.warning("AsyncPostgreSQLPipeline不支持JOURNAL_DIR和BISECT_ON_ERROR，已忽略")
+        unsupported = {table: mode for table, mode in self.write_modes.items() if mode not in self.SUPPORTED_WRITE_MODES}
+        if unsupported:
+            spider.logger.warning(
+                f"AsyncPostgreSQLPipeline不支持POSTGRESQL_WRITE_MODES中的写入方式 {unsupported}，改为insert（配置了ON_CONFLICT时为upsert）"
+            )
+        try:
+            self.aconn = await self._connect_async()
+            spider.logger.info("PostgreSQL连接成功")
+        except Exception as e:
+            spider.logger.error(f"PostgreSQL连接失败: {str(e)}")
+            raise
+
+        self.write_queue = asyncio.Queue()
+        self.write_task = asyncio.ensure_future(self._writer())
+
+        # 定时检查缓存时间，队列空闲时数据也不会长时间停留在内存中
+        self.flush_loop = task.LoopingCall(self._flush_expired_batches)
+        self.flush_loop.start(self.FLUSH_CHECK_INTERVAL, now=False)
+
+    async def _connect_async(self):
+        """建立异步连接，失败时按指数退避重试RECONNECT_ATTEMPTS次"""
+        attempt = 0
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(**self._get_connect_kwargs())
+                self.last_used = time.monotonic()
+                return conn
+            except psycopg.OperationalError:
+                if attempt >= self.RECONNECT_ATTEMPTS:
+                    raise
+                await asyncio.sleep(min(self.RECONNECT_BACKOFF * 2 ** attempt, self.RECONNECT_BACKOFF_MAX))
+                attempt += 1
+
+    async def _get_connection(self):
+        """返回可用的异步连接：已断开时重连，空闲时间较长时先执行SELECT 1检查"""
+        if self.aconn is not None and not self.aconn.closed:
+            if time.monotonic() - self.last_used < self.HEALTH_CHECK_INTERVAL:
+                return self.aconn
+            try:
+                await self.aconn.execute("SELECT 1")
+                await self.aconn.rollback()
+                return self.aconn
+            except psycopg.Error:
+                await self.aconn.close()
+        self.aconn = await self._connect_async()
+        return self.aconn
+
+    async def process_item(self, item, spider):
+        """处理单个Item或ItemBatch，加入批量队列（字段在批次写入前按列验证），不等待数据库写入"""
+        if not isinstance(item, records.ItemBatch) and self._is_unchanged(item):
+            return item
+        prepared = self._prepare_rows(item, spider)
+        if prepared is None:
+            return item
+
+        # 缓存数据到批量队列（表结构由写入协程在批次写入前检查），待写入批次过多时等待写入协程
+        self._cache_batch_rows(*prepared)
+        if self.write_queue.qsize() >= self.WRITE_QUEUE_SIZE:
+            await self.write_queue.join()
+
+        return item
+
+    def _resolve_item(self, item, spider):
+        """检查Item配置，每个Item类首次出现时对异步版本不支持的配置给出警告"""
+        target = super()._resolve_item(item, spider)
+        if target is not None and target[0] not in self.checked_item_classes:
+            item_cls = target[0]
+            self.checked_item_classes.add(item_cls)
+            write_mode = getattr(item_cls, 'WRITE_MODE', 'insert')
+            if write_mode not in self.SUPPORTED_WRITE_MODES and item_cls.TABLE not in self.write_modes:
+                spider.logger.warning(
+                    f"AsyncPostgreSQLPipeline不支持写入方式 {write_mode}，表 {item_cls.TABLE} 改为{self._get_write_mode(item_cls)}"
+                )
+            if latest_state.is_enabled(item_cls):
+                spider.logger.warning(
+                    f"AsyncPostgreSQLPipeline不支持最新状态表（LATEST_STATE_KEY），表 {item_cls.TABLE} 将写入全部行，"
+                    f"{latest_state.table_name_for(item_cls)} 不会更新"
+                )
+        return target
+
+    def _check_latest_state_table(self, item_cls, spider):
+        """异步版本不写入最新状态表，无需检查状态表是否存在"""
+        self.latest_state_checked.add(item_cls)
+
+    def _get_write_mode(self, item_cls):
+        """不支持的写入方式（如staging）改为upsert（配置了ON_CONFLICT）或insert"""
+        write_mode = super()._get_write_mode(item_cls)
+        if write_mode in self.SUPPORTED_WRITE_MODES:
+            return write_mode
+        return 'upsert' if getattr(item_cls, 'ON_CONFLICT', None) else 'insert'
+
+    @contextmanager
+    def _ddl_connection(self):
+        """表结构检查使用独立的同步连接，期间绑定到self.conn/self.cur（游标接口与psycopg2兼容）"""
+        with psycopg.connect(**self._get_connect_kwargs()) as self.conn:
+            self.cur = self.conn.cursor()
+            try:
+                yield
+            finally:
+                self.conn = self.cur = None
+
+    def _batch_insert(self, table_name, reason=None):
+        """取出表的批量数据交给写入协程"""
+        batch = self._take_batch(table_name, reason)
+        if batch is not None:
+            columns, data_list = batch[:2]
+            self.write_queue.put_nowait((table_name, columns, data_list))
+
+    async def _writer(self):
+        """写入协程：依次写入队列中的批次，收到None时退出"""
+        while True:
+            batch = await self.write_queue.get()
+            try:
+                if batch is None:
+                    return
+                table_name, columns, data_list = batch
+                try:
+                    if not self._is_schema_cached(table_name, columns):
+                        await asyncio.to_thread(self._ensure_batch_schema, table_name, columns, data_list)
+                    if partitions.is_partitioned(self.table_items.get(table_name)):
+                        await asyncio.to_thread(self._ensure_batch_partitions, table_name, columns, data_list)
+                    await self._commit_batch_async(table_name, columns, data_list)
+                except Exception as e:
+                    self.logger.error(f"异步写入失败: {table_name} {len(data_list)}条, {str(e)}")
+                    self._settle_change_keys(table_name, columns, data_list, None)
+                    if self.stats:
+                        self.stats.inc_value('pipeline/writer/failed_rows', len(data_list))
+            finally:
+                self.write_queue.task_done()
+
+    async def _commit_batch_async(self, table_name, columns, data_list):
+        """写入一个批次，写入过程中连接断开时重连并重新写入（最多BATCH_RETRIES次）"""
+        retries = 0
+        while True:
+            conn = await self._get_connection()
+            try:
+                await self._write_rows_async(conn, table_name, columns, data_list)
+                return
+            except psycopg.OperationalError as e:
+                if not conn.closed or retries >= self.BATCH_RETRIES:
+                    raise
+                retries += 1
+                if self.stats:
+                    self.stats.inc_value('pipeline/pool/retried_batches')
+                self.logger.warning(f"写入时数据库连接断开，重新写入批次: {table_name} {len(data_list)}条, {str(e)}")
+
+    async def _write_rows_async(self, conn, table_name, columns, data_list):
+        """在一个事务中写入一批数据，按Item类的配置选择INSERT、COPY或UPSERT"""
+        item_cls = self.table_items.get(table_name)
+        write_mode = self._get_write_mode(item_cls)
+        start_time = time.perf_counter()
+
+        try:
+            async with conn.transaction():
+                async with conn.cursor() as cur:
+                    if write_mode == 'upsert':
+                        row_count = await self._execute_upsert_async(cur, table_name, item_cls, columns, data_list)
+                    elif write_mode == 'copy':
+                        async with cur.copy(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN") as copy:
+                            for row in self._adapt_rows(data_list):
+                                await copy.write_row(row)
+                        row_count = len(data_list)
+                    elif write_mode == 'insert':
+                        query = self._get_statement(('insert_async', table_name, columns), lambda: (
+                            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+                        ))
+                        await cur.executemany(query, self._adapt_rows(data_list))
+                        row_count = len(data_list)
+                    else:
+                        raise ValueError(f"不支持的写入方式: {write_mode}")
+        finally:
+            self.last_used = time.monotonic()
+        self._settle_change_keys(table_name, columns, data_list)
+        self._record_write_stats(table_name, write_mode, row_count, time.perf_counter() - start_time)
+
+    @staticmethod
+    def _adapt_rows(data_list):
+        """psycopg3不会自动把dict/list转换为jsonb，需要显式包装（由serializers序列化）"""
+        return [
+            tuple([Jsonb(value, serializers.dumps) if isinstance(value, (dict, list)) else value for value in row])
+            for row in data_list
+        ]
+
+    async def _execute_upsert_async(self, cur, table_name, item_cls, columns, data_list):
+        """以多行INSERT ... ON CONFLICT写入，按固定的行数分块，重复的语句由psycopg3自动预编译"""
+        on_conflict = item_cls.ON_CONFLICT
+        conflict_fields, rows = self._prepare_upsert(table_name, item_cls, on_conflict, columns, data_list)
+        rows = self._adapt_rows(rows)
+        max_rows = max(1, min(self.PREPARED_MAX_ROWS, 65535 // len(columns)))
+        offset = 0
+        for row_count in self._prepared_chunk_sizes(len(rows), max_rows):
+            query = self._get_statement(('upsert_async', table_name, columns, conflict_fields, on_conflict, row_count), lambda: (
+                self._build_upsert_sql(table_name, columns, conflict_fields, on_conflict, ', '.join(
+                    ['(' + ', '.join(['%s'] * len(columns)) + ')'] * row_count
+                ))
+            ))
+            params = [value for row in rows[offset:offset + row_count] for value in row]
+            offset += row_count
+            await cur.execute(query, params)
+        return len(rows)
+
+    def close_spider(self, spider):
+        return deferred_from_coro(self._close_spider(spider))
+
+    async def _close_spider(self, spider):
+        """关闭爬虫时写入剩余数据并关闭数据库连接"""
+        if self.flush_loop and self.flush_loop.running:
+            self.flush_loop.stop()
+
+        # 提交所有剩余的批量数据
+        for table_name in self.batch_data:
+            if self.batch_data[table_name]:
+                spider.logger.info(f"爬虫结束，提交剩余数据: {table_name} {len(self.batch_data[table_name])}条")
+                self._batch_insert(table_name)
+
+        # 等待写入协程处理完队列中的批次
+        if self.write_task:
+            self.write_queue.put_nowait(None)
+            await self.write_task
+
+        self._flush_change_caches()
+        if self.aconn is not None:
+            await self.aconn.close()
@@ -2,14 +2,15 @@
 #
 # Please refer to the documentation for information on how to create and manage
 # your spiders.
-import json
-
 import scrapy
 from scrapy_redis.spiders import RedisSpider
 from scrapy.utils.project import get_project_settings
 
+from sf_spider import serializers
+
 # 根据开关动态选择父类（RedisSpider或普通Spider）
 settings = get_project_settings()
+serializers.configure(settings)
 if settings.get("DEBUG"):
     __BaseSpider = scrapy.Spider
 else:
@@ -48,7 +49,7 @@ class BaseSpider(__BaseSpider):
 
     def make_request_from_data(self, data):
         """处理Redis中的任务（适用于RedisSpider）"""
-        task = json.loads(data.decode('utf-8'))
+        task = serializers.loads(data)
         for req in self.start_task(task):
             yield req
         # yield from self.start_task(task)
@@ -0,0 +1,151 @@
+"""内容哈希与有界LRU缓存：按自然键记录数据行内容的64位哈希，用于跳过未变化的数据"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, date
+
+
+def _hash_default(value):
+    """日期时间统一按ISO格式参与哈希（dateutil与fromisoformat解析出的tzinfo类型不同，但值相同）"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def content_hash(values):
+    """计算一组字段值的64位有符号哈希（可直接存入PostgreSQL的bigint列）"""
+    data = json.dumps(values, default=_hash_default, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return int.from_bytes(hashlib.blake2b(data.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+class LRUCache:
+    """容量有限的LRU字典，超过maxsize时淘汰最久未访问的键"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ChangeCache:
+    """按自然键记录数据行内容哈希的变化检测缓存：进程内LRU，可选多节点共享的Redis哈希
+
+    is_unchanged()返回True表示该键上一次出现时的内容与本次相同。内容变化（或首次出现）的哈希先暂存，
+    对应的行写入数据库并提交后由settle()记录到LRU和Redis，验证或写入失败时丢弃，
+    因此未提交的数据不会让之后相同内容的行被跳过（进程崩溃时暂存的哈希随之丢失，Redis中只有已提交的记录）。
+    同一个键可能同时有多行在写入途中，暂存的哈希按出现的先后排队，提交和丢弃都从最早的一个开始。
+    Redis中的记录先在本地累积，达到flush_size条时用一次HSET写入；本地没有记录的键按批用一次HMGET查询（unchanged_many）。
+    写入线程与主线程共用，操作都在锁内进行。
+    """
+
+    def __init__(self, maxsize, redis=None, redis_key=None, flush_size=500, ttl=None):
+        self.local = LRUCache(maxsize)
+        self.redis = redis
+        self.redis_key = redis_key
+        self.flush_size = flush_size
+        self.ttl = ttl  # Redis哈希的过期时间（秒），每次写入后刷新
+        self.pending = {}  # 已提交、尚未写入Redis的哈希: {key: hash}
+        self.staged = {}  # 尚未提交的哈希: {key: deque([hash...])}
+        self.lock = threading.Lock()
+
+    def is_unchanged(self, key, value_hash):
+        with self.lock:
+            return self._is_unchanged(key, value_hash)
+
+    def unchanged_many(self, entries):
+        """批量版本的is_unchanged，entries为按行顺序排列的(键, 哈希)，返回对应的布尔值列表
+
+        本地没有记录的键用一次HMGET查询Redis，而不是每个键一次HGET。
+        """
+        with self.lock:
+            remote = None
+            if self.redis is not None:
+                cold = list(dict.fromkeys(
+                    key for key, _ in entries
+                    if not self.staged.get(key) and key not in self.pending and self.local.get(key) is None
+                ))
+                if cold:
+                    remote = dict(zip(cold, self.redis.hmget(self.redis_key, cold)))
+            return [self._is_unchanged(key, value_hash, remote) for key, value_hash in entries]
+
+    def _is_unchanged(self, key, value_hash, remote=None):
+        """比较键的内容哈希（调用方持有锁），remote为已从Redis批量读取的记录: {key: value}"""
+        staged = self.staged.get(key)
+        if staged:
+            known = staged[-1]
+        else:
+            known = self.local.get(key)
+            if known is None and self.redis is not None:
+                known = self.pending.get(key)
+                if known is None:
+                    value = remote[key] if remote is not None and key in remote else self.redis.hget(self.redis_key, key)
+                    known = int(value) if value is not None else None
+                if known is not None:
+                    self.local.set(key, known)
+        if known == value_hash:
+            return True
+        self.staged.setdefault(key, deque()).append(value_hash)
+        return False
+
+    def settle(self, entries):
+        """批次结束后处理暂存的哈希，entries为按行顺序排列的(键, 是否已提交)
+
+        已提交的行记录哈希（每个键取最早暂存的一个），验证或写入失败的行丢弃暂存的哈希，之后相同内容的行照常写入。
+        """
+        with self.lock:
+            for key, committed in entries:
+                value_hash = self._pop_staged(key)
+                if value_hash is None or not committed:
+                    continue
+                self.local.set(key, value_hash)
+                if self.redis is not None:
+                    self.pending[key] = value_hash
+            full = self.redis is not None and len(self.pending) >= self.flush_size
+        if full:
+            self.flush()
+
+    def _pop_staged(self, key):
+        staged = self.staged.get(key)
+        if not staged:
+            return None
+        value_hash = staged.popleft()
+        if not staged:
+            del self.staged[key]
+        return value_hash
+
+    def flush(self):
+        """把累积的哈希写入Redis"""
+        with self.lock:
+            if not self.pending or self.redis is None:
+                return
+            pending, self.pending = self.pending, {}
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(self.redis_key, mapping=pending)
+            if self.ttl:
+                pipe.expire(self.redis_key, self.ttl)
+            pipe.execute()
+        except Exception:
+            # 写入失败的哈希留待下次写入（期间提交的新哈希优先）
+            with self.lock:
+                self.pending = {**pending, **self.pending}
+            raise
@@ -1,5 +1,6 @@
-import json
 import hashlib
+import json
+import math
 from scrapy_redis.dupefilter import RFPDupeFilter
 
 
@@ -21,10 +22,12 @@ class JSONTaskDupeFilter(RFPDupeFilter):
         if task_data:
             # 将任务数据转换为排序后的JSON字符串（确保字典顺序不影响去重）
             # sort_keys=True 保证不同顺序的相同键值对被视为相同
+            # 固定使用标准库json和分隔符：orjson的浮点数等输出与json不同（如1e16），指纹须与JSON_SERIALIZER无关
             task_str = json.dumps(
                 task_data,
                 sort_keys=True,
-                ensure_ascii=False
+                ensure_ascii=False,
+                separators=(', ', ': '),
             ).encode('utf-8')
 
             # 对JSON字符串进行MD5哈希，生成唯一指纹
@@ -32,3 +35,151 @@ class JSONTaskDupeFilter(RFPDupeFilter):
         else:
             # 如果没有任务数据，使用默认的URL指纹生成方式
             return super().request_fingerprint(request)
+
+
+# 可扩展布隆过滤器的检查与写入脚本（一次往返、原子执行，多个爬虫节点共享同一组过滤器）
+# KEYS[1]: 元数据哈希（filters: 子过滤器数, count: 已写入总数, count:<i>: 第i个子过滤器的写入数），
+#          第i个子过滤器的位图为 KEYS[1]:<i>
+# ARGV: h1, h2, 初始容量, 第一个子过滤器的误判率, 容量增长倍数, 误判率收紧比例
+# 返回 {是否已存在, 子过滤器数, 当前子过滤器的写入数, 写入总数}
+BLOOM_SCRIPT = """
+local meta = KEYS[1]
+local h1, h2 = tonumber(ARGV[1]), tonumber(ARGV[2])
+local capacity, error_rate = tonumber(ARGV[3]), tonumber(ARGV[4])
+local growth, ratio = tonumber(ARGV[5]), tonumber(ARGV[6])
+
+local function params(i)
+    local n = math.floor(capacity * growth ^ i)
+    local p = error_rate * ratio ^ i
+    local k = math.ceil(-math.log(p) / math.log(2))
+    local bits = math.ceil(-n * math.log(p) / math.log(2) ^ 2)
+    local m = 1
+    while m < bits and m < 4294967296 do
+        m = m * 2
+    end
+    return n, k, m
+end
+
+local filters = tonumber(redis.call('HGET', meta, 'filters') or '0')
+for i = filters - 1, 0, -1 do
+    local _, k, m = params(i)
+    local bits = meta .. ':' .. i
+    local found = true
+    for j = 0, k - 1 do
+        if redis.call('GETBIT', bits, math.fmod(h1 + j * h2, m)) == 0 then
+            found = false
+            break
+        end
+    end
+    if found then
+        return {1, filters, tonumber(redis.call('HGET', meta, 'count:' .. (filters - 1)) or '0'),
+                tonumber(redis.call('HGET', meta, 'count') or '0')}
+    end
+end
+
+local current = filters - 1
+local count = tonumber(redis.call('HGET', meta, 'count:' .. current) or '0')
+if filters == 0 or count >= params(current) then
+    current = filters
+    filters = filters + 1
+    count = 0
+    redis.call('HSET', meta, 'filters', filters)
+end
+local _, k, m = params(current)
+local bits = meta .. ':' .. current
+for j = 0, k - 1 do
+    redis.call('SETBIT', bits, math.fmod(h1 + j * h2, m), 1)
+end
+count = redis.call('HINCRBY', meta, 'count:' .. current, 1)
+return {0, filters, count, redis.call('HINCRBY', meta, 'count', 1)}
+"""
+
+
+class BloomJSONTaskDupeFilter(JSONTaskDupeFilter):
+    """
+    基于可扩展布隆过滤器的JSON任务去重过滤器
+    指纹不再逐条保存在Redis集合中，而是映射到Redis位图的k个位上（SETBIT/GETBIT在Lua脚本中执行），
+    Redis内存只与容量和误判率有关；写满当前子过滤器后自动追加一个容量更大、误判率更低的子过滤器，
+    总误判率不超过DUPEFILTER_BLOOM_ERROR_RATE。
+
+    settings:
+        DUPEFILTER_BLOOM_CAPACITY: 第一个子过滤器的容量（条），默认100万
+        DUPEFILTER_BLOOM_ERROR_RATE: 总误判率（把新任务误判为重复的概率），默认0.001
+        DUPEFILTER_BLOOM_GROWTH: 每个新子过滤器的容量增长倍数，默认2
+
+    stats:
+        dupefilter/bloom/filters: 子过滤器数
+        dupefilter/bloom/count: 已写入的指纹总数
+        dupefilter/bloom/fill_ratio: 当前子过滤器置位比例的估计值（1 - e^(-k·n/m)）
+    """
+    ratio = 0.5  # 每个新子过滤器的误判率收紧比例，总误判率 = 第一个子过滤器的误判率 / (1 - ratio)
+
+    def __init__(self, server, key, debug=False):
+        super().__init__(server, key, debug)
+        self.bloom_key = f'{key}:bloom'  # 与旧版的指纹集合分开，切换过滤器时不会因键类型不同而报错
+        self.capacity = 1000000
+        self.error_rate = 0.001
+        self.growth = 2
+        self.stats = None
+        self.script = server.register_script(BLOOM_SCRIPT)
+
+    @classmethod
+    def from_settings(cls, settings):
+        dupefilter = super().from_settings(settings)
+        dupefilter.configure(settings)
+        return dupefilter
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        dupefilter = super().from_crawler(crawler)
+        dupefilter.stats = crawler.stats
+        return dupefilter
+
+    @classmethod
+    def from_spider(cls, spider):
+        dupefilter = super().from_spider(spider)
+        dupefilter.configure(spider.settings)
+        dupefilter.stats = spider.crawler.stats
+        return dupefilter
+
+    def configure(self, settings):
+        """读取settings中的布隆过滤器参数"""
+        self.capacity = settings.getint('DUPEFILTER_BLOOM_CAPACITY', self.capacity)
+        self.error_rate = settings.getfloat('DUPEFILTER_BLOOM_ERROR_RATE', self.error_rate)
+        self.growth = settings.getint('DUPEFILTER_BLOOM_GROWTH', self.growth)
+        if self.capacity <= 0 or not 0 < self.error_rate < 1 or self.growth < 1:
+            raise Exception(f"布隆过滤器参数无效: capacity={self.capacity}, error_rate={self.error_rate}, growth={self.growth}")
+
+    def filter_params(self, index):
+        """第index个子过滤器的(容量, 哈希函数个数k, 位数m)，与Lua脚本中的计算一致
+
+        m向上取整到2的幂（Redis位图最多2^32位）：奇数的h2与m互质，k个位置才不会重合。
+        """
+        capacity = math.floor(self.capacity * self.growth ** index)
+        error_rate = self.error_rate * (1 - self.ratio) * self.ratio ** index
+        k = math.ceil(-math.log(error_rate) / math.log(2))
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        m = min(1 << max(bits - 1, 0).bit_length(), 2 ** 32)
+        return capacity, k, m
+
+    def request_seen(self, request):
+        fp = self.request_fingerprint(request)
+        # 双重哈希：指纹（MD5/SHA1十六进制）的前两个32位整数作为h1、h2，第j个位置为 (h1 + j·h2) mod m，h2取奇数避免k个位置重合
+        digest = bytes.fromhex(fp)
+        h1 = int.from_bytes(digest[:4], 'big')
+        h2 = int.from_bytes(digest[4:8], 'big') | 1
+        seen, filters, count, total = self.script(
+            keys=[self.bloom_key],
+            args=[h1, h2, self.capacity, self.error_rate * (1 - self.ratio), self.growth, self.ratio],
+        )
+        if self.stats is not None:
+            _, k, m = self.filter_params(filters - 1)
+            self.stats.set_value('dupefilter/bloom/filters', filters)
+            self.stats.set_value('dupefilter/bloom/count', total)
+            self.stats.set_value('dupefilter/bloom/fill_ratio', round(1 - math.exp(-k * count / m), 4))
+        return bool(seen)
+
+    def clear(self):
+        """删除元数据和全部子过滤器的位图"""
+        filters = int(self.server.hget(self.bloom_key, 'filters') or 0)
+        self.server.delete(self.bloom_key, *(f'{self.bloom_key}:{index}' for index in range(filters)))
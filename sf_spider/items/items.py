@@ -7,10 +7,27 @@ class BaseItem(Item):
     """基础数据库Item类，定义通用配置属性"""
     # 以下属性需要在子类中具体定义
     TABLE = None  # 表名
-    AUTO_CREATE_TABLE = False  # 是否自动创建表
+    AUTO_CREATE_TABLE = False  # 是否自动创建表（为False时可用 python -m sf_spider.schema plan|apply 提前迁移表结构）
     ADD_AUTO_INCREMENT_ID = False  # 是否添加自增主键
     INDEXES = []  # # 普通索引字段列表，如 ["field1", "field2"]
     UNIQUE_CONSTRAINTS = []  # 联合唯一约束，格式：[["f1","f2"], {"name": "...", "fields": [...]}]
+    WRITE_MODE = 'insert'  # 写入方式：'insert'（execute_batch逐行INSERT）、'copy'（COPY ... FROM STDIN）或 'staging'（COPY到UNLOGGED暂存表，定时合并到目标表）
+    ON_CONFLICT = None  # 冲突处理：None（直接插入）、'update'（DO UPDATE）或 'nothing'（DO NOTHING），冲突目标为UNIQUE_CONSTRAINTS的第一个约束，优先于WRITE_MODE
+    COPY_FORMAT = 'text'  # COPY格式：'text' 或 'binary'（binary要求表的列类型与TYPE_MAPPING一致）
+    BATCH_SIZE = None  # 批量写入触发条件，为None时使用Pipeline的同名配置：最大行数
+    BATCH_MAX_AGE = None  # 最早一行缓存的最长时间（秒）
+    BATCH_MAX_BYTES = None  # 缓存数据的近似最大字节数
+    STAGING_MERGE_INTERVAL = None  # 暂存表合并间隔（秒），为None时使用Pipeline的同名配置
+    STAGING_MERGE_ROWS = None  # 暂存表累计行数超过该值时立即合并
+    USE_PREPARED_STATEMENTS = None  # 是否使用服务端预编译语句写入（仅insert/upsert），为None时使用Pipeline的同名配置
+    PARTITION_KEY = None  # 范围分区字段（整数或日期时间字段），设置后建表为分区表，写入前按需创建子分区
+    PARTITION_INTERVAL = None  # 分区间隔：整数字段为每个分区的取值个数（如1000），日期时间字段为'day'/'week'/'month'/'year'
+    PARTITION_RETENTION = None  # 保留的分区数，python -m sf_spider.schema detach 默认卸载更早的分区
+    LATEST_STATE_KEY = None  # 最新状态表的自然键字段（如 'tracking_number'），设置后只有状态变化的行写入TABLE
+    LATEST_STATE_FIELDS = []  # 状态字段列表，内容哈希相同视为未变化，如 ['status', 'update_date']
+    LATEST_STATE_TABLE = None  # 最新状态表名，为None时为 {TABLE}_latest（AUTO_CREATE_TABLE时自动创建）
+    CHANGE_KEY = None  # 变化检测的自然键字段列表（如 ['tracking_number']），与上次内容相同的行在验证前跳过
+    CHANGE_IGNORE_FIELDS = []  # 不参与变化检测的字段（如每次运行都不同的批次ID）
 
     def get_field_type(self, field_name):
         """获取字段声明的类型"""
@@ -1,7 +1,9 @@
 # db_fields.py
 from datetime import datetime
 import re
+from dateutil import parser as dateutil_parser
 from scrapy import Field
+from sf_spider.cache import LRUCache
 from sf_spider.items.items import BaseItem
 
 
@@ -47,6 +49,41 @@ class BaseField(Field):
         
         return value
 
+    def validate_many(self, values, errors=None):
+        """批量验证一列值，返回验证后的值列表
+
+        整列先一次性检查约束，全部满足时原样返回；否则逐个调用validate()得到转换后的值和具体的错误。
+        errors为字典时，验证失败的值记录为 errors[下标] = 错误信息，结果中对应位置为None；
+        errors为None时遇到第一个错误即抛出ValidationError。
+        """
+        values = list(values)
+        if not self['validators'] and self._check_values(values):
+            return values
+
+        results = []
+        for index, value in enumerate(values):
+            try:
+                results.append(self.validate(value))
+            except ValidationError as e:
+                if errors is None:
+                    raise ValidationError(f"第{index + 1}个值验证失败: {str(e)}")
+                errors[index] = str(e)
+                results.append(None)
+        return results
+
+    def _check_values(self, values):
+        """整列检查必填、类型和长度约束，全部满足时返回True（子类扩展各自的约束）"""
+        present = [value for value in values if value is not None]
+        if self['required'] and len(present) < len(values):
+            return False
+        if self['type'] and not all(issubclass(value_type, self['type']) for value_type in set(map(type, present))):
+            return False
+        if self['max_length']:
+            lengths = [len(value) for value in present if isinstance(value, str)]
+            if lengths and max(lengths) > self['max_length']:
+                return False
+        return True
+
 
 class StringField(BaseField):
     """字符串字段，适用于存储文本数据"""
@@ -76,6 +113,65 @@ class BooleanField(BaseField):
         super().__init__(type=bool, **kwargs)
 
 
+class DatetimeParser:
+    """快速日期时间解析函数，可作为DatetimeField/DateField的parser_func，结果与dateutil.parser.parse一致
+
+    依次尝试 datetime.fromisoformat、本解析器已学到的strptime格式，最后回退到dateutil；
+    dateutil解析成功后从CANDIDATE_FORMATS中找出能得到相同结果的格式记录下来，同一字段后续的字符串直接按该格式解析。
+    相同字符串的解析结果保存在容量为memo_size的LRU缓存中，只缓存ISO格式或完整日期格式（含年份）解析出的结果：
+    只能由dateutil解析的字符串（如"12:30"、"Jan 5"）缺少的部分按当天补全，结果随日期变化，每次重新解析。
+    每个字段应使用单独的实例，学到的格式互不影响。
+    """
+    # 可学习的格式只包含与dateutil默认行为（月份在前）一致的写法，避免 01/02/2025 这类字符串按日在前解析
+    CANDIDATE_FORMATS = (
+        '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f%z', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M', '%Y/%m/%d',
+        '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y %I:%M %p', '%m/%d/%Y',
+        '%b %d, %Y %I:%M %p', '%B %d, %Y %I:%M %p', '%b %d, %Y', '%B %d, %Y',
+        '%a, %d %b %Y %H:%M:%S %z', '%d %b %Y %H:%M:%S', '%d %b %Y',
+    )
+
+    def __init__(self, date_only=False, memo_size=10000):
+        self.date_only = date_only  # 为True时返回date（DateField使用）
+        self.formats = []  # 已学到的strptime格式，按学到的先后顺序尝试
+        self.memo = LRUCache(memo_size)
+
+    def __call__(self, value):
+        if not value:
+            return None
+        parsed = self.memo.get(value)
+        if parsed is None:
+            parsed, absolute = self._parse(value)
+            if self.date_only:
+                parsed = parsed.date()
+            if absolute:
+                self.memo.set(value, parsed)
+        return parsed
+
+    def _parse(self, value):
+        """返回(解析结果, 是否为完整的绝对时间)，只有绝对时间可以缓存"""
+        try:
+            return datetime.fromisoformat(value), True
+        except ValueError:
+            pass
+        for fmt in self.formats:
+            try:
+                return datetime.strptime(value, fmt), True
+            except ValueError:
+                pass
+
+        parsed = dateutil_parser.parse(value)
+        for fmt in self.CANDIDATE_FORMATS:
+            if fmt in self.formats:
+                continue
+            try:
+                if datetime.strptime(value, fmt) == parsed:
+                    self.formats.append(fmt)
+                    return parsed, True
+            except ValueError:
+                pass
+        return parsed, False
+
+
 class DatetimeField(BaseField):
     """日期时间字段，适用于存储日期和时间"""
     def __init__(self, auto_now=False, auto_now_add=False, format=None, parser_func=None, **kwargs):
@@ -136,6 +232,13 @@ class ListField(BaseField):
         
         return value
 
+    def _check_values(self, values):
+        """整列检查，增加列表项类型约束"""
+        if not super()._check_values(values):
+            return False
+        item_type = self['item_type']
+        return not item_type or all(isinstance(item, item_type) for value in values if value is not None for item in value)
+
 
 class DictField(BaseField):
     """字典字段，适用于存储键值对数据"""
@@ -159,40 +262,61 @@ class DictField(BaseField):
         
         return value
 
+    def _check_values(self, values):
+        """整列检查，增加字典键值类型约束"""
+        if not super()._check_values(values):
+            return False
+        schema = self['schema']
+        return not schema or all(
+            key not in value or isinstance(value[key], expected_type)
+            for value in values if value is not None
+            for key, expected_type in schema.items()
+        )
+
 
 class EmailField(StringField):
     """电子邮件字段，验证字符串是否为有效的电子邮件地址"""
-    def __init__(self, **kwargs):
-        # 添加电子邮件格式验证器
-        validators = kwargs.pop('validators', [])
-        validators.append(self._validate_email_format)
-        
-        super().__init__(validators=validators, **kwargs)
+    PATTERN = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+
+    def validate(self, value):
+        """扩展基类验证方法，增加电子邮件格式验证"""
+        value = super().validate(value)
+        if value is not None:
+            self._validate_email_format(value)
+        return value
     
     def _validate_email_format(self, value):
         """验证电子邮件格式是否有效"""
-        pattern = r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$"
-        if not re.match(pattern, value):
+        if not self.PATTERN.match(value):
             raise ValidationError(f"'{value}'不是有效的电子邮件地址")
         return value
 
+    def _check_values(self, values):
+        """整列检查，增加电子邮件格式约束"""
+        return super()._check_values(values) and all(self.PATTERN.match(value) for value in values if value is not None)
+
 
 class URLField(StringField):
     """URL字段，验证字符串是否为有效的URL地址"""
-    def __init__(self, **kwargs):
-        # 添加URL格式验证器
-        validators = kwargs.pop('validators', [])
-        validators.append(self._validate_url_format)
-        
-        super().__init__(validators=validators, **kwargs)
+    PATTERN = re.compile(r"^(https?://)?(www\.)?[a-zA-Z0-9-]+(\.[a-zA-Z0-9-]+)+(/\S*)?$")
+
+    def validate(self, value):
+        """扩展基类验证方法，增加URL格式验证"""
+        value = super().validate(value)
+        if value is not None:
+            self._validate_url_format(value)
+        return value
     
     def _validate_url_format(self, value):
         """验证URL格式是否有效"""
-        pattern = r"^(https?://)?(www\\.)?[a-zA-Z0-9-]+(\\.[a-zA-Z0-9-]+)+(/\S*)?$"
-        if not re.match(pattern, value):
+        if not self.PATTERN.match(value):
             raise ValidationError(f"'{value}'不是有效的URL地址")
         return value
 
+    def _check_values(self, values):
+        """整列检查，增加URL格式约束"""
+        return super()._check_values(values) and all(self.PATTERN.match(value) for value in values if value is not None)
+
 
 class ChoiceField(BaseField):
     """选项字段，验证值是否在指定的选项列表中"""
@@ -200,12 +324,15 @@ class ChoiceField(BaseField):
         if choices is None:
             raise ValueError("必须提供选项列表")
         
-        # 添加选项验证器
-        validators = kwargs.pop('validators', [])
-        validators.append(lambda v: self._validate_choice(v, choices))
-        
-        super().__init__(validators=validators, **kwargs)
+        super().__init__(**kwargs)
         self['choices'] = choices
+
+    def validate(self, value):
+        """扩展基类验证方法，增加选项验证"""
+        value = super().validate(value)
+        if value is not None:
+            self._validate_choice(value, self['choices'])
+        return value
     
     def _validate_choice(self, value, choices):
         """验证值是否在选项列表中"""
@@ -213,16 +340,24 @@ class ChoiceField(BaseField):
             raise ValidationError(f"值'{value}'不在有效选项列表中: {choices}")
         return value
 
+    def _check_values(self, values):
+        """整列检查，增加选项约束"""
+        choices = self['choices']
+        return super()._check_values(values) and all(value in choices for value in values if value is not None)
+
 
 class LengthField(StringField):
     """长度限制字段，扩展字符串字段以支持最小和最大长度限制"""
     def __init__(self, min_length=None, max_length=None, **kwargs):
-        # 添加长度验证器
-        validators = kwargs.pop('validators', [])
-        validators.append(lambda v: self._validate_length(v, min_length, max_length))
-        
-        super().__init__(max_length=max_length, validators=validators, **kwargs)
+        super().__init__(max_length=max_length, **kwargs)
         self['min_length'] = min_length
+
+    def validate(self, value):
+        """扩展基类验证方法，增加最小长度验证"""
+        value = super().validate(value)
+        if value is not None:
+            self._validate_length(value, self['min_length'], self['max_length'])
+        return value
     
     def _validate_length(self, value, min_length, max_length):
         """验证字符串长度是否在指定范围内"""
@@ -232,6 +367,13 @@ class LengthField(StringField):
             raise ValidationError(f"字段值长度不能超过{max_length}个字符")
         return value
 
+    def _check_values(self, values):
+        """整列检查，增加最小长度约束"""
+        min_length = self['min_length']
+        return super()._check_values(values) and (
+            min_length is None or all(len(value) >= min_length for value in values if value is not None)
+        )
+
 
 class CharField(StringField):
     """字符字段，与StringField功能相同，用于兼容性"""
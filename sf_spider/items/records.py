@@ -0,0 +1,183 @@
+# db_records.py
+"""轻量记录类：由BaseItem子类的字段声明生成的 __slots__ 类，用于大批量数据行
+
+scrapy Item的每个实例包含一个字典，取值还要经过MutableMapping的方法；记录类只为每个字段分配一个slot，
+创建和读取的开销都更小。爬虫可以直接yield记录，PostgreSQL Pipeline按其对应的Item类处理（表名、验证、写入方式等配置不变），
+itemadapter通过RecordAdapter支持记录（Feed导出等Scrapy组件可以照常使用）。
+
+用法：
+    GettnshipShipmentsRecord = record_class(GettnshipShipmentsItem)  # 在模块级别生成
+    yield GettnshipShipmentsRecord(**shipment)
+    yield ItemBatch(GettnshipShipmentsItem, shipments)  # 一个响应中的全部数据只经过一次Pipeline
+"""
+from types import MappingProxyType
+
+from itemadapter import ItemAdapter
+from itemadapter.adapter import AdapterInterface
+
+
+class Record:
+    """记录类的基类，item_class为生成该记录类的Item类
+
+    与scrapy Item一样，未赋值的字段不出现在keys()中，get()返回None，不支持的字段名抛出KeyError。
+    """
+    __slots__ = ()
+    item_class = None
+
+    def __init__(self, *args, **kwargs):
+        if args:
+            kwargs = dict(*args, **kwargs)
+        for key, value in kwargs.items():
+            try:
+                setattr(self, key, value)
+            except AttributeError:
+                # 只有字段对应的slot可以赋值
+                raise KeyError(f"{type(self).__name__} does not support field: {key}")
+
+    def __getitem__(self, key):
+        if key not in self.item_class.fields:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.item_class.fields:
+            raise KeyError(f"{type(self).__name__} does not support field: {key}")
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        if key not in self.item_class.fields:
+            raise KeyError(key)
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.item_class.fields and hasattr(self, key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def get(self, key, default=None):
+        # 只返回字段的值：方法和类属性（如to_item、item_class）不是字段
+        if key not in self.item_class.fields:
+            return default
+        return getattr(self, key, default)
+
+    def keys(self):
+        return [field for field in self.__slots__ if hasattr(self, field)]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.keys()]
+
+    def to_item(self):
+        """转换为对应的scrapy Item"""
+        return self.item_class(self.items())
+
+
+_record_classes = {}  # 已生成的记录类: {Item类: 记录类}
+
+
+def record_class(item_cls):
+    """生成（或返回已生成的）Item类对应的记录类，slot顺序与Item字段的声明顺序一致
+
+    记录类的模块和名称取自Item类（名称中的Item替换为Record），应在模块级别生成并赋值给同名变量。
+    """
+    cls = _record_classes.get(item_cls)
+    if cls is None:
+        reserved = set(item_cls.fields) & (set(dir(Record)) | {'fields'})
+        if reserved:
+            raise Exception(f"{item_cls.__name__} 的字段名与记录类的属性冲突: {', '.join(sorted(reserved))}")
+        name = item_cls.__name__
+        name = name[:-4] + 'Record' if name.endswith('Item') else name + 'Record'
+        cls = _record_classes[item_cls] = type(name, (Record,), {
+            '__slots__': tuple(item_cls.fields),
+            '__module__': item_cls.__module__,
+            'item_class': item_cls,
+            'fields': item_cls.fields,
+        })
+    return cls
+
+
+def is_record(item):
+    """是否为record_class生成的记录"""
+    return isinstance(item, Record)
+
+
+class ItemBatch:
+    """一批同一Item类的数据：爬虫每个响应yield一次，PostgreSQL Pipeline一次缓存全部数据行
+
+    rows中的元素可以是字段字典、Item或记录（字段字典中未声明的键被忽略）。ItemBatch本身不是Item，
+    只有UniversalPostgreSQLPipeline及其子类会展开它，其他Pipeline原样收到ItemBatch；
+    Pipeline按行数补足Scrapy的item_scraped_count/item_dropped_count。
+    """
+    __slots__ = ('item_class', 'rows')
+
+    def __init__(self, item_class, rows=None):
+        self.item_class = item_class
+        self.rows = list(rows) if rows is not None else []
+
+    def append(self, row):
+        self.rows.append(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __repr__(self):
+        # Scrapy的日志会输出Item，只显示类名和行数
+        return f"ItemBatch({self.item_class.__name__}, {len(self.rows)}条)"
+
+
+class RecordAdapter(AdapterInterface):
+    """itemadapter适配器：字段元数据取自对应Item类的字段声明"""
+
+    @classmethod
+    def is_item_class(cls, item_class):
+        return isinstance(item_class, type) and issubclass(item_class, Record) and item_class.item_class is not None
+
+    @classmethod
+    def get_field_meta_from_class(cls, item_class, field_name):
+        return MappingProxyType(item_class.fields[field_name])
+
+    @classmethod
+    def get_field_names_from_class(cls, item_class):
+        return list(item_class.fields)
+
+    def field_names(self):
+        return self.item.item_class.fields.keys()
+
+    def __getitem__(self, field_name):
+        return self.item[field_name]
+
+    def __setitem__(self, field_name, value):
+        self.item[field_name] = value
+
+    def __delitem__(self, field_name):
+        del self.item[field_name]
+
+    def __iter__(self):
+        return iter(self.item.keys())
+
+    def __len__(self):
+        return len(self.item)
+
+
+if RecordAdapter not in ItemAdapter.ADAPTER_CLASSES:
+    ItemAdapter.ADAPTER_CLASSES.appendleft(RecordAdapter)
@@ -0,0 +1,102 @@
+"""Pipeline本地追加写日志：缓存的数据行先落盘，提交成功后删除，进程重启或数据库不可用时用于重放"""
+import glob
+import json
+import os
+import time
+
+from sf_spider import serializers
+
+
+class SpillJournal:
+    """按表划分的JSONL分段日志
+
+    每个批次对应一个分段文件，第一行记录表名、Item类路径和列顺序，之后每行一条数据（按列顺序排列的JSON数组）。
+    批次写入数据库后删除对应分段；进程崩溃后剩余的分段在下次启动时重放。
+    同一张表可以有多个独立的缓冲区（stream，如进程池模式下等待编码的原始数据），各自写入和封存自己的分段。
+    """
+
+    SUFFIX = '.jsonl'
+    FAILED_SUFFIX = '.failed'
+
+    def __init__(self, directory, fsync=False):
+        self.directory = directory
+        self.fsync = fsync
+        self.active = {}   # 正在写入的分段: {(table_name, stream): (path, file)}
+        self.pending = {}  # 已封存但未提交、需并入下一批次的分段: {table_name: [path]}
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, table_name, item_path, columns, row, stream=None):
+        """追加一行数据到表（或表的指定缓冲区）的当前分段（同一批次的列顺序相同）"""
+        key = (table_name, stream)
+        if key not in self.active:
+            path = os.path.join(self.directory, f"{table_name}.{time.time_ns()}{self.SUFFIX}")
+            f = open(path, 'a', encoding='utf-8')
+            f.write(json.dumps({'table': table_name, 'item': item_path, 'columns': columns}) + '\n')
+            self.active[key] = (path, f)
+        f = self.active[key][1]
+        f.write(serializers.dumps(row) + '\n')
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def seal(self, table_name, stream=None):
+        """封存表的当前分段，返回该批次对应的全部分段路径（指定stream时只封存该缓冲区的分段）"""
+        segments = self.pending.pop(table_name, []) if stream is None else []
+        if (table_name, stream) in self.active:
+            path, f = self.active.pop((table_name, stream))
+            f.close()
+            segments.append(path)
+        return segments
+
+    def restore(self, table_name, segments):
+        """批次写入失败且数据放回内存时，分段并入下一批次"""
+        self.pending[table_name] = segments + self.pending.get(table_name, [])
+
+    def discard(self, segments):
+        """批次提交成功后删除对应分段"""
+        for path in segments:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def quarantine(self, segments):
+        """无法写入的分段改名保留，避免每次启动都重放失败的数据"""
+        for path in segments:
+            if os.path.exists(path):
+                os.replace(path, path + self.FAILED_SUFFIX)
+
+    def recover(self):
+        """列出目录中遗留的分段，每个分段单独成组（不同进程写入的列顺序可能不同）: [(table_name, [path])]"""
+        return [
+            (os.path.basename(path).rsplit('.', 2)[0], [path])
+            for path in sorted(glob.glob(os.path.join(self.directory, f"*{self.SUFFIX}")))
+        ]
+
+    @staticmethod
+    def load(segments):
+        """读取同一批次的分段，返回(Item类路径, 列顺序, 数据行列表)；崩溃时写了一半的行会被跳过"""
+        item_path = None
+        columns = None
+        rows = []
+        for path in segments:
+            with open(path, encoding='utf-8') as f:
+                lines = iter(f)
+                header = next(lines, None)
+                if header is None:
+                    continue
+                header = json.loads(header)
+                item_path = header.get('item') or item_path
+                columns = tuple(header['columns'])
+                for line in lines:
+                    try:
+                        rows.append(tuple(serializers.loads(line)))
+                    except ValueError:
+                        continue
+        return item_path, columns, rows
+
+    def close(self):
+        """关闭所有正在写入的分段文件（文件保留，等待下次重放）"""
+        for path, f in self.active.values():
+            f.close()
+        self.active = {}
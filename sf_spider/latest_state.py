@@ -0,0 +1,48 @@
+"""最新状态表：按自然键（如运单号）只保留一行当前状态，历史表只写入状态发生变化的行
+
+Item配置LATEST_STATE_KEY（自然键字段）和LATEST_STATE_FIELDS（状态字段）后，Pipeline在写入批次的同一个事务中：
+    1. 计算每行状态字段的内容哈希，与内存LRU中记录的哈希相同的行直接跳过；
+    2. 其余行以 INSERT ... ON CONFLICT DO UPDATE ... WHERE 哈希不同 RETURNING 写入状态表，
+       返回的键即状态真正发生变化（或首次出现）的键，只有这些行写入历史表（Item的TABLE）。
+状态表默认表名为 {TABLE}_latest，AUTO_CREATE_TABLE为True时与历史表一起创建（或添加缺失的状态字段），
+否则需提前创建：python -m sf_spider.schema plan/apply 会一并生成状态表的DDL。
+"""
+
+HASH_COLUMN = 'state_hash'
+CHANGED_AT_COLUMN = 'changed_at'
+
+
+def is_enabled(item_cls):
+    """Item类是否配置了最新状态表"""
+    return bool(getattr(item_cls, 'LATEST_STATE_KEY', None))
+
+
+def table_name_for(item_cls):
+    """状态表名，默认为历史表名加 _latest 后缀"""
+    return getattr(item_cls, 'LATEST_STATE_TABLE', None) or f"{item_cls.TABLE}_latest"
+
+
+def state_columns(item_cls, columns):
+    """状态表中保存的字段：自然键和批次中存在的状态字段"""
+    fields = [field for field in item_cls.LATEST_STATE_FIELDS if field in columns and field != item_cls.LATEST_STATE_KEY]
+    return (item_cls.LATEST_STATE_KEY, *fields)
+
+
+def create_table_sql(table_name, key, field_types):
+    """创建状态表，field_types为[(字段, PostgreSQL类型)]，第一个字段为自然键"""
+    columns_def = [f"{key} {field_types[0][1]} PRIMARY KEY"]
+    columns_def += [f"{field} {pg_type}" for field, pg_type in field_types[1:]]
+    columns_def += [f"{HASH_COLUMN} bigint NOT NULL", f"{CHANGED_AT_COLUMN} timestamp with time zone NOT NULL DEFAULT now()"]
+    return f"CREATE TABLE {table_name} ({', '.join(columns_def)})"
+
+
+def upsert_sql(table_name, columns):
+    """写入状态表，只有哈希不同时才更新，RETURNING返回插入或更新了的键"""
+    key, *fields = columns
+    assignments = [f"{field} = EXCLUDED.{field}" for field in (*fields, HASH_COLUMN)]
+    assignments.append(f"{CHANGED_AT_COLUMN} = now()")
+    return (
+        f"INSERT INTO {table_name} ({', '.join(columns)}, {HASH_COLUMN}) VALUES %s "
+        f"ON CONFLICT ({key}) DO UPDATE SET {', '.join(assignments)} "
+        f"WHERE {table_name}.{HASH_COLUMN} <> EXCLUDED.{HASH_COLUMN} RETURNING {key}"
+    )
@@ -0,0 +1,116 @@
+"""按范围分区的表：分区边界计算和分区相关DDL
+
+Item配置PARTITION_KEY（分区字段）和PARTITION_INTERVAL（分区间隔）后，表创建为 PARTITION BY RANGE 的父表，
+子分区在写入前按需创建，创建失败的批次不写入（保留在缓存或本地日志中重试）。
+附带的DEFAULT分区只接收分区字段为NULL的行：DEFAULT分区中一旦有某个范围的行，该范围的子分区就无法再创建。
+分区表的主键和唯一约束必须包含分区字段，因此ADD_AUTO_INCREMENT_ID的主键为(id, 分区字段)，此时分区字段不能为NULL。
+整数字段的间隔为每个分区的取值个数，如 PARTITION_INTERVAL = 1000；
+日期时间字段的间隔为 'day'、'week'、'month' 或 'year'。
+"""
+import re
+from datetime import datetime, date, timedelta
+
+DATE_INTERVALS = ('day', 'week', 'month', 'year')
+
+# 分区边界表达式（pg_get_expr的输出）中的下界，如 FOR VALUES FROM ('2025-01-01 00:00:00+00') TO (...)
+_LOWER_BOUND_RE = re.compile(r"FROM \('?([^')]*)'?\)")
+
+
+def is_partitioned(item_cls):
+    """Item类是否配置了分区"""
+    return bool(getattr(item_cls, 'PARTITION_KEY', None))
+
+
+def partition_clause(item_cls):
+    """CREATE TABLE语句末尾的分区子句"""
+    return f" PARTITION BY RANGE ({item_cls.PARTITION_KEY})" if is_partitioned(item_cls) else ''
+
+
+def primary_key_defs(item_cls):
+    """自增主键的列定义：分区表的主键必须包含分区字段"""
+    if not is_partitioned(item_cls):
+        return ["id SERIAL PRIMARY KEY"]
+    return ["id SERIAL", f"PRIMARY KEY (id, {item_cls.PARTITION_KEY})"]
+
+
+def supports_unique(item_cls, fields):
+    """分区表的唯一约束必须包含分区字段"""
+    return not is_partitioned(item_cls) or item_cls.PARTITION_KEY in fields
+
+
+def default_partition_sql(table_name):
+    """DEFAULT分区：接收没有对应子分区的行"""
+    return f"CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT"
+
+
+def partition_bounds(value, interval, tz=None):
+    """计算值所在分区的(分区名后缀, 下界, 上界)，边界为SQL字面量
+
+    带时区的datetime先转换到数据库会话时区tz，与PostgreSQL解析边界字面量的方式一致。
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None and tz is not None:
+            value = value.astimezone(tz)
+        value = value.date()
+    if isinstance(value, date):
+        if interval not in DATE_INTERVALS:
+            raise ValueError(f"日期分区的PARTITION_INTERVAL应为{DATE_INTERVALS}之一，实际为{interval!r}")
+        if interval == 'day':
+            lower, upper, suffix = value, value + timedelta(days=1), value.strftime('%Y%m%d')
+        elif interval == 'week':
+            lower = value - timedelta(days=value.weekday())
+            upper, suffix = lower + timedelta(days=7), lower.strftime('%Y%m%d')
+        elif interval == 'month':
+            lower = value.replace(day=1)
+            upper = date(lower.year + lower.month // 12, lower.month % 12 + 1, 1)
+            suffix = lower.strftime('%Y%m')
+        else:
+            lower, upper, suffix = date(value.year, 1, 1), date(value.year + 1, 1, 1), str(value.year)
+        return suffix, f"'{lower.isoformat()}'", f"'{upper.isoformat()}'"
+
+    if isinstance(value, int) and not isinstance(value, bool):
+        if not isinstance(interval, int) or interval <= 0:
+            raise ValueError(f"整数分区的PARTITION_INTERVAL应为正整数，实际为{interval!r}")
+        lower = value // interval * interval
+        return str(lower).replace('-', 'm'), str(lower), str(lower + interval)
+    raise ValueError(f"不支持按{type(value).__name__}类型分区")
+
+
+def create_partition_sql(table_name, suffix, lower, upper):
+    """创建子分区"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table_name}_p{suffix} PARTITION OF {table_name} "
+        f"FOR VALUES FROM ({lower}) TO ({upper})"
+    )
+
+
+def load_partitions(cur, table_name):
+    """读取父表的子分区: {分区名: 边界表达式}，表不是分区表时返回None"""
+    cur.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+        )
+    """, (table_name,))
+    if not cur.fetchone()[0]:
+        return None
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s AND p.relnamespace = current_schema()::regnamespace
+    """, (table_name,))
+    return {name: bound for name, bound in cur.fetchall()}
+
+
+def range_partitions_by_age(partitions):
+    """按下界从旧到新排列范围分区（不含DEFAULT分区），返回分区名列表"""
+    bounded = []
+    for name, bound in partitions.items():
+        match = _LOWER_BOUND_RE.search(bound or '')
+        if not match:
+            continue
+        lower = match.group(1)
+        bounded.append(((0, int(lower), '') if re.fullmatch(r'-?\d+', lower) else (1, 0, lower), name))
+    return [name for _, name in sorted(bounded)]
@@ -0,0 +1,208 @@
+"""PostgreSQL COPY ... FROM STDIN 编码工具，支持text和binary两种格式"""
+import io
+import struct
+from datetime import datetime, date, timezone
+from decimal import Decimal
+
+from sf_spider import serializers
+
+# binary格式文件头：签名 + 标志位 + 头扩展长度
+BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+# binary格式文件尾：字段数为-1
+BINARY_TRAILER = struct.pack('!h', -1)
+# binary格式中NULL值的长度标记
+BINARY_NULL = struct.pack('!i', -1)
+
+PG_EPOCH_DATETIME = datetime(2000, 1, 1, tzinfo=timezone.utc)
+PG_EPOCH_DATE = date(2000, 1, 1)
+
+# text格式需要转义的字符
+_TEXT_ESCAPES = str.maketrans({'\\': '\\\\', '\n': '\\n', '\r': '\\r', '\t': '\\t'})
+
+
+def encode_text_value(value):
+    """将Python值编码为COPY text格式的单个字段"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (dict, list)):
+        value = serializers.dumps(value)
+    elif isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return value.translate(_TEXT_ESCAPES)
+
+
+def encode_text_row(row):
+    """将一行数据（按列顺序排列的值）编码为COPY text格式的一行"""
+    return ('\t'.join([encode_text_value(value) for value in row]) + '\n').encode('utf-8')
+
+
+def _encode_bytes(value):
+    return str(value).encode('utf-8')
+
+
+def _encode_integer(value):
+    return struct.pack('!i', value)
+
+
+def _encode_boolean(value):
+    return b'\x01' if value else b'\x00'
+
+
+def _encode_jsonb(value):
+    # jsonb的binary格式：版本号1 + JSON文本
+    return b'\x01' + serializers.dumpb(value)
+
+
+def _encode_numeric(value):
+    """按PostgreSQL numeric的binary格式编码（基数10000的数字组）"""
+    number = value if isinstance(value, Decimal) else Decimal(str(value))
+    if number.is_nan():
+        return struct.pack('!hhHH', 0, 0, 0xC000, 0)
+    if number.is_infinite():
+        return struct.pack('!hhHH', 0, 0, 0xF000 if number.is_signed() else 0xD000, 0)
+
+    sign, digits, exponent = number.as_tuple()
+    dscale = max(0, -exponent)
+    digit_str = ''.join(map(str, digits))
+    if exponent > 0:
+        digit_str += '0' * exponent
+        exponent = 0
+
+    # 拆分整数部分和小数部分，并分别补齐到4位一组
+    point = len(digit_str) + exponent
+    int_part = digit_str[:point] if point > 0 else ''
+    frac_part = digit_str[point:] if point > 0 else '0' * -point + digit_str
+    int_part = int_part.zfill((len(int_part) + 3) // 4 * 4)
+    frac_part = frac_part.ljust((len(frac_part) + 3) // 4 * 4, '0')
+
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    weight = len(groups) - 1
+    groups += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+
+    # 去掉首尾的0组
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+
+    return struct.pack(f'!hhHH{len(groups)}H', len(groups), weight, 0x4000 if sign else 0x0000, dscale, *groups)
+
+
+def make_timestamptz_encoder(session_tz=timezone.utc):
+    """生成timestamptz编码器，无时区的datetime按会话时区解释（与INSERT时的行为一致）"""
+    def _encode_timestamptz(value):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=session_tz)
+        delta = value - PG_EPOCH_DATETIME
+        return struct.pack('!q', (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+    return _encode_timestamptz
+
+
+def _encode_date(value):
+    return struct.pack('!i', (value - PG_EPOCH_DATE).days)
+
+
+def get_binary_encoder(pg_type, session_tz=timezone.utc):
+    """根据PostgreSQL列类型（TYPE_MAPPING的输出）获取binary编码函数"""
+    if pg_type == 'integer':
+        return _encode_integer
+    if pg_type == 'numeric':
+        return _encode_numeric
+    if pg_type == 'boolean':
+        return _encode_boolean
+    if pg_type == 'jsonb':
+        return _encode_jsonb
+    if pg_type == 'timestamp with time zone':
+        return make_timestamptz_encoder(session_tz)
+    if pg_type == 'date':
+        return _encode_date
+    # text/varchar及其他类型按文本发送（varchar的binary输入格式与text相同）
+    return _encode_bytes
+
+
+def encode_binary_row(row, encoders):
+    """将一行数据按各列的编码函数编码为COPY binary格式的一个元组"""
+    parts = [struct.pack('!h', len(row))]
+    for value, encoder in zip(row, encoders):
+        if value is None:
+            parts.append(BINARY_NULL)
+        else:
+            data = encoder(value)
+            parts.append(struct.pack('!i', len(data)))
+            parts.append(data)
+    return b''.join(parts)
+
+
+class CopyStream:
+    """供cursor.copy_expert读取的流对象，按需编码数据行，避免一次性构造整个缓冲区"""
+
+    def __init__(self, rows, encode_row, header=b'', trailer=b''):
+        self._chunks = self._iter_chunks(rows, encode_row, header, trailer)
+        self._buffer = b''
+
+    @staticmethod
+    def _iter_chunks(rows, encode_row, header, trailer):
+        if header:
+            yield header
+        for row in rows:
+            yield encode_row(row)
+        if trailer:
+            yield trailer
+
+    def read(self, size=-1):
+        """读取至多size字节的数据，流结束时返回空字节串"""
+        if size is None or size < 0:
+            data = self._buffer + b''.join(self._chunks)
+            self._buffer = b''
+            return data
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def text_copy_stream(rows):
+    """生成COPY text格式的数据流"""
+    return CopyStream(rows, encode_text_row)
+
+
+def binary_copy_stream(rows, encoders):
+    """生成COPY binary格式的数据流"""
+    return CopyStream(rows, lambda row: encode_binary_row(row, encoders), BINARY_HEADER, BINARY_TRAILER)
+
+
+class EncodedRows(list):
+    """已预先编码的数据行列表（如由进程池编码），写入时直接发送payload，不再逐行编码
+
+    payload为各行按copy_format编码后拼接的字节串（binary格式不含文件头尾）。
+    切片（如二分定位错误行）得到普通list，会按常规方式重新编码。
+    """
+
+    def __init__(self, rows, copy_format, payload):
+        super().__init__(rows)
+        self.copy_format = copy_format
+        self.payload = payload
+
+
+def encode_rows(rows, copy_format, encoders=None):
+    """把数据行编码为COPY数据（binary格式不含文件头尾），binary格式需要各列的编码函数"""
+    if copy_format == 'binary':
+        return b''.join([encode_binary_row(row, encoders) for row in rows])
+    return b''.join([encode_text_row(row) for row in rows])
+
+
+def encoded_copy_stream(data_list):
+    """由EncodedRows生成COPY数据流"""
+    if data_list.copy_format == 'binary':
+        return io.BytesIO(BINARY_HEADER + data_list.payload + BINARY_TRAILER)
+    return io.BytesIO(data_list.payload)
@@ -0,0 +1,114 @@
+"""PostgreSQL连接池：同一进程内（如一个CrawlerProcess中的多个爬虫）按连接参数共享，借出前做健康检查，断线后退避重连"""
+import threading
+import time
+
+import psycopg2
+import psycopg2.pool
+
+_pools = {}  # 进程级连接池注册表: {连接参数: PostgreSQLPool}
+_pools_lock = threading.Lock()
+
+
+class PostgreSQLPool:
+    """线程安全的连接池
+
+    连接空闲超过health_check_interval秒时，借出前先执行SELECT 1，失效的连接直接关闭并换一个；
+    建立新连接失败时按指数退避重试reconnect_attempts次。连接数达到上限时等待其他线程归还，最多timeout秒。
+    """
+
+    def __init__(self, connect_kwargs, minconn=1, maxconn=10, timeout=30, health_check_interval=60,
+                 reconnect_attempts=3, reconnect_backoff=0.5, reconnect_backoff_max=10):
+        self.connect_kwargs = connect_kwargs
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_backoff = reconnect_backoff
+        self.reconnect_backoff_max = reconnect_backoff_max
+        self.refcount = 0  # 共享该连接池的Pipeline数量
+        self.last_used = {}  # 连接最近一次归还的时间: {connection: monotonic}
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, **connect_kwargs)
+
+    def getconn(self):
+        """借出一个可用连接，调用方用完后必须putconn归还"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError(f"连接池已满，等待{self.timeout}秒后仍无可用连接")
+        try:
+            return self._getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _getconn(self):
+        attempt = 0
+        while True:
+            try:
+                conn = self._pool.getconn()
+            except psycopg2.OperationalError:
+                if attempt >= self.reconnect_attempts:
+                    raise
+                time.sleep(min(self.reconnect_backoff * 2 ** attempt, self.reconnect_backoff_max))
+                attempt += 1
+                continue
+            if self._is_healthy(conn):
+                return conn
+            # 失效的连接（如被服务器断开的空闲连接）直接丢弃，重新借出
+            self.last_used.pop(conn, None)
+            self._pool.putconn(conn, close=True)
+
+    def _is_healthy(self, conn):
+        """连接已关闭时返回False；空闲时间较长的连接执行SELECT 1确认仍然可用"""
+        if conn.closed:
+            return False
+        idle_since = self.last_used.get(conn)
+        if idle_since is None or time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def putconn(self, conn, close=False):
+        """归还连接，已断开或close=True的连接直接关闭；未结束的事务由连接池回滚"""
+        close = close or bool(conn.closed)
+        if close:
+            self.last_used.pop(conn, None)
+        else:
+            self.last_used[conn] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        """关闭连接池中的全部连接"""
+        self.last_used.clear()
+        if not self._pool.closed:
+            self._pool.closeall()
+
+
+def acquire_pool(connect_kwargs, **options):
+    """获取共享连接池：连接参数相同的Pipeline共用一个连接池，options仅在首次创建时生效"""
+    key = tuple(sorted(connect_kwargs.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = PostgreSQLPool(connect_kwargs, **options)
+        pool.refcount += 1
+        return pool
+
+
+def release_pool(pool):
+    """释放共享连接池，最后一个使用者释放时关闭全部连接"""
+    with _pools_lock:
+        pool.refcount -= 1
+        if pool.refcount > 0:
+            return
+        for key, value in list(_pools.items()):
+            if value is pool:
+                del _pools[key]
+        pool.closeall()
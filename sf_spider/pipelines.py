@@ -1,14 +1,70 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import zoneinfo
+from collections import deque
+from contextlib import contextmanager
 import psycopg2
 import psycopg2.extras
-from datetime import datetime
+from datetime import datetime, date, timezone
+from scrapy import signals
 from scrapy.exceptions import DropItem
+from scrapy.utils.misc import load_object
+from twisted.internet import defer, task
 from scrapy.utils.project import get_project_settings
 
+from sf_spider import latest_state, partitions, pg_copy, process_pool, serializers, staging
+from sf_spider.cache import ChangeCache, LRUCache, content_hash
+from sf_spider.journal import SpillJournal
+from sf_spider.items import records
+from sf_spider.pg_pool import acquire_pool, release_pool
+
 
 class UniversalPostgreSQLPipeline:
     # 配置常量
     BATCH_SIZE = 100  # 批量插入大小
-    batch_data = {}   # 按表名存储批量数据: {table_name: [data1, data2...]}
+    BATCH_MAX_AGE = None  # 最早一行缓存超过该秒数时写入，None表示不限制
+    BATCH_MAX_BYTES = None  # 缓存数据近似字节数超过该值时写入，None表示不限制
+    FLUSH_CHECK_INTERVAL = 1  # 检查BATCH_MAX_AGE的间隔（秒），空闲时也会按时写入
+    BISECT_ON_ERROR = False  # 批次因数据错误写入失败时，是否二分定位错误行并提交其余正确的行
+    BISECT_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)  # 触发二分定位的数据库错误（类型、约束等行级错误）
+    DEAD_LETTER_TABLE = None  # 错误行写入的死信表名，如 'sf_spider_dead_letter'，自动创建
+    DEAD_LETTER_FILE = None  # 错误行写入的JSONL文件路径，如 'logs/dead_letter.jsonl'
+    ASYNC_WRITE = False  # 是否由后台线程写入（不阻塞Twisted reactor）
+    WRITE_QUEUE_SIZE = 2  # 后台写入队列的最大批次数，队列满时process_item阻塞等待（背压）
+    JOURNAL_DIR = None  # 本地日志目录，设置后缓存的数据先落盘，提交后删除，重启或数据库恢复后重放
+    JOURNAL_FSYNC = False  # 每行写入日志后是否fsync（更安全但更慢）
+    JOURNAL_RETRY_INTERVAL = 30  # 数据库不可用时重放日志的间隔（秒）
+    USE_PREPARED_STATEMENTS = False  # INSERT/UPSERT是否使用服务端预编译语句（PREPARE/EXECUTE），可在Item类上覆盖
+    PREPARED_MAX_ROWS = 500  # 单条预编译语句的最大行数（同时受PostgreSQL 65535个参数的限制）
+    POOL_MIN_CONN = 1  # 连接池最少保持的连接数（同一进程内连接参数相同的Pipeline共享连接池）
+    POOL_MAX_CONN = 10  # 连接池最大连接数
+    POOL_TIMEOUT = 30  # 连接池已满时等待可用连接的最长时间（秒）
+    HEALTH_CHECK_INTERVAL = 60  # 连接空闲超过该秒数时，借出前先执行SELECT 1检查
+    RECONNECT_ATTEMPTS = 3  # 建立连接失败时的重试次数（指数退避）
+    RECONNECT_BACKOFF = 0.5  # 重连退避的初始间隔（秒），每次翻倍
+    RECONNECT_BACKOFF_MAX = 10  # 重连退避的最大间隔（秒）
+    BATCH_RETRIES = 1  # 写入过程中连接断开时，换一个连接重新写入该批次的次数
+    STAGING_MERGE_INTERVAL = 30  # WRITE_MODE为'staging'时，暂存表中最早的数据超过该秒数后合并到目标表，可在Item类上覆盖
+    STAGING_MERGE_ROWS = 100000  # 暂存表累计超过该行数时立即合并，可在Item类上覆盖
+    LATEST_STATE_CACHE_SIZE = 100000  # 每张表在内存中缓存的最新状态哈希数量（Item配置了LATEST_STATE_KEY时使用）
+    CHANGE_CACHE_SIZE = 100000  # 每张表在内存中缓存的内容哈希数量（Item配置了CHANGE_KEY时使用）
+    CHANGE_CACHE_REDIS = False  # 是否把内容哈希同时保存到Redis（settings的REDIS_URL），多节点共享变化检测结果
+    CHANGE_CACHE_REDIS_KEY = 'sf_spider:changes:{table}'  # Redis哈希的键名
+    CHANGE_CACHE_REDIS_TTL = 7 * 24 * 3600  # Redis哈希的过期时间（秒），超过该时间没有写入时整体过期
+    CHANGE_CACHE_FLUSH_SIZE = 500  # 内容哈希在本地累积多少条后写入Redis
+    PROCESS_POOL_WORKERS = 0  # 大于0时由该数量的工作进程验证字段并编码COPY数据，主进程只缓存原始数据
+    PROCESS_POOL_MAX_PENDING = 4  # 进程池中未完成的批次数达到该值时，process_item返回Deferred等待（背压）
+    schema_cache = {}  # 进程级表结构缓存，记录已检查过的字段集合: {table_name: frozenset(fields)}
+    partition_cache = {}  # 进程级分区缓存，记录已存在的子分区名: {table_name: set(names)}，表不是分区表时为None
+    validation_plans = {}  # 按Item类缓存的字段验证计划: {ItemClass: ((field_name, ...), ...)}
+    item_columns = {}  # 按Item类缓存的固定列顺序: {ItemClass: (field1, field2...)}
+    statement_cache = {}  # 按(语句类型, 表名, 列顺序...)缓存的SQL文本
+    prepared_statements = {}  # 每个连接上已预编译的语句名（连接池中的连接由多个Pipeline共用）: {connection: {name}}
+    database_item_classes = {}  # 按Item类缓存是否实现了数据库配置接口: {ItemClass: bool}
 
     # Python类型到PostgreSQL类型的映射（支持长度限制）
     TYPE_MAPPING = {
@@ -25,123 +81,480 @@ class UniversalPostgreSQLPipeline:
     def __init__(self):
         """初始化Pipeline，设置数据库连接配置"""
         self.settings = get_project_settings()
-        self.conn = None  # 数据库连接对象
+        serializers.configure(self.settings)  # jsonb字段和本地日志使用的JSON序列化器（默认优先orjson）
+        self.pool = None  # 共享连接池，open_spider时获取
+        self.conn = None  # 主线程执行DDL时借用的数据库连接对象
         self.cur = None   # 数据库游标对象
+        self.spider = None  # 当前爬虫，open_spider时设置（批次写入前检查表结构时使用）
+        self.logger = None  # 爬虫日志对象，open_spider时设置
+        self.stats = None   # 爬虫统计对象，open_spider时设置
+        # 批次缓存属于Pipeline实例：同一进程中的多个爬虫各自缓存、写入和记录日志
+        self.batch_data = {}   # 按表名存储批量数据（按列顺序排列的元组）: {table_name: [row1, row2...]}
+        self.table_columns = {}  # 按表名记录当前批次的列顺序: {table_name: (field1, field2...)}
+        self.batch_started = {}  # 按表名记录批次中最早一行的缓存时间: {table_name: monotonic}
+        self.batch_bytes = {}  # 按表名记录批次的近似字节数: {table_name: bytes}
+        self.table_items = {}  # 按表名记录对应的Item类: {table_name: ItemClass}
+        self.session_tz = None  # 数据库会话时区（binary COPY编码无时区datetime时使用）
+        self.write_queue = None   # 后台写入队列: (table_name, data_list, segments)
+        self.write_thread = None  # 后台写入线程，每个批次从连接池借用连接
+        self.flush_loop = None  # 定时检查批次缓存时间的LoopingCall
+        self.journal = None  # 本地追加写日志（JOURNAL_DIR配置后启用）
+        self.spilled = deque()  # 因数据库不可用而积压在日志中的批次: (table_name, segments)
+        self.retry_loop = None  # 定时重放积压批次的LoopingCall
+        self.copy_encoders = {}  # 按(表名, 列顺序)缓存的binary COPY编码函数
+        self.write_modes = self.settings.getdict('POSTGRESQL_WRITE_MODES')  # settings中按表名指定的写入方式，优先于Item的WRITE_MODE
+        self.staging_tables = {}  # 暂存表状态: {table_name: {'name', 'columns', 'rows', 'since', 'segments'}}
+        self.staging_lock = threading.Lock()  # 主线程与后台写入线程共用暂存表状态
+        self.latest_state_cache = {}  # 按表名缓存最新状态的内容哈希: {table_name: LRUCache(自然键 -> 哈希)}
+        self.latest_state_checked = set()  # 已检查过最新状态表是否存在的Item类
+        self.latest_state_disabled = set()  # 最新状态表不存在、关闭状态过滤的Item类
+        self.change_caches = {}  # 按表名缓存的变化检测缓存: {table_name: ChangeCache}
+        self.change_fields = {}  # 按Item类缓存参与变化检测的字段: {ItemClass: (field1, field2...)}
+        self.json_columns = {}  # 按(表名, 列顺序)缓存可能包含dict/list值的列下标
+        self.process_pool = None  # 验证与编码的进程池（PROCESS_POOL_WORKERS大于0时创建）
+        self.raw_batches = {}  # 等待交给进程池的原始数据: {table_name: [按列顺序排列的原始数据行]}
+        self.raw_started = {}  # 原始数据批次中最早一行的缓存时间: {table_name: monotonic}
+        self.encoding = set()  # 进程池中未完成批次的Deferred
+        self.encode_waiters = []  # 因背压等待的process_item Deferred
 
     def open_spider(self, spider):
-        """爬虫启动时建立数据库连接"""
+        """爬虫启动时获取共享连接池"""
+        self.spider = spider
+        self.logger = spider.logger
+        self.stats = spider.crawler.stats if getattr(spider, 'crawler', None) else None
+        self._connect_signals(spider)
         try:
-            # 连接数据库，使用settings中的配置
-            self.conn = psycopg2.connect(
-                host=self.settings.get('POSTGRESQL_HOST', 'localhost'),
-                port=self.settings.get('POSTGRESQL_PORT', 5432),
-                dbname=self.settings.get('POSTGRESQL_DATABASE'),
-                user=self.settings.get('POSTGRESQL_USER'),
-                password=self.settings.get('POSTGRESQL_PASSWORD'),
-                options=f"-c search_path={self.settings.get('POSTGRESQL_SCHEMA', 'public')}"
-            )
-            # 使用DictCursor便于通过字段名访问数据
-            self.cur = self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            self.pool = self._connect()
             spider.logger.info("PostgreSQL连接成功")
         except Exception as e:
             spider.logger.error(f"PostgreSQL连接失败: {str(e)}")
             raise
 
+        # 后台写入模式：写入线程每个批次单独借用连接，避免与主线程的DDL共用事务
+        if self.ASYNC_WRITE:
+            self.write_queue = queue.Queue(maxsize=self.WRITE_QUEUE_SIZE)
+            self.write_thread = threading.Thread(target=self._writer_loop, name=f"pg-writer-{spider.name}", daemon=True)
+            self.write_thread.start()
+
+        # 定时检查缓存时间，队列空闲时数据也不会长时间停留在内存中
+        self.flush_loop = task.LoopingCall(self._flush_expired_batches)
+        self.flush_loop.start(self.FLUSH_CHECK_INTERVAL, now=False)
+
+        if self.PROCESS_POOL_WORKERS:
+            self.process_pool = process_pool.create_executor(self.PROCESS_POOL_WORKERS)
+
+        # 启用本地日志：先重放上次进程遗留的数据，再定时重放数据库不可用期间积压的批次
+        if self.JOURNAL_DIR:
+            self.journal = SpillJournal(os.path.join(self.JOURNAL_DIR, spider.name), fsync=self.JOURNAL_FSYNC)
+            self.spilled.extend(self.journal.recover())
+            if self.spilled:
+                spider.logger.info(f"发现{len(self.spilled)}组未提交的日志分段，开始重放")
+                self._retry_spilled()
+            self.retry_loop = task.LoopingCall(self._retry_spilled)
+            self.retry_loop.start(self.JOURNAL_RETRY_INTERVAL, now=False)
+
+    def _get_connect_kwargs(self):
+        """数据库连接参数，使用settings中的配置"""
+        return dict(
+            host=self.settings.get('POSTGRESQL_HOST', 'localhost'),
+            port=self.settings.get('POSTGRESQL_PORT', 5432),
+            dbname=self.settings.get('POSTGRESQL_DATABASE'),
+            user=self.settings.get('POSTGRESQL_USER'),
+            password=self.settings.get('POSTGRESQL_PASSWORD'),
+            options=f"-c search_path={self.settings.get('POSTGRESQL_SCHEMA', 'public')}"
+        )
+
+    def _connect(self):
+        """获取共享连接池，连接参数相同的Pipeline（如同一进程中的多个爬虫）共用连接"""
+        return acquire_pool(
+            self._get_connect_kwargs(),
+            minconn=self.POOL_MIN_CONN,
+            maxconn=self.POOL_MAX_CONN,
+            timeout=self.POOL_TIMEOUT,
+            health_check_interval=self.HEALTH_CHECK_INTERVAL,
+            reconnect_attempts=self.RECONNECT_ATTEMPTS,
+            reconnect_backoff=self.RECONNECT_BACKOFF,
+            reconnect_backoff_max=self.RECONNECT_BACKOFF_MAX,
+        )
+
+    @contextmanager
+    def _borrow(self):
+        """从连接池借用连接，返回(连接, 游标)，退出时归还（已断开的连接会被关闭）"""
+        conn = self.pool.getconn()
+        try:
+            # 使用DictCursor便于通过字段名访问数据
+            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            try:
+                yield conn, cur
+            finally:
+                if not conn.closed:
+                    cur.close()
+        finally:
+            self.pool.putconn(conn)
+
+    @contextmanager
+    def _ddl_connection(self):
+        """主线程检查表结构时借用连接，期间绑定到self.conn/self.cur"""
+        with self._borrow() as (self.conn, self.cur):
+            try:
+                yield
+            finally:
+                self.conn = self.cur = None
+
     def process_item(self, item, spider):
-        """处理单个Item，验证字段并加入批量队列"""
+        """处理单个Item或ItemBatch，加入批量队列（字段在批次写入前按列验证）"""
+        if not isinstance(item, records.ItemBatch) and self._is_unchanged(item):
+            return item
+        if self.process_pool is not None:
+            return self._buffer_raw_item(item, spider)
+        prepared = self._prepare_rows(item, spider)
+        if prepared is None:
+            return item
+
+        # 缓存数据到批量队列（表结构在批次写入前统一检查）
+        self._cache_batch_rows(*prepared)
+
+        return item
+
+    def _count_batch_items(self, item, signal, spider):
+        """ItemBatch只触发一次item_scraped/item_dropped信号，按其中的行数补足Scrapy的计数"""
+        if isinstance(item, records.ItemBatch) and len(item) > 1 and self.stats:
+            key = 'item_scraped_count' if signal is signals.item_scraped else 'item_dropped_count'
+            self.stats.inc_value(key, len(item) - 1, spider=spider)
+
+    def _connect_signals(self, spider):
+        """连接Scrapy信号（用于ItemBatch的计数）
+
+        同一个crawler只连接一次：启用了多个PostgreSQL Pipeline（如不同数据库的子类）时，计数也只补足一次。
+        """
+        crawler = getattr(spider, 'crawler', None)
+        if getattr(crawler, 'signals', None) is None or getattr(crawler, '_sf_batch_counter', None) is not None:
+            return
+        crawler._sf_batch_counter = self._count_batch_items
+        for signal in (signals.item_scraped, signals.item_dropped):
+            crawler.signals.connect(self._count_batch_items, signal=signal)
+
+    def _is_unchanged(self, item):
+        """Item配置了CHANGE_KEY时，按自然键比较内容哈希，与上次相同的Item在验证前跳过"""
+        item_cls = self._item_class(item)
+        return bool(getattr(item_cls, 'CHANGE_KEY', None)) and not self._changed_rows([item], item_cls)
+
+    def _changed_rows(self, rows, item_cls):
+        """返回内容发生变化（或首次出现）的行，rows为Item或ItemBatch中的字段字典，item_cls需配置CHANGE_KEY
+
+        每行按自然键比较内容哈希，本地缓存中没有的键批量查询Redis（一个ItemBatch只查询一次）。
+        自然键含None的行不比较；Redis不可用时不跳过，数据照常写入。
+        """
+        key_fields = item_cls.CHANGE_KEY
+        fields = self.change_fields.get(item_cls)
+        if fields is None:
+            ignored = set(key_fields) | set(getattr(item_cls, 'CHANGE_IGNORE_FIELDS', ()))
+            fields = self.change_fields[item_cls] = tuple(sorted(field for field in item_cls.fields if field not in ignored))
+
+        entries = []  # (行号, 缓存键, 内容哈希)
+        for index, row in enumerate(rows):
+            key = [row.get(field) for field in key_fields]
+            if None not in key:
+                entries.append((index, self._join_change_key(key), content_hash([row.get(field) for field in fields])))
+        if not entries:
+            return rows
+
+        cache = self.change_caches.get(item_cls.TABLE)
+        if cache is None:
+            cache = self.change_caches[item_cls.TABLE] = self._create_change_cache(item_cls.TABLE)
+        try:
+            results = cache.unchanged_many([(key, value_hash) for _, key, value_hash in entries])
+        except Exception as e:
+            # Redis不可用时不跳过，数据照常写入
+            self.logger.warning(f"变化检测缓存不可用: {str(e)}")
+            return rows
+        skipped = {index for (index, _, _), unchanged in zip(entries, results) if unchanged}
+        if not skipped:
+            return rows
+        if self.stats:
+            self.stats.inc_value('pipeline/change_cache/skipped', len(skipped))
+        return [row for index, row in enumerate(rows) if index not in skipped]
+
+    @staticmethod
+    def _join_change_key(key):
+        """自然键的字段值拼接为缓存键（按字符串拼接，验证前后的值如'1'与1得到相同的键）"""
+        return '\x1f'.join(map(str, key))
+
+    def _settle_change_keys(self, table_name, columns, data_list, failed=()):
+        """批次提交后记录各行的内容哈希，failed中的行（及failed为None时的整个批次）丢弃暂存的哈希
+
+        变化检测的哈希在行真正提交后才记录，验证或写入失败的数据之后再次出现时照常写入。
+        """
+        cache = self.change_caches.get(table_name)
+        key_fields = getattr(self.table_items.get(table_name), 'CHANGE_KEY', None)
+        if cache is None or not key_fields or not data_list or not set(key_fields) <= set(columns):
+            return
+        indexes = [columns.index(field) for field in key_fields]
+        failed_ids = {id(row) for row in failed} if failed is not None else None
+        entries = []
+        for row in data_list:
+            key = [row[index] for index in indexes]
+            if None not in key:
+                entries.append((self._join_change_key(key), failed_ids is not None and id(row) not in failed_ids))
+        try:
+            cache.settle(entries)
+        except Exception as e:
+            self.logger.warning(f"变化检测缓存不可用: {str(e)}")
+
+    def _create_change_cache(self, table_name):
+        """创建表的变化检测缓存，CHANGE_CACHE_REDIS为True时使用settings中的Redis连接"""
+        redis = None
+        if self.CHANGE_CACHE_REDIS:
+            from scrapy_redis.connection import get_redis_from_settings
+            redis = get_redis_from_settings(self.settings)
+        return ChangeCache(
+            self.CHANGE_CACHE_SIZE,
+            redis=redis,
+            redis_key=self.CHANGE_CACHE_REDIS_KEY.format(table=table_name),
+            flush_size=self.CHANGE_CACHE_FLUSH_SIZE,
+            ttl=self.CHANGE_CACHE_REDIS_TTL,
+        )
+
+    def _flush_change_caches(self):
+        """把变化检测缓存中累积的哈希写入Redis"""
+        for table_name, cache in self.change_caches.items():
+            try:
+                cache.flush()
+            except Exception as e:
+                self.logger.warning(f"变化检测缓存写入Redis失败: {table_name} {str(e)}")
+
+    def _prepare_rows(self, item, spider):
+        """检查Item配置，返回(表名, 列顺序, 未验证的数据行列表)；未实现数据库配置接口的Item返回None
+
+        item可以是Item、记录或ItemBatch。字段约束（类型、长度、必填项）在批次写入前由_validate_batch按列验证。
+        """
+        target = self._resolve_item(item, spider)
+        if target is None:
+            return None
+        item_cls, table_name, columns = target
+
+        # 同一张表的Item类变化时，先写入已缓存的旧批次（批次按Item类验证）
+        if self.batch_data.get(table_name) and self.table_items.get(table_name) is not item_cls:
+            self._batch_insert(table_name, 'columns')
+        self.table_items[table_name] = item_cls
+
+        return table_name, columns, self._extract_rows(item, item_cls, columns)
+
+    def _resolve_item(self, item, spider):
+        """检查Item配置，返回(Item类, 表名, 列顺序)；未实现数据库配置接口的Item返回None"""
         # 检查Item是否实现了必要的数据库配置接口
         if not self._is_valid_database_item(item):
             spider.logger.debug("跳过未实现数据库配置接口的Item")
-            return item
+            return None
 
         # 验证表名配置
-        table_name = item.TABLE
+        item_cls = self._item_class(item)
+        table_name = item_cls.TABLE
         if not table_name:
             raise DropItem("Item的TABLE属性未配置")
 
-        # 验证字段约束（类型、长度、必填项）
+        self._get_validation_plan(item_cls)
+        columns = self.item_columns[item_cls]
+        if not columns:
+            raise DropItem("Item没有有效字段")
+        if item_cls not in self.latest_state_checked:
+            self._check_latest_state_table(item_cls, spider)
+        return item_cls, table_name, columns
+
+    def _check_latest_state_table(self, item_cls, spider):
+        """Item类首次出现时检查最新状态表是否存在（Item类在爬虫运行后才能确定，无法在open_spider中检查）
+
+        未开启AUTO_CREATE_TABLE且状态表不存在时关闭该Item类的状态过滤并给出警告，数据行全部写入历史表，
+        否则每个批次都会因状态表不存在而写入失败。无法连接数据库时不记录检查结果，下次出现时重新检查。
+        """
+        if not latest_state.is_enabled(item_cls) or getattr(item_cls, 'AUTO_CREATE_TABLE', False):
+            self.latest_state_checked.add(item_cls)
+            return
+        state_table = latest_state.table_name_for(item_cls)
         try:
-            item_dict = self._validate_item_fields(item)
-        except ValueError as e:
-            raise DropItem(f"字段验证失败: {str(e)}")
+            with self._ddl_connection():
+                self.cur.execute("SELECT to_regclass(%s)", (state_table,))
+                exists = self.cur.fetchone()[0] is not None
+                self.conn.rollback()
+        except Exception as e:
+            spider.logger.warning(f"无法检查最新状态表 {state_table}: {str(e)}")
+            return
+        self.latest_state_checked.add(item_cls)
+        if not exists:
+            self.latest_state_disabled.add(item_cls)
+            spider.logger.warning(
+                f"最新状态表 {state_table} 不存在且 {item_cls.__name__} 未开启AUTO_CREATE_TABLE，"
+                f"表 {item_cls.TABLE} 关闭最新状态过滤；请执行 python -m sf_spider.schema apply 创建状态表"
+            )
 
-        if not item_dict:
-            raise DropItem("Item没有有效字段")
+    def _latest_state_enabled(self, item_cls):
+        """Item类配置了LATEST_STATE_KEY且状态表可用"""
+        return latest_state.is_enabled(item_cls) and item_cls not in self.latest_state_disabled
 
-        # 根据Item配置处理表结构
-        if item.AUTO_CREATE_TABLE:
-            self._ensure_table_structure(item, item_dict, spider)
+    def _extract_rows(self, item, item_cls, columns):
+        """取出Item（或ItemBatch中每一行）的原始字段值，ItemBatch中内容未变化的行（CHANGE_KEY）跳过"""
+        if not isinstance(item, records.ItemBatch):
+            return [self._extract_row(item, columns)]
+        if getattr(item_cls, 'CHANGE_KEY', None):
+            return [self._extract_row(row, columns) for row in self._changed_rows(item.rows, item_cls)]
+        return [self._extract_row(row, columns) for row in item.rows]
 
-        # 缓存数据到批量队列
-        self._cache_batch_data(table_name, item_dict)
+    @staticmethod
+    def _item_class(item):
+        """Item的类；记录和ItemBatch返回其对应的Item类（表名、验证和写入配置都取自Item类）"""
+        return item.item_class if isinstance(item, (records.Record, records.ItemBatch)) else type(item)
 
-        return item
+    @staticmethod
+    def _extract_row(item, columns):
+        """按列顺序取出Item的原始字段值"""
+        if records.is_record(item):
+            return tuple([getattr(item, field_name, None) for field_name in columns])
+        # 直接读取scrapy Item的内部字典，避免MutableMapping.get的额外开销
+        values = getattr(item, '_values', item)
+        return tuple([values.get(field_name) for field_name in columns])
 
     def _is_valid_database_item(self, item):
-        """检查Item是否实现了必要的数据库配置属性"""
-        required_attrs = ['TABLE', 'AUTO_CREATE_TABLE', 'ADD_AUTO_INCREMENT_ID', 'INDEXES', 'UNIQUE_CONSTRAINTS']
-        return all(hasattr(item, attr) for attr in required_attrs)
-
-    def _validate_item_fields(self, item):
-        """验证Item字段的类型、长度和必填项"""
-        validated_data = {}
-
-        for field_name in item.fields:
-            field = item.fields[field_name]
-            value = item.get(field_name)
-
-            # 处理默认值和必填项
-            if value is None:
-                if field.get('required', False):
-                    raise ValueError(f"字段 {field_name} 为必填项")
-                # 应用默认值
-                if 'default' in field:
-                    value = field['default']
-                elif 'default_factory' in field:
-                    value = field['default_factory']()
-                else:
-                    # 非必填且无默认值，显式设置为None并继续处理
-                    # 这样可以确保字段存在但值为None，在数据库中会存储为NULL
-                    validated_data[field_name] = None
-                    continue
+        """检查Item是否实现了必要的数据库配置属性（按Item类缓存结果）"""
+        item_cls = self._item_class(item)
+        valid = self.database_item_classes.get(item_cls)
+        if valid is None:
+            required_attrs = ['TABLE', 'AUTO_CREATE_TABLE', 'ADD_AUTO_INCREMENT_ID', 'INDEXES', 'UNIQUE_CONSTRAINTS']
+            valid = self.database_item_classes[item_cls] = all(hasattr(item_cls, attr) for attr in required_attrs)
+        return valid
 
-            # 验证并尝试转换类型
-            expected_type = field.get('type')
-            if expected_type and not isinstance(value, expected_type):
-                # 如果值为None且字段允许为空，跳过类型转换
-                if value is None and field.get('null', True):
-                    pass
-                else:
-                    # 首先检查是否有自定义的解析函数
-                    parser_func = field.get('parser_func')
-                    if parser_func and isinstance(value, str):
-                        try:
-                            value = parser_func(value)
-                            # 验证解析后的值是否为预期类型
-                            if not isinstance(value, expected_type):
-                                raise ValueError(f"解析后的值类型应为{expected_type.__name__}，实际为{type(value).__name__}")
-                        except Exception as e:
-                            raise ValueError(f"字段 {field_name} 解析失败: {str(e)}")
-                    else:
-                        # 尝试直接类型转换
-                        try:
-                            value = expected_type(value)
-                        except (ValueError, TypeError):
-                            raise ValueError(
-                                f"字段 {field_name} 类型错误，预期 {expected_type.__name__}，实际 {type(value).__name__}"
-                            )
+    def _validate_rows(self, item_cls, data_list):
+        """按列验证一批数据行（按Item类列顺序排列的元组），返回(验证通过的行列表, {行下标: 错误信息})
+
+        每列先整体检查类型，只对缺失和类型不符的值逐个处理默认值和类型转换，
+        再交给字段的validate_many检查字段自身的约束（如列表项类型、邮箱格式、选项）。
+        """
+        errors = {}
+        validated_columns = []
+        for index, entry in enumerate(self._get_validation_plan(item_cls)):
+            field_name, expected_type, convert, required, get_default, null, max_length, validate_many = entry
+            column = [row[index] for row in data_list]
+
+            # 处理默认值、必填项和类型转换（值为None且字段允许为空时跳过）
+            if expected_type:
+                pending = [i for i, value in enumerate(column) if value is None or not isinstance(value, expected_type)]
+            else:
+                pending = [i for i, value in enumerate(column) if value is None]
+            for i in pending:
+                value = column[i]
+                if value is None:
+                    if required:
+                        errors.setdefault(i, f"字段 {field_name} 为必填项")
+                        continue
+                    if get_default is None:
+                        # 非必填且无默认值，在数据库中会存储为NULL
+                        continue
+                    value = column[i] = get_default()
+                if expected_type and not isinstance(value, expected_type) and (value is not None or not null):
+                    try:
+                        column[i] = convert(value)
+                    except ValueError as e:
+                        errors.setdefault(i, str(e))
 
             # 验证长度限制
-            max_length = field.get('max_length')
             if max_length:
-                if isinstance(value, (str, list, dict)) and len(value) > max_length:
-                    raise ValueError(
-                        f"字段 {field_name} {'长度' if isinstance(value, str) else '元素数量'}超过限制，最大 {max_length}，实际 {len(value)}"
-                    )
+                for i, value in enumerate(column):
+                    if isinstance(value, (str, list, dict)) and len(value) > max_length:
+                        errors.setdefault(
+                            i, f"字段 {field_name} {'长度' if isinstance(value, str) else '元素数量'}超过限制，最大 {max_length}，实际 {len(value)}"
+                        )
 
-            validated_data[field_name] = value
+            # 字段自身的约束
+            if validate_many is not None:
+                field_errors = {}
+                column = validate_many(column, field_errors)
+                for i, message in field_errors.items():
+                    errors.setdefault(i, f"字段 {field_name} {message}")
+            validated_columns.append(column)
+
+        rows = list(zip(*validated_columns))
+        if errors:
+            rows = [row for i, row in enumerate(rows) if i not in errors]
+        return rows, errors
+
+    def _validate_batch(self, table_name, columns, data_list):
+        """写入前按列验证批次，验证失败的行记录日志并写入死信文件后丢弃"""
+        item_cls = self.table_items.get(table_name)
+        if item_cls is None:
+            return data_list
+        self._get_validation_plan(item_cls)
+        if self.item_columns[item_cls] != columns:
+            return data_list
+        rows, errors = self._validate_rows(item_cls, data_list)
+        if errors:
+            self._drop_invalid_rows(table_name, columns, data_list, errors)
+        return rows
+
+    def _drop_invalid_rows(self, table_name, columns, data_list, errors):
+        """记录验证失败的行：统计数量、输出日志，原始数据写入死信文件"""
+        if self.stats:
+            self.stats.inc_value('pipeline/validation/invalid_rows', len(errors))
+        first = min(errors)
+        self.logger.warning(f"表 {table_name} 有{len(errors)}条数据字段验证失败: {errors[first]}")
+        self._settle_change_keys(table_name, columns, [data_list[i] for i in sorted(errors)], None)
+        self._write_dead_letter_file(
+            table_name, columns, [(data_list[i], f"字段验证失败: {message}") for i, message in sorted(errors.items())]
+        )
+
+    def _get_validation_plan(self, item_cls):
+        """获取Item类的验证计划，每个Item类只编译一次"""
+        plan = self.validation_plans.get(item_cls)
+        if plan is None:
+            plan = self.validation_plans[item_cls] = self._compile_validation_plan(item_cls)
+            self.item_columns[item_cls] = tuple(entry[0] for entry in plan)
+        return plan
+
+    def _compile_validation_plan(self, item_cls):
+        """将Item类的字段定义编译为扁平的验证计划
+
+        每个字段对应一个元组：(字段名, 预期类型, 类型转换函数, 是否必填, 默认值函数, 允许为空, 最大长度, 批量验证函数)，
+        默认值函数为None表示没有默认值，批量验证函数为字段的validate_many（非models字段为None）。
+        """
+        plan = []
+        for field_name, field in item_cls.fields.items():
+            if 'default' in field:
+                get_default = lambda default=field['default']: default
+            elif 'default_factory' in field:
+                get_default = field['default_factory']
+            else:
+                get_default = None
+            expected_type = field.get('type')
+            plan.append((
+                field_name,
+                expected_type,
+                self._compile_converter(field_name, expected_type, field.get('parser_func')),
+                field.get('required', False),
+                get_default,
+                field.get('null', True),
+                field.get('max_length'),
+                getattr(field, 'validate_many', None),
+            ))
+        return tuple(plan)
 
-        return validated_data
+    @staticmethod
+    def _compile_converter(field_name, expected_type, parser_func):
+        """生成字段的类型转换函数：字符串优先使用自定义解析函数，否则直接调用预期类型转换"""
+        def convert(value):
+            if parser_func and isinstance(value, str):
+                try:
+                    value = parser_func(value)
+                    # 验证解析后的值是否为预期类型
+                    if not isinstance(value, expected_type):
+                        raise ValueError(f"解析后的值类型应为{expected_type.__name__}，实际为{type(value).__name__}")
+                except Exception as e:
+                    raise ValueError(f"字段 {field_name} 解析失败: {str(e)}")
+                return value
+            try:
+                return expected_type(value)
+            except (ValueError, TypeError):
+                raise ValueError(
+                    f"字段 {field_name} 类型错误，预期 {expected_type.__name__}，实际 {type(value).__name__}"
+                )
+        return convert
 
     def _get_pg_type(self, item, field_name, value):
         """根据字段定义获取PostgreSQL类型（支持长度限制）"""
@@ -161,8 +574,80 @@ class UniversalPostgreSQLPipeline:
             return pg_type
         return type_mapper
 
+    def _is_schema_cached(self, table_name, fields):
+        """检查表结构是否已针对这些字段检查过，出现新字段时需要重新检查"""
+        cached_fields = self.schema_cache.get(table_name)
+        return cached_fields is not None and cached_fields.issuperset(fields)
+
+    def _ensure_batch_schema(self, table_name, columns, data_list):
+        """批次写入前检查表结构（字段集合已检查过则跳过，避免每个批次都查询系统表）
+
+        整个批次缺失的字段合并为一条ALTER TABLE，与建表、索引、约束一起在一个事务中提交。
+        未声明类型的字段按批次中第一个非空值推断类型。
+        """
+        item_cls = self.table_items.get(table_name)
+        if not getattr(item_cls, 'AUTO_CREATE_TABLE', False) or self._is_schema_cached(table_name, columns):
+            return
+        sample = {
+            column: next((row[index] for row in data_list if row[index] is not None), None)
+            for index, column in enumerate(columns)
+        }
+        try:
+            with self._ddl_connection():
+                self._ensure_table_structure(item_cls, sample, self.spider)
+        except Exception as e:
+            self.logger.error(f"表结构处理失败，无法获取数据库连接: {str(e)}")
+
+    def _ensure_batch_partitions(self, table_name, columns, data_list):
+        """分区表写入前按需创建批次涉及的子分区，已存在的分区缓存在进程内，只在出现新分区时执行DDL
+
+        分区创建失败时抛出异常，批次不写入：否则这些行会进入DEFAULT分区，之后该范围的子分区再也无法创建。
+        """
+        item_cls = self.table_items.get(table_name)
+        if not partitions.is_partitioned(item_cls) or item_cls.PARTITION_KEY not in columns:
+            return
+        try:
+            # 首次写入时读取已有分区和会话时区（边界按会话时区计算）
+            if table_name not in self.partition_cache or self.session_tz is None:
+                with self._ddl_connection():
+                    existing = partitions.load_partitions(self.cur, table_name)
+                    self.partition_cache[table_name] = None if existing is None else set(existing)
+                    self._get_session_tz(self.cur)
+                if self.partition_cache[table_name] is None:
+                    self.logger.warning(f"表 {table_name} 配置了PARTITION_KEY但不是分区表，不创建子分区")
+            known = self.partition_cache[table_name]
+            if known is None:
+                return
+
+            index = columns.index(item_cls.PARTITION_KEY)
+            missing = {}
+            for row in data_list:
+                if row[index] is not None:
+                    suffix, lower, upper = partitions.partition_bounds(row[index], item_cls.PARTITION_INTERVAL, self.session_tz)
+                    if f"{table_name}_p{suffix}" not in known:
+                        missing[suffix] = (lower, upper)
+            if not missing:
+                return
+
+            with self._ddl_connection():
+                for suffix, (lower, upper) in sorted(missing.items()):
+                    self.cur.execute(partitions.create_partition_sql(table_name, suffix, lower, upper))
+                # IF NOT EXISTS遇到同名的普通表（如已卸载的旧分区）时不会报错，需确认分区已挂到父表上
+                attached = partitions.load_partitions(self.cur, table_name)
+                detached = sorted(f"{table_name}_p{suffix}" for suffix in missing if f"{table_name}_p{suffix}" not in attached)
+                if detached:
+                    raise Exception(f"同名的表已存在但不是 {table_name} 的分区: {', '.join(detached)}")
+                self.conn.commit()
+            known.update(f"{table_name}_p{suffix}" for suffix in missing)
+            if self.stats:
+                self.stats.inc_value('pipeline/partition/created', len(missing))
+            self.logger.info(f"表 {table_name} 已创建分区: {', '.join(sorted(missing))}")
+        except Exception as e:
+            self.logger.error(f"分区处理失败，批次暂不写入: {table_name} {str(e)}")
+            raise
+
     def _ensure_table_structure(self, item, item_dict, spider):
-        """确保表结构完整（表、字段、索引、约束）"""
+        """在一个事务中确保表结构完整（表、字段、索引、约束），item可以是Item类或实例"""
         table_name = item.TABLE
         try:
             # 检查表是否存在
@@ -183,9 +668,16 @@ class UniversalPostgreSQLPipeline:
 
             # 处理索引和约束
             self._create_indexes_and_constraints(item, spider)
+            if latest_state.is_enabled(item):
+                self._ensure_latest_state_table(item, item_dict, spider)
+            self.conn.commit()
+
+            # 检查成功后缓存字段集合，同一进程内不再重复检查
+            self.schema_cache[table_name] = self.schema_cache.get(table_name, frozenset()) | frozenset(item_dict)
 
         except Exception as e:
-            self.conn.rollback()
+            if not self.conn.closed:
+                self.conn.rollback()
             spider.logger.error(f"表结构处理失败: {str(e)}")
 
     def _create_table(self, item, item_dict, spider):
@@ -205,21 +697,23 @@ class UniversalPostgreSQLPipeline:
             if comment:
                 comments.append((field_name, comment.replace("'", "''")))
 
-        # 添加自增主键
+        columns_def.reverse()
+        # 添加自增主键（分区表的主键需包含分区字段）
         if item.ADD_AUTO_INCREMENT_ID:
-            columns_def.append("id SERIAL PRIMARY KEY")
+            id_def, *primary_key = partitions.primary_key_defs(item)
+            columns_def = [id_def] + columns_def + primary_key
 
-        columns_def.reverse()
-        # 创建表
-        create_sql = f"CREATE TABLE {table_name} ({', '.join(columns_def)})"
+        # 创建表，分区表同时创建DEFAULT分区
+        create_sql = f"CREATE TABLE {table_name} ({', '.join(columns_def)}){partitions.partition_clause(item)}"
         self.cur.execute(create_sql)
-        
+        if partitions.is_partitioned(item):
+            self.cur.execute(partitions.default_partition_sql(table_name))
+
         # 添加字段注释
         for field_name, comment in comments:
             comment_sql = f"COMMENT ON COLUMN {table_name}.{field_name} IS '{comment}'"
             self.cur.execute(comment_sql)
-            
-        self.conn.commit()
+
         spider.logger.info(f"已创建表: {table_name}")
 
     def _add_missing_fields(self, item, table_name, item_dict, spider):
@@ -229,26 +723,48 @@ class UniversalPostgreSQLPipeline:
             SELECT column_name FROM information_schema.columns 
             WHERE table_name = %s
         """, (table_name,))
-        existing_fields = [row[0] for row in self.cur.fetchall()]
+        existing_fields = {row[0] for row in self.cur.fetchall()}
+        missing_fields = [field_name for field_name in item_dict if field_name not in existing_fields]
+        if not missing_fields:
+            return
 
-        # 添加缺失字段
-        for field_name in item_dict:
-            if field_name not in existing_fields:
-                value = item_dict[field_name]
-                pg_type = self._get_pg_type(item, field_name, value)
-                comment = item.fields[field_name].get('comment', '')
-                
-                # 添加字段
-                alter_sql = f"ALTER TABLE {table_name} ADD COLUMN {field_name} {pg_type}"
-                self.cur.execute(alter_sql)
-                
-                # 添加注释
-                if comment:
-                    comment_sql = f"COMMENT ON COLUMN {table_name}.{field_name} IS '{comment}'"
-                    self.cur.execute(comment_sql)
-                    
-                self.conn.commit()
-                spider.logger.info(f"表 {table_name} 已添加字段: {field_name}")
+        # 所有缺失字段合并为一条ALTER TABLE，只获取一次表锁
+        add_columns = [
+            f"ADD COLUMN IF NOT EXISTS {field_name} {self._get_pg_type(item, field_name, item_dict[field_name])}"
+            for field_name in missing_fields
+        ]
+        self.cur.execute(f"ALTER TABLE {table_name} {', '.join(add_columns)}")
+
+        # 添加注释
+        for field_name in missing_fields:
+            comment = item.fields[field_name].get('comment', '').replace("'", "''")
+            if comment:
+                comment_sql = f"COMMENT ON COLUMN {table_name}.{field_name} IS '{comment}'"
+                self.cur.execute(comment_sql)
+
+        spider.logger.info(f"表 {table_name} 已添加字段: {', '.join(missing_fields)}")
+
+    def _ensure_latest_state_table(self, item, item_dict, spider):
+        """创建最新状态表或添加缺失的状态字段（与历史表的结构检查在同一个事务中）"""
+        state_table = latest_state.table_name_for(item)
+        field_types = self._latest_state_field_types(item, latest_state.state_columns(item, item_dict))
+        self.cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = %s
+        """, (state_table,))
+        existing_fields = {row[0] for row in self.cur.fetchall()}
+        if not existing_fields:
+            self.cur.execute(latest_state.create_table_sql(state_table, field_types[0][0], field_types))
+            spider.logger.info(f"已创建最新状态表: {state_table}")
+            return
+        missing = [(field, pg_type) for field, pg_type in field_types[1:] if field not in existing_fields]
+        if missing:
+            self.cur.execute(f"ALTER TABLE {state_table} {', '.join(f'ADD COLUMN IF NOT EXISTS {field} {pg_type}' for field, pg_type in missing)}")
+            spider.logger.info(f"表 {state_table} 已添加字段: {', '.join(field for field, _ in missing)}")
+
+    def _latest_state_field_types(self, item_cls, state_columns):
+        """最新状态表各字段的PostgreSQL类型: [(字段, 类型)]，第一个字段为自然键"""
+        return [(field, self._get_pg_type(item_cls, field, None) or 'text') for field in state_columns]
 
     def _create_indexes_and_constraints(self, item, spider):
         """创建索引和联合唯一约束"""
@@ -265,21 +781,18 @@ class UniversalPostgreSQLPipeline:
             """, (index_name, table_name))
             if not self.cur.fetchone()[0]:
                 self.cur.execute(f"CREATE INDEX {index_name} ON {table_name} ({field})")
-                self.conn.commit()
                 spider.logger.info(f"已创建索引: {index_name}")
 
         # 创建联合唯一约束
         for constraint in item.UNIQUE_CONSTRAINTS:
             # 处理约束配置
-            if isinstance(constraint, list):
-                fields = constraint
-                constraint_name = f"uk_{table_name}_{'_'.join(fields)}"
-            elif isinstance(constraint, dict):
-                fields = constraint["fields"]
-                constraint_name = constraint["name"]
-            else:
+            fields, constraint_name = self._parse_constraint(table_name, constraint)
+            if not fields:
                 spider.logger.warning(f"无效的约束配置: {constraint}")
                 continue
+            if not partitions.supports_unique(item, fields):
+                spider.logger.warning(f"分区表的唯一约束必须包含分区字段 {item.PARTITION_KEY}，已跳过: {constraint_name}")
+                continue
 
             # 检查约束是否已存在
             self.cur.execute(f"""
@@ -291,74 +804,1144 @@ class UniversalPostgreSQLPipeline:
             if not self.cur.fetchone()[0]:
                 fields_str = ", ".join(fields)
                 self.cur.execute(f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint_name} UNIQUE ({fields_str})")
-                self.conn.commit()
                 spider.logger.info(f"已创建联合唯一约束: {constraint_name}")
 
-    def _cache_batch_data(self, table_name, item_dict):
-        """缓存批量数据并在达到阈值时插入"""
+    def _parse_constraint(self, table_name, constraint):
+        """解析约束配置，返回(字段列表, 约束名)，配置无效时返回(None, None)"""
+        if isinstance(constraint, list):
+            return constraint, f"uk_{table_name}_{'_'.join(constraint)}"
+        if isinstance(constraint, dict):
+            return constraint["fields"], constraint["name"]
+        return None, None
+
+    def _cache_batch_rows(self, table_name, columns, rows):
+        """缓存多行数据，每达到一次触发条件插入一次（按行数触发的批次不超过BATCH_SIZE）
+
+        某次插入失败时（批次已放回队列），其余的行照常缓存并写入日志，之后不再触发插入，全部缓存后再抛出异常。
+        """
         # 初始化表的批量数据列表
         if table_name not in self.batch_data:
             self.batch_data[table_name] = []
-        
-        # 添加数据到批量队列
-        self.batch_data[table_name].append(item_dict)
 
-        # 达到批次大小时执行插入
-        if len(self.batch_data[table_name]) >= self.BATCH_SIZE:
-            self._batch_insert(table_name)
+        # 同一张表的列顺序变化时（如Item类新增了字段），先写入已缓存的旧批次
+        if self.batch_data[table_name] and self.table_columns.get(table_name) != columns:
+            self._batch_insert(table_name, 'columns')
+        self.table_columns[table_name] = columns
+
+        batch_size = self._get_batch_option(table_name, 'BATCH_SIZE')
+        error = None
+        start = 0
+        while start < len(rows):
+            # 添加数据到批量队列，记录批次开始时间和近似大小
+            data_list = self.batch_data[table_name]
+            if not data_list:
+                self.batch_started[table_name] = time.monotonic()
+            chunk = rows[start:start + max(batch_size - len(data_list), 1)]
+            start += len(chunk)
+            data_list.extend(chunk)
+            self.batch_bytes[table_name] = self.batch_bytes.get(table_name, 0) + sum([self._estimate_row_bytes(row) for row in chunk])
+            if self.journal:
+                item_cls = self.table_items[table_name]
+                item_path = f"{item_cls.__module__}.{item_cls.__name__}"
+                for row in chunk:
+                    self.journal.append(table_name, item_path, columns, row)
+
+            # 达到任一触发条件时执行插入
+            reason = self._get_flush_reason(table_name) if error is None else None
+            if reason:
+                try:
+                    self._batch_insert(table_name, reason)
+                except Exception as e:
+                    error = e
+        if error is not None:
+            raise error
+
+    def _get_batch_option(self, table_name, name):
+        """获取批量写入配置，Item类上的配置优先于Pipeline上的配置"""
+        value = getattr(self.table_items.get(table_name), name, None)
+        return value if value is not None else getattr(self, name)
 
-    def _batch_insert(self, table_name):
-        """执行批量插入操作"""
-        if not self.batch_data[table_name]:
+    def _estimate_row_bytes(self, row):
+        """估算一行数据的字节数（用于BATCH_MAX_BYTES，不要求精确）"""
+        size = 0
+        for value in row:
+            if isinstance(value, str):
+                size += len(value)
+            elif isinstance(value, (dict, list)):
+                size += len(str(value))
+            elif value is not None:
+                size += 8
+        return size
+
+    def _get_flush_reason(self, table_name):
+        """检查批次是否达到写入条件，返回触发原因（rows/bytes/age），未达到时返回None"""
+        if len(self.batch_data[table_name]) >= self._get_batch_option(table_name, 'BATCH_SIZE'):
+            return 'rows'
+        max_bytes = self._get_batch_option(table_name, 'BATCH_MAX_BYTES')
+        if max_bytes and self.batch_bytes.get(table_name, 0) >= max_bytes:
+            return 'bytes'
+        max_age = self._get_batch_option(table_name, 'BATCH_MAX_AGE')
+        started = self.batch_started.get(table_name)
+        if max_age and started is not None and time.monotonic() - started >= max_age:
+            return 'age'
+        return None
+
+    def _flush_expired_batches(self):
+        """定时任务：写入缓存时间超过BATCH_MAX_AGE的批次，同步写入时同时合并到期的暂存表"""
+        for table_name in list(self.batch_data):
+            if self.batch_data[table_name] and self._get_flush_reason(table_name) == 'age':
+                try:
+                    self._batch_insert(table_name, 'age')
+                except Exception as e:
+                    self.logger.error(f"定时写入失败: {str(e)}")
+        for table_name, started in list(self.raw_started.items()):
+            max_age = self._get_batch_option(table_name, 'BATCH_MAX_AGE')
+            if max_age and time.monotonic() - started >= max_age:
+                try:
+                    self._submit_raw_batch(table_name)
+                except Exception as e:
+                    self.logger.error(f"定时提交进程池批次失败: {str(e)}")
+        if self.write_queue is None:
+            self._merge_due_staging()
+        self._flush_change_caches()
+
+    def _batch_insert(self, table_name, reason=None):
+        """取出表的批量数据并写入，后台写入模式下交给写入线程"""
+        batch = self._take_batch(table_name, reason)
+        if batch is None:
             return
+        self._dispatch_batch(table_name, *batch)
 
+    def _dispatch_batch(self, table_name, columns, data_list, segments, started, size):
+        """检查表结构和分区后写入批次，后台写入模式下交给写入线程"""
         try:
-            data_list = self.batch_data[table_name]
-            if not data_list:
+            self._ensure_batch_schema(table_name, columns, data_list)
+            self._ensure_batch_partitions(table_name, columns, data_list)
+            if self.write_queue is not None:
+                self.write_queue.put((table_name, columns, data_list, segments))
                 return
-                
-            # 获取所有可能的字段（从第一个数据项的字段和表结构中获取）
-            all_fields = set()
-            for data in data_list:
-                all_fields.update(data.keys())
-            all_fields = sorted(all_fields)  # 保持字段顺序一致
-            
-            # 构建插入语句
-            field_names = ", ".join(all_fields)
-            placeholders = ", ".join([f"%({k})s" for k in all_fields])
-            
-            # 为每个数据项补充缺失的字段为None
-            complete_data_list = []
-            for data in data_list:
-                complete_data = {}
-                for field in all_fields:
-                    complete_data[field] = data.get(field)  # 缺失的字段设为None
-                complete_data_list.append(complete_data)
-
-            # 执行批量插入
-            query = f"INSERT INTO {table_name} ({field_names}) VALUES ({placeholders})"
-            psycopg2.extras.execute_batch(self.cur, query, complete_data_list)
-            self.conn.commit()
-            
-            # 清理批量数据
-            self.batch_data[table_name] = []
+            self._commit_batch(table_name, columns, data_list, segments)
+        except Exception:
+            # 分区创建失败或同步写入失败时数据放回队列，下次写入时重试
+            if not self.batch_data.get(table_name):
+                self.table_columns[table_name] = columns
+            self.batch_data[table_name] = data_list + self.batch_data.get(table_name, [])
+            self.batch_started[table_name] = started
+            self.batch_bytes[table_name] = size + self.batch_bytes.get(table_name, 0)
+            if self.journal:
+                self.journal.restore(table_name, segments)
+            raise
+
+    def _buffer_raw_item(self, item, spider):
+        """进程池模式：只缓存Item（或ItemBatch）的原始字段，验证和编码在批次交给进程池后进行"""
+        target = self._resolve_item(item, spider)
+        if target is None:
+            return item
+        item_cls, table_name, columns = target
+
+        # 同一张表的Item类变化时，先提交已缓存的原始数据
+        if self.raw_batches.get(table_name) and self.table_items.get(table_name) is not item_cls:
+            self._submit_raw_batch(table_name)
+        self.table_items[table_name] = item_cls
+        batch_size = self._get_batch_option(table_name, 'BATCH_SIZE')
+        item_path = f"{item_cls.__module__}.{item_cls.__name__}"
+        for row in self._extract_rows(item, item_cls, columns):
+            raw_rows = self.raw_batches.setdefault(table_name, [])
+            if not raw_rows:
+                self.raw_started[table_name] = time.monotonic()
+            raw_rows.append(row)
+            if self.journal:
+                # 原始数据在缓存时落盘（独立的分段），进程池编码期间崩溃也能重放
+                self.journal.append(table_name, item_path, columns, row, stream='raw')
+            if len(raw_rows) >= batch_size:
+                self._submit_raw_batch(table_name)
+
+        # 进程池中未完成的批次过多时，返回Deferred让Scrapy暂停向本Pipeline输送Item
+        if len(self.encoding) >= self.PROCESS_POOL_MAX_PENDING:
+            waiter = defer.Deferred()
+            waiter.addCallback(lambda _: item)
+            self.encode_waiters.append(waiter)
+            return waiter
+        return item
+
+    def _submit_raw_batch(self, table_name):
+        """把表的原始数据交给进程池验证和编码，完成后在reactor线程中写入"""
+        raw_rows = self.raw_batches.pop(table_name, None)
+        self.raw_started.pop(table_name, None)
+        if not raw_rows:
+            return
+        segments = self.journal.seal(table_name, stream='raw') if self.journal else []
+        item_cls = self.table_items[table_name]
+        self._get_validation_plan(item_cls)
+        columns = self.item_columns[item_cls]
+
+        try:
+            # COPY写入的表同时在工作进程中编码（最新状态表会过滤数据行，编码结果无法复用）
+            copy_format = pg_types = None
+            if self._get_write_mode(item_cls) in ('copy', 'staging') and not self._latest_state_enabled(item_cls):
+                copy_format = getattr(item_cls, 'COPY_FORMAT', 'text')
+                if copy_format == 'binary':
+                    pg_types = [self._get_pg_type(item_cls, field, None) for field in columns]
+                    if self.session_tz is None:
+                        with self._borrow() as (conn, cur):
+                            self._get_session_tz(cur)
+                            conn.rollback()
+
+            future = self.process_pool.submit(
+                process_pool.validate_and_encode,
+                f"{type(self).__module__}.{type(self).__qualname__}",
+                f"{item_cls.__module__}.{item_cls.__qualname__}",
+                raw_rows, copy_format, pg_types, self.session_tz,
+            )
+        except Exception as e:
+            # 进程池不可用（如BrokenProcessPool）或无法获取会话时区时，原始数据改为在主进程验证，不会丢失
+            self._validate_raw_rows(table_name, item_cls, columns, raw_rows, segments, str(e))
+            return
+        d = self._deferred_from_future(future)
+        self.encoding.add(d)
+        d.addCallbacks(
+            self._write_encoded_batch, self._encode_failed,
+            callbackArgs=(table_name, columns, copy_format, raw_rows, segments),
+            errbackArgs=(table_name, item_cls, columns, raw_rows, segments),
+        )
+        d.addErrback(lambda failure: self.logger.error(f"进程池批次写入失败: {table_name} {failure.getErrorMessage()}"))
+        d.addBoth(self._encode_finished, d)
+
+    @staticmethod
+    def _deferred_from_future(future):
+        """把concurrent.futures.Future转换为Deferred，结果在reactor线程中返回"""
+        # 在函数内导入reactor，避免导入本模块时安装默认reactor（Scrapy需要先安装asyncio reactor）
+        from twisted.internet import reactor
+
+        d = defer.Deferred()
+        future.add_done_callback(lambda _: reactor.callFromThread(d.callback, None))
+        d.addCallback(lambda _: future.result())
+        return d
+
+    def _write_encoded_batch(self, result, table_name, columns, copy_format, raw_rows, segments):
+        """进程池完成验证和编码后写入批次，之前写入失败放回队列的数据一起写入
+
+        segments为原始数据缓存时写入的日志分段（其中验证失败的行在重放时会再次被验证丢弃）。
+        """
+        rows, errors, payload = result
+        if self.stats:
+            self.stats.inc_value('pipeline/process_pool/rows', len(rows))
+        if errors:
+            self._drop_invalid_rows(table_name, columns, raw_rows, errors)
+        if not rows:
+            if self.journal:
+                self.journal.discard(segments)
+            return
+
+        data_list = pg_copy.EncodedRows(rows, copy_format, payload) if payload is not None else rows
+        started = time.monotonic()
+        size = sum([self._estimate_row_bytes(row) for row in rows])
+        if self.batch_data.get(table_name) and self.table_columns.get(table_name) == columns:
+            _, restored, restored_segments, started, restored_size = self._take_batch(table_name)
+            data_list = restored + data_list
+            segments = restored_segments + segments
+            size += restored_size
+        self._dispatch_batch(table_name, columns, data_list, segments, started, size)
+
+    def _encode_failed(self, failure, table_name, item_cls, columns, raw_rows, segments):
+        """工作进程无法处理批次（如Item类无法导入、工作进程异常退出）时改为在主进程验证"""
+        self._validate_raw_rows(table_name, item_cls, columns, raw_rows, segments, failure.getErrorMessage())
+
+    def _validate_raw_rows(self, table_name, item_cls, columns, raw_rows, segments, reason):
+        """原始数据改为在主进程验证：放入批量队列（重新写入日志），原来的原始数据分段随后删除
+
+        先写入的旧批次失败时原始数据未放入队列，分段保留在日志目录中，下次启动时重放。
+        """
+        self.logger.warning(f"进程池处理失败，改为在主进程验证: {table_name} {reason}")
+        if self.stats:
+            self.stats.inc_value('pipeline/process_pool/fallback_rows', len(raw_rows))
+        if self.batch_data.get(table_name) and self.table_items.get(table_name) is not item_cls:
+            self._batch_insert(table_name, 'columns')
+        self.table_items[table_name] = item_cls
+        try:
+            self._cache_batch_rows(table_name, columns, raw_rows)
+        finally:
+            # 插入失败时全部数据行也已缓存并写入日志（见_cache_batch_rows）
+            if self.journal:
+                self.journal.discard(segments)
+
+    def _encode_finished(self, result, d):
+        """进程池批次完成后释放因背压等待的Item"""
+        self.encoding.discard(d)
+        if len(self.encoding) < self.PROCESS_POOL_MAX_PENDING:
+            waiters, self.encode_waiters = self.encode_waiters, []
+            for waiter in waiters:
+                waiter.callback(None)
+
+    def _take_batch(self, table_name, reason=None):
+        """双缓冲：取出表的批量数据并立即换上新列表继续接收数据
+
+        批次在取出前按列验证，返回(列顺序, 验证通过的数据行列表, 日志分段, 批次开始时间, 近似字节数)，
+        没有数据（或全部未通过验证）时返回None
+        """
+        data_list = self.batch_data.get(table_name)
+        if not data_list:
+            return None
+        columns = self.table_columns[table_name]
+        rows = self._validate_batch(table_name, columns, data_list)
+        self.batch_data[table_name] = []
+        started = self.batch_started.pop(table_name, None)
+        size = self.batch_bytes.pop(table_name, 0)
+        segments = self.journal.seal(table_name) if self.journal else []
+        if reason and self.stats:
+            self.stats.inc_value(f'pipeline/flush/{reason}')
+        if not rows:
+            # 整个批次都未通过验证
+            if self.journal:
+                self.journal.discard(segments)
+            return None
+        return columns, rows, segments, started, size
+
+    def _commit_batch(self, table_name, columns, data_list, segments):
+        """借用连接写入一个批次，成功后删除对应的日志分段
+
+        写入过程中连接断开时换一个连接重新写入（最多BATCH_RETRIES次）；仍然失败且启用了日志时转入积压队列等待重放。
+        表结构类错误（表或字段不存在、权限不足等）与数据无关，同样转入积压队列，修复表结构后重放，不隔离数据。
+        """
+        retries = 0
+        while True:
+            conn = None
+            closed = False
+            try:
+                with self._borrow() as (conn, cur):
+                    try:
+                        self._write_rows(table_name, columns, data_list, conn, cur)
+                    except Exception:
+                        # 在归还前记录连接状态：连接池会关闭多余的空闲连接，归还后的closed不能说明连接已断开
+                        closed = bool(conn.closed)
+                        raise
+                break
+            except Exception as e:
+                # 无法借出连接（重连已退避重试过）或写入时连接断开，视为数据库不可用
+                connection_lost = conn is None or closed
+                if connection_lost and conn is not None and retries < self.BATCH_RETRIES:
+                    retries += 1
+                    if self.stats:
+                        self.stats.inc_value('pipeline/pool/retried_batches')
+                    self.logger.warning(f"写入时数据库连接断开，重新写入批次: {table_name} {len(data_list)}条, {str(e)}")
+                    continue
+                schema_error = isinstance(e.__cause__ or e, psycopg2.ProgrammingError)
+                if self.journal and (connection_lost or schema_error):
+                    self._spill(table_name, data_list, segments, str(e) if schema_error else None)
+                    return
+                raise
+        if self._get_write_mode(self.table_items.get(table_name)) == 'staging':
+            # 暂存表中的数据合并到目标表后才删除日志分段
+            self._record_staged(table_name, len(data_list), segments)
+            try:
+                self._merge_staging_if_due(table_name)
+            except Exception as e:
+                # 批次已提交到暂存表，合并失败不算写入失败：数据留在暂存表中，下次合并时重试
+                self.logger.error(f"暂存表合并失败: {table_name} {str(e)}")
+        elif self.journal:
+            self.journal.discard(segments)
+
+    def _spill(self, table_name, data_list, segments, schema_error=None):
+        """数据库不可用或表结构错误（schema_error为错误信息）：批次只保留在日志中，释放内存，等待定时重放"""
+        self.spilled.append((table_name, segments))
+        if self.stats:
+            self.stats.inc_value('pipeline/journal/spilled_rows', len(data_list))
+        if schema_error:
+            self.logger.error(f"表结构错误，{table_name} {len(data_list)}条数据暂存于本地日志，修复后自动重放: {schema_error}")
+        else:
+            self.logger.warning(f"数据库连接不可用，{table_name} {len(data_list)}条数据暂存于本地日志")
+
+    def _retry_spilled(self):
+        """定时任务：重连数据库并重放积压在日志中的批次"""
+        if not self.spilled:
+            return
+        try:
+            with self._borrow():
+                pass
+        except psycopg2.Error as e:
+            self.logger.warning(f"PostgreSQL重新连接失败: {str(e)}")
+            return
+
+        for _ in range(len(self.spilled)):
+            table_name, segments = self.spilled.popleft()
+            columns, data_list = self._load_journal_rows(table_name, segments)
+            if not data_list:
+                self.journal.discard(segments)
+                continue
+            if self.stats:
+                self.stats.inc_value('pipeline/journal/replayed_rows', len(data_list))
+            try:
+                # 启动时重放的进程中表结构缓存为空，与_dispatch_batch一样先检查表结构再创建分区
+                self._ensure_batch_schema(table_name, columns, data_list)
+                self._ensure_batch_partitions(table_name, columns, data_list)
+            except Exception:
+                # 分区仍无法创建，批次留在积压队列中等待下次重放
+                self.spilled.appendleft((table_name, segments))
+                break
+            if self.write_queue is not None:
+                self.write_queue.put((table_name, columns, data_list, segments))
+                continue
+            spilled_count = len(self.spilled)
+            try:
+                self._commit_batch(table_name, columns, data_list, segments)
+            except Exception as e:
+                self.logger.error(f"日志重放失败，分段已隔离: {table_name} {str(e)}")
+                self._settle_change_keys(table_name, columns, data_list, None)
+                self.journal.quarantine(segments)
+            if len(self.spilled) > spilled_count:
+                # 数据库再次不可用，剩余批次等待下次重放
+                break
+
+    def _load_journal_rows(self, table_name, segments):
+        """读取日志分段并按Item字段类型还原日期时间值，返回(列顺序, 数据行列表)
+
+        日志中保存的是未验证的原始数据，还原后按列重新验证。
+        """
+        item_path, columns, data_list = self.journal.load(segments)
+        item_cls = self.table_items.get(table_name)
+        if item_cls is None and item_path:
+            try:
+                item_cls = self.table_items[table_name] = load_object(item_path)
+            except Exception as e:
+                self.logger.warning(f"无法加载Item类 {item_path}: {str(e)}")
+        if item_cls is None or not data_list:
+            return columns, data_list
+
+        # 找出日期时间类型的列，JSON中以ISO格式字符串保存
+        parsers = []
+        for index, field_name in enumerate(columns):
+            field_type = item_cls.fields.get(field_name, {}).get('type')
+            if field_type is datetime:
+                parsers.append((index, datetime.fromisoformat))
+            elif field_type is date:
+                parsers.append((index, date.fromisoformat))
+        restored = []
+        for row in data_list:
+            row = list(row)
+            for index, parse in parsers:
+                if isinstance(row[index], str):
+                    try:
+                        row[index] = parse(row[index])
+                    except ValueError:
+                        # 非ISO格式的原始字符串，验证时由字段的解析函数处理
+                        pass
+            restored.append(tuple(row))
+        return columns, self._validate_batch(table_name, columns, restored)
+
+    def _writer_loop(self):
+        """后台写入线程：依次写入队列中的批次，收到None时退出"""
+        while True:
+            try:
+                task = self.write_queue.get(timeout=self.FLUSH_CHECK_INTERVAL)
+            except queue.Empty:
+                # 队列空闲时合并到期的暂存表（合并与暂存写入在同一线程，不阻塞Twisted reactor）
+                self._merge_due_staging()
+                continue
+            try:
+                if task is None:
+                    return
+                table_name, columns, data_list, segments = task
+                try:
+                    self._commit_batch(table_name, columns, data_list, segments)
+                except Exception as e:
+                    self.logger.error(f"后台写入失败: {table_name} {len(data_list)}条, {str(e)}")
+                    if self.stats:
+                        self.stats.inc_value('pipeline/writer/failed_rows', len(data_list))
+                    self._settle_change_keys(table_name, columns, data_list, None)
+                    if self.journal:
+                        self.journal.quarantine(segments)
+            finally:
+                self.write_queue.task_done()
+
+    def _write_rows(self, table_name, columns, data_list, conn, cur):
+        """在指定连接上写入一批数据，按Item类的配置选择INSERT、COPY或UPSERT"""
+        item_cls = self.table_items.get(table_name)
+        write_mode = self._get_write_mode(item_cls)
+        start_time = time.perf_counter()
+
+        state_updates = []
+        try:
+            row_count = self._execute_write(cur, table_name, item_cls, write_mode, columns, data_list, state_updates)
+            conn.commit()
         except Exception as e:
-            self.conn.rollback()
-            raise Exception(f"批量插入失败: {str(e)}")
+            if not conn.closed:
+                conn.rollback()
+            if not (self.BISECT_ON_ERROR and isinstance(e, self.BISECT_ERRORS)):
+                raise Exception(f"批量插入失败: {str(e)}") from e
+            # 二分写入时不更新状态哈希缓存，这些键下次由状态表判断是否变化
+            row_count = self._bisect_write(conn, cur, table_name, item_cls, write_mode, columns, data_list, e)
+        else:
+            self._cache_latest_state(table_name, state_updates)
+            self._settle_change_keys(table_name, columns, data_list)
+
+        self._record_write_stats(table_name, write_mode, row_count, time.perf_counter() - start_time)
+
+    def _get_write_mode(self, item_cls):
+        """获取Item类的写入方式：settings的POSTGRESQL_WRITE_MODES优先于Item的WRITE_MODE
+
+        配置了ON_CONFLICT时为upsert；暂存表方式（staging）在合并时按ON_CONFLICT处理冲突，因此优先于upsert。
+        """
+        write_mode = self.write_modes.get(getattr(item_cls, 'TABLE', None)) or getattr(item_cls, 'WRITE_MODE', 'insert')
+        if write_mode == 'staging':
+            return write_mode
+        if getattr(item_cls, 'ON_CONFLICT', None):
+            return 'upsert'
+        return write_mode
+
+    def _execute_write(self, cur, table_name, item_cls, write_mode, columns, data_list, state_updates=None):
+        """按写入方式执行写入语句（不提交事务），返回写入的行数
+
+        state_updates不为None时收集最新状态表写入的(键, 哈希)，由调用方在事务提交后更新缓存。
+        """
+        if self._latest_state_enabled(item_cls):
+            data_list = self._filter_latest_state(cur, table_name, item_cls, columns, data_list, state_updates)
+            if not data_list:
+                return 0
+        if write_mode == 'upsert':
+            self._execute_upsert(cur, table_name, item_cls, item_cls.ON_CONFLICT, columns, data_list)
+        elif write_mode == 'copy':
+            self._copy_insert(cur, table_name, item_cls, columns, data_list)
+        elif write_mode == 'insert':
+            self._execute_batch_insert(cur, table_name, columns, data_list)
+        elif write_mode == 'staging':
+            self._copy_insert(cur, self._get_staging_table(table_name, columns), item_cls, columns, data_list)
+        else:
+            raise ValueError(f"不支持的写入方式: {write_mode}")
+        return len(data_list)
+
+    def _filter_latest_state(self, cur, table_name, item_cls, columns, data_list, state_updates=None):
+        """在当前事务中更新最新状态表，返回状态发生变化的行（自然键为NULL的行原样保留）
+
+        状态表由结构检查（AUTO_CREATE_TABLE）或 python -m sf_spider.schema 提前创建，写入时不执行DDL。
+        同一个键在批次内多次变化时（如A→B→A），按变化的先后分多次写入状态表，每一行都与它前一个状态比较。
+        """
+        state_table = latest_state.table_name_for(item_cls)
+        state_columns = latest_state.state_columns(item_cls, columns)
+        cache = self.latest_state_cache.get(table_name)
+        if cache is None:
+            cache = self.latest_state_cache[table_name] = LRUCache(self.LATEST_STATE_CACHE_SIZE)
+        indexes = [columns.index(field) for field in state_columns]
+        batch_hashes = {}  # 批次内每个键最近一行的哈希，同一批次中连续相同的状态只保留第一行
+        versions = {}  # 批次内每个键已出现的状态变化次数
+        generations = []  # 第g个元素为各个键在批次内的第g次状态变化: {key: (key, 状态字段..., 哈希)}
+        candidates = []  # (row, key, generation)，key为None表示不参与状态比较
+        for row in data_list:
+            values = [row[index] for index in indexes]
+            key = values[0]
+            if key is None:
+                candidates.append((row, None, None))
+                continue
+            state_hash = content_hash(values[1:])
+            previous = batch_hashes[key] if key in batch_hashes else cache.get(key)
+            if previous == state_hash:
+                continue
+            batch_hashes[key] = state_hash
+            generation = versions.get(key, 0)
+            versions[key] = generation + 1
+            if generation == len(generations):
+                generations.append({})
+            generations[generation][key] = (*values, state_hash)
+            candidates.append((row, key, generation))
+
+        changed = []  # 每次写入状态表时RETURNING返回的键（状态真正变化或首次出现）
+        if generations:
+            query = self._get_statement(('latest_state', state_table, state_columns), lambda: (
+                latest_state.upsert_sql(state_table, state_columns)
+            ))
+            for states in generations:
+                returned = psycopg2.extras.execute_values(cur, query, list(states.values()), page_size=len(states), fetch=True)
+                changed.append({row[0] for row in returned})
+                if state_updates is not None:
+                    state_updates.extend((key, values[-1]) for key, values in states.items())
+
+        rows = [row for row, key, generation in candidates if key is None or key in changed[generation]]
+        if self.stats:
+            self.stats.inc_value('pipeline/latest_state/changed', len(rows))
+            self.stats.inc_value('pipeline/latest_state/unchanged', len(data_list) - len(rows))
+        return rows
+
+    def _cache_latest_state(self, table_name, state_updates):
+        """事务提交后记录各个键最新状态的哈希"""
+        cache = self.latest_state_cache.get(table_name)
+        for key, state_hash in state_updates:
+            cache.set(key, state_hash)
+
+    def _bisect_write(self, conn, cur, table_name, item_cls, write_mode, columns, data_list, error):
+        """批次写入失败时用保存点二分定位错误行，提交正确的行，错误行写入死信，返回写入成功的行数"""
+        if self.stats:
+            self.stats.inc_value('pipeline/bisect/batches')
+        failed_rows = []
+        try:
+            if len(data_list) == 1:
+                failed_rows.append((data_list[0], str(error).strip()))
+            else:
+                middle = len(data_list) // 2
+                for part in (data_list[:middle], data_list[middle:]):
+                    self._write_with_savepoint(cur, table_name, item_cls, write_mode, columns, part, failed_rows)
+            self._write_dead_letter_table(cur, table_name, columns, failed_rows)
+            conn.commit()
+        except Exception as e:
+            if not conn.closed:
+                conn.rollback()
+            raise Exception(f"批量插入失败: {str(e)}") from e
+
+        self._settle_change_keys(table_name, columns, data_list, [row for row, message in failed_rows])
+        self._write_dead_letter_file(table_name, columns, failed_rows)
+        return len(data_list) - len(failed_rows)
+
+    def _write_with_savepoint(self, cur, table_name, item_cls, write_mode, columns, data_list, failed_rows):
+        """在保存点内写入部分数据，失败时回滚到保存点并继续二分，直到定位到单行"""
+        cur.execute("SAVEPOINT bisect")
+        try:
+            self._execute_write(cur, table_name, item_cls, write_mode, columns, data_list)
+        except self.BISECT_ERRORS as e:
+            cur.execute("ROLLBACK TO SAVEPOINT bisect")
+            cur.execute("RELEASE SAVEPOINT bisect")
+            if len(data_list) == 1:
+                failed_rows.append((data_list[0], str(e).strip()))
+                return
+            middle = len(data_list) // 2
+            for part in (data_list[:middle], data_list[middle:]):
+                self._write_with_savepoint(cur, table_name, item_cls, write_mode, columns, part, failed_rows)
+        else:
+            cur.execute("RELEASE SAVEPOINT bisect")
+
+    def _write_dead_letter_table(self, cur, table_name, columns, failed_rows):
+        """在当前事务中将错误行写入死信表（与正确的行一起提交）"""
+        if not failed_rows:
+            return
+        if self.stats:
+            self.stats.inc_value('pipeline/dead_letter/rows', len(failed_rows))
+        if self.logger:
+            self.logger.error(f"表 {table_name} 有{len(failed_rows)}条数据写入失败: {failed_rows[0][1]}")
+        if not self.DEAD_LETTER_TABLE:
+            return
+
+        if self.DEAD_LETTER_TABLE not in self.schema_cache:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.DEAD_LETTER_TABLE} (
+                    id SERIAL PRIMARY KEY,
+                    table_name varchar(128),
+                    row_data jsonb,
+                    error text,
+                    created_at timestamp with time zone DEFAULT now()
+                )
+            """)
+            self.schema_cache[self.DEAD_LETTER_TABLE] = frozenset(['table_name', 'row_data', 'error'])
+        values = [
+            (table_name, psycopg2.extras.Json(dict(zip(columns, row)), dumps=self._dumps_dead_letter), error)
+            for row, error in failed_rows
+        ]
+        psycopg2.extras.execute_values(
+            cur, f"INSERT INTO {self.DEAD_LETTER_TABLE} (table_name, row_data, error) VALUES %s", values
+        )
+
+    def _write_dead_letter_file(self, table_name, columns, failed_rows):
+        """事务提交后将错误行追加到死信JSONL文件"""
+        if not failed_rows or not self.DEAD_LETTER_FILE:
+            return
+        created_at = datetime.now().isoformat()
+        with open(self.DEAD_LETTER_FILE, 'a', encoding='utf-8') as f:
+            for row, error in failed_rows:
+                record = {'table_name': table_name, 'error': error, 'created_at': created_at, 'row_data': dict(zip(columns, row))}
+                f.write(self._dumps_dead_letter(record) + '\n')
+
+    @staticmethod
+    def _dumps_dead_letter(obj):
+        """序列化死信数据，datetime等类型转为字符串"""
+        return json.dumps(obj, ensure_ascii=False, default=str)
+
+    def _get_statement(self, key, build):
+        """获取缓存的SQL文本，不存在时调用build生成，每种(表, 列顺序)组合只拼接一次"""
+        sql = self.statement_cache.get(key)
+        if sql is None:
+            sql = self.statement_cache[key] = build()
+        return sql
+
+    def _adapt_json(self, table_name, columns, data_list):
+        """dict/list值包装为psycopg2的Json参数（由serializers序列化），没有这类列的表原样返回"""
+        indexes = self.json_columns.get((table_name, columns))
+        if indexes is None:
+            fields = getattr(self.table_items.get(table_name), 'fields', {})
+            indexes = self.json_columns[(table_name, columns)] = [
+                index for index, field in enumerate(columns)
+                if fields.get(field, {}).get('type') in (dict, list, None)
+            ]
+        if not indexes:
+            return data_list
+
+        adapted = []
+        for row in data_list:
+            if any(isinstance(row[index], (dict, list)) for index in indexes):
+                row = list(row)
+                for index in indexes:
+                    if isinstance(row[index], (dict, list)):
+                        row[index] = psycopg2.extras.Json(row[index], dumps=serializers.dumps)
+                row = tuple(row)
+            adapted.append(row)
+        return adapted
+
+    def _execute_batch_insert(self, cur, table_name, columns, data_list):
+        """通过execute_batch逐行执行INSERT，数据行直接按位置绑定参数"""
+        data_list = self._adapt_json(table_name, columns, data_list)
+        if self._get_batch_option(table_name, 'USE_PREPARED_STATEMENTS'):
+            self._execute_prepared(cur, 'insert', table_name, columns, data_list, lambda values: (
+                f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES {values}"
+            ))
+            return
+        query = self._get_statement(('insert', table_name, columns), lambda: (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        ))
+        psycopg2.extras.execute_batch(cur, query, data_list)
+
+    def _execute_upsert(self, cur, table_name, item_cls, on_conflict, columns, data_list):
+        """以单条多行INSERT ... ON CONFLICT写入，冲突目标为UNIQUE_CONSTRAINTS的第一个约束"""
+        conflict_fields, rows = self._prepare_upsert(table_name, item_cls, on_conflict, columns, data_list)
+        rows = self._adapt_json(table_name, columns, rows)
+        if self._get_batch_option(table_name, 'USE_PREPARED_STATEMENTS'):
+            self._execute_prepared(
+                cur, f'upsert_{on_conflict}', table_name, columns, rows,
+                lambda values: self._build_upsert_sql(table_name, columns, conflict_fields, on_conflict, values),
+            )
+            return
+        query = self._get_statement(
+            ('upsert', table_name, columns, conflict_fields, on_conflict),
+            lambda: self._build_upsert_sql(table_name, columns, conflict_fields, on_conflict),
+        )
+        psycopg2.extras.execute_values(cur, query, rows, page_size=len(rows))
+
+    def _prepare_upsert(self, table_name, item_cls, on_conflict, columns, data_list):
+        """检查冲突配置并合并批次内的冲突行，返回(冲突字段, 数据行列表)"""
+        conflict_fields = self._get_conflict_fields(table_name, item_cls, on_conflict, columns)
+
+        # 同一条语句中同一个键不能被更新两次，先在内存中合并批次内的冲突行
+        key_indexes = [columns.index(field) for field in conflict_fields]
+        rows = self._collapse_conflicts(data_list, key_indexes, keep_last=on_conflict == 'update')
+        if self.stats and len(rows) < len(data_list):
+            self.stats.inc_value('pipeline/upsert/collapsed', len(data_list) - len(rows))
+        return conflict_fields, rows
+
+    def _get_conflict_fields(self, table_name, item_cls, on_conflict, columns):
+        """检查冲突配置，返回冲突目标（UNIQUE_CONSTRAINTS的第一个约束）的字段"""
+        if on_conflict not in ('update', 'nothing'):
+            raise ValueError(f"不支持的冲突处理方式: {on_conflict}")
+        if not item_cls.UNIQUE_CONSTRAINTS:
+            raise ValueError(f"表 {table_name} 未配置UNIQUE_CONSTRAINTS，无法使用ON_CONFLICT")
+        conflict_fields, _ = self._parse_constraint(table_name, item_cls.UNIQUE_CONSTRAINTS[0])
+        if not conflict_fields or not set(conflict_fields).issubset(columns):
+            raise ValueError(f"无效的约束配置: {item_cls.UNIQUE_CONSTRAINTS[0]}")
+        return tuple(conflict_fields)
+
+    @classmethod
+    def _build_upsert_sql(cls, table_name, columns, conflict_fields, on_conflict, values='%s'):
+        """拼接INSERT ... VALUES ... ON CONFLICT语句，values默认为execute_values的占位符"""
+        return (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES {values} "
+            f"{cls._build_conflict_clause(columns, conflict_fields, on_conflict)}"
+        )
+
+    @staticmethod
+    def _build_conflict_clause(columns, conflict_fields, on_conflict):
+        """拼接ON CONFLICT子句，'update'时更新冲突字段以外的全部列"""
+        update_fields = [field for field in columns if field not in conflict_fields]
+        if on_conflict == 'update' and update_fields:
+            action = "DO UPDATE SET " + ", ".join(f"{field} = EXCLUDED.{field}" for field in update_fields)
+        else:
+            action = "DO NOTHING"
+        return f"ON CONFLICT ({', '.join(conflict_fields)}) {action}"
+
+    def _execute_prepared(self, cur, kind, table_name, columns, data_list, build_sql):
+        """按多行VALUES分块执行服务端预编译语句，build_sql(values)返回带$n占位符的完整语句"""
+        max_rows = max(1, min(self.PREPARED_MAX_ROWS, 65535 // len(columns)))
+        offset = 0
+        for row_count in self._prepared_chunk_sizes(len(data_list), max_rows):
+            name = self._prepare(cur, kind, table_name, columns, row_count, build_sql)
+            params = [value for row in data_list[offset:offset + row_count] for value in row]
+            offset += row_count
+            query = self._get_statement(('execute', name), lambda: (
+                f"EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+            ))
+            cur.execute(query, params)
+
+    @staticmethod
+    def _prepared_chunk_sizes(total, max_rows):
+        """拆分批次行数：先按max_rows整块，余数按2的幂拆分，使每张表预编译的语句数量有限"""
+        sizes = [max_rows] * (total // max_rows)
+        remainder = total % max_rows
+        while remainder:
+            size = 1 << (remainder.bit_length() - 1)
+            sizes.append(size)
+            remainder -= size
+        return sizes
+
+    def _prepare(self, cur, kind, table_name, columns, row_count, build_sql):
+        """确保当前连接上已预编译指定行数的语句，返回语句名"""
+        sql = self._get_statement(('prepared', kind, table_name, columns, row_count), lambda: build_sql(', '.join(
+            '(' + ', '.join(f"${row * len(columns) + column + 1}" for column in range(len(columns))) + ')'
+            for row in range(row_count)
+        )))
+        name = self._get_statement(('prepared_name', sql), lambda: (
+            f"sf_{kind}_{row_count}_{hashlib.md5(sql.encode('utf-8')).hexdigest()[:16]}"
+        ))
+
+        conn = cur.connection
+        prepared = self.prepared_statements.get(conn)
+        if prepared is None:
+            # 清理已关闭连接的记录，新连接需要重新预编译
+            for closed_conn in [c for c in list(self.prepared_statements) if c.closed]:
+                self.prepared_statements.pop(closed_conn, None)
+            prepared = self.prepared_statements[conn] = set()
+        if name in prepared:
+            if self.stats:
+                self.stats.inc_value('pipeline/prepared/reused')
+            return name
+
+        cur.execute(f"PREPARE {name} AS {sql}")
+        prepared.add(name)
+        if self.stats:
+            self.stats.inc_value('pipeline/prepared/statements')
+        return name
+
+    def _collapse_conflicts(self, data_list, key_indexes, keep_last):
+        """按冲突字段合并批次内的重复行，keep_last为True时保留最后一条，否则保留第一条"""
+        collapsed = {}
+        null_key_rows = []
+        for row in data_list:
+            key = tuple([row[index] for index in key_indexes])
+            # 含NULL的键在PostgreSQL中不会冲突，原样保留
+            if None in key:
+                null_key_rows.append(row)
+            elif keep_last or key not in collapsed:
+                collapsed[key] = row
+        return list(collapsed.values()) + null_key_rows
+
+    def _copy_insert(self, cur, table_name, item_cls, columns, data_list):
+        """通过COPY ... FROM STDIN流式写入，格式由Item类的COPY_FORMAT决定"""
+        copy_format = getattr(item_cls, 'COPY_FORMAT', 'text')
+        if isinstance(data_list, pg_copy.EncodedRows) and data_list.copy_format == copy_format:
+            # 进程池已编码的批次直接发送
+            stream = pg_copy.encoded_copy_stream(data_list)
+        elif copy_format == 'binary':
+            # 按TYPE_MAPPING得到每列的PostgreSQL类型，再选择对应的binary编码函数
+            encoders = self.copy_encoders.get((table_name, columns))
+            if encoders is None:
+                session_tz = self._get_session_tz(cur)
+                encoders = self.copy_encoders[(table_name, columns)] = [
+                    pg_copy.get_binary_encoder(self._get_pg_type(item_cls, field, None), session_tz)
+                    for field in columns
+                ]
+            stream = pg_copy.binary_copy_stream(data_list, encoders)
+        elif copy_format == 'text':
+            stream = pg_copy.text_copy_stream(data_list)
+        else:
+            raise ValueError(f"不支持的COPY格式: {copy_format}")
+
+        query = self._get_statement(('copy', table_name, columns, copy_format), lambda: (
+            f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT {copy_format})"
+        ))
+        cur.copy_expert(query, stream)
+
+    def _get_staging_table(self, table_name, columns):
+        """返回表的暂存表名，不存在时创建；列顺序变化时先合并旧暂存表中的数据再重建
+
+        暂存表在单独借用的连接上创建并提交，不影响调用方正在进行的写入事务（如最新状态表的更新）；
+        写入失败回滚时暂存表仍然存在，其他线程可以安全地合并。
+        """
+        with self.staging_lock:
+            state = self.staging_tables.get(table_name)
+        staging_name = staging.staging_table_name(table_name, self.spider.name)
+        if state is None:
+            state = self._recover_staging_table(table_name, staging_name)
+        if state is not None and state['columns'] == columns:
+            return state['name']
+        if state is not None:
+            self._merge_staging(table_name)
+
+        with self._borrow() as (conn, cur):
+            try:
+                if state is not None:
+                    cur.execute(staging.drop_staging_sql(state['name']))
+                for statement in staging.create_staging_sql(table_name, staging_name, columns):
+                    cur.execute(statement)
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+        with self.staging_lock:
+            previous = self.staging_tables.get(table_name) or {}
+            self.staging_tables[table_name] = {
+                'name': staging_name, 'columns': columns, 'rows': 0, 'since': None,
+                'segments': previous.get('segments', []),
+            }
+        return staging_name
+
+    def _recover_staging_table(self, table_name, staging_name):
+        """进程首次使用暂存表时处理上次运行遗留的同名暂存表（进程崩溃时未合并、未删除），返回暂存表状态
+
+        启用了本地日志时，遗留的行对应的日志分段在合并成功前不会删除，启动时会重放，因此直接删除遗留的暂存表；
+        否则遗留的行只保存在暂存表中，按其原有的列记录为待合并的暂存行，与之后的数据一起合并。
+        """
+        with self._borrow() as (conn, cur):
+            try:
+                cur.execute("""
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_name = %s ORDER BY ordinal_position
+                """, (staging_name,))
+                columns = tuple(row[0] for row in cur.fetchall() if row[0] != staging.SEQ_COLUMN)
+                staged_rows = 0
+                if columns and self.journal:
+                    cur.execute(staging.drop_staging_sql(staging_name))
+                elif columns:
+                    cur.execute(f"SELECT count(*) FROM {staging_name}")
+                    staged_rows = cur.fetchone()[0]
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+        if not columns or self.journal:
+            if columns:
+                self.logger.info(f"已删除上次运行遗留的暂存表 {staging_name}，其中的数据由本地日志重放")
+            return None
+
+        with self.staging_lock:
+            state = self.staging_tables[table_name] = {
+                'name': staging_name, 'columns': columns, 'rows': staged_rows,
+                'since': time.monotonic() if staged_rows else None, 'segments': [],
+            }
+        if staged_rows:
+            self.logger.warning(f"暂存表 {staging_name} 中有上次运行遗留的{staged_rows}条数据，将合并到 {table_name}")
+        return state
+
+    def _record_staged(self, table_name, row_count, segments):
+        """记录写入暂存表的行数和日志分段，分段在合并成功后删除"""
+        with self.staging_lock:
+            state = self.staging_tables[table_name]
+            if not state['rows']:
+                state['since'] = time.monotonic()
+            state['rows'] += row_count
+            state['segments'].extend(segments)
+
+    def _merge_staging_if_due(self, table_name):
+        """暂存表累计行数超过STAGING_MERGE_ROWS或最早的数据超过STAGING_MERGE_INTERVAL秒时合并"""
+        with self.staging_lock:
+            state = self.staging_tables.get(table_name)
+            if not state or not state['rows']:
+                return
+            due = (
+                state['rows'] >= self._get_batch_option(table_name, 'STAGING_MERGE_ROWS')
+                or time.monotonic() - state['since'] >= self._get_batch_option(table_name, 'STAGING_MERGE_INTERVAL')
+            )
+        if due:
+            self._merge_staging(table_name)
+
+    def _merge_due_staging(self):
+        """定时任务：合并所有到期的暂存表"""
+        for table_name in list(self.staging_tables):
+            try:
+                self._merge_staging_if_due(table_name)
+            except Exception as e:
+                self.logger.error(f"暂存表合并失败: {table_name} {str(e)}")
+
+    def _merge_staging(self, table_name):
+        """用一条INSERT ... SELECT把暂存表中的数据合并到目标表，按Item的ON_CONFLICT处理冲突，返回合并的行数
+
+        合并因数据错误（BISECT_ERRORS，如没有ON_CONFLICT时的唯一约束冲突）失败时，按写入顺序二分定位错误行，
+        其余的行照常合并，错误行移出暂存表写入死信；否则同一批错误行会让之后的每次合并都失败。
+        """
+        with self.staging_lock:
+            state = self.staging_tables.get(table_name)
+            if not state or not state['rows']:
+                return 0
+            staged_rows, segments = state['rows'], state['segments']
+            state['rows'], state['segments'], state['since'] = 0, [], None
+        staging_name, columns = state['name'], state['columns']
+        item_cls = self.table_items.get(table_name)
+        on_conflict = getattr(item_cls, 'ON_CONFLICT', None)
+        start_time = time.perf_counter()
+
+        try:
+            query = self._get_statement(('merge', table_name, staging_name, columns, on_conflict), lambda: (
+                staging.merge_sql(table_name, staging_name, columns)
+                if not on_conflict else
+                self._build_merge_sql(table_name, staging_name, item_cls, on_conflict, columns)
+            ))
+            with self._borrow() as (conn, cur):
+                try:
+                    cur.execute(query)
+                    merged = cur.rowcount
+                    conn.commit()
+                except self.BISECT_ERRORS as e:
+                    conn.rollback()
+                    merged = self._bisect_merge(conn, cur, table_name, staging_name, item_cls, on_conflict, columns, e)
+                except Exception:
+                    if not conn.closed:
+                        conn.rollback()
+                    raise
+        except Exception:
+            # 合并失败时数据仍在暂存表中，下次合并时重试
+            if self.stats:
+                self.stats.inc_value('pipeline/staging/merge_failures')
+            with self.staging_lock:
+                state['rows'] += staged_rows
+                state['segments'][:0] = segments
+                state['since'] = state['since'] or time.monotonic()
+            raise
+
+        if self.journal:
+            self.journal.discard(segments)
+        elapsed = time.perf_counter() - start_time
+        if self.stats:
+            self.stats.inc_value('pipeline/staging/merges')
+            self.stats.inc_value('pipeline/staging/merged_rows', merged)
+            self.stats.inc_value('pipeline/staging/merge_seconds', elapsed)
+        if self.logger:
+            self.logger.info(f"表 {table_name} 从暂存表合并{merged}条（暂存{staged_rows}条）耗时{elapsed:.3f}秒")
+        return merged
+
+    def _bisect_merge(self, conn, cur, table_name, staging_name, item_cls, on_conflict, columns, error):
+        """合并失败时按写入顺序二分合并暂存行，错误行移出暂存表写入死信，返回合并的行数"""
+        if self.stats:
+            self.stats.inc_value('pipeline/bisect/merges')
+        self.logger.warning(f"暂存表 {staging_name} 合并失败，二分定位错误行: {str(error).strip()}")
+        query = self._get_statement(('merge_range', table_name, staging_name, columns, on_conflict), lambda: (
+            staging.merge_sql(table_name, staging_name, columns, seq_range=True)
+            if not on_conflict else
+            self._build_merge_sql(table_name, staging_name, item_cls, on_conflict, columns, seq_range=True)
+        ))
+        failed_rows = []
+        try:
+            cur.execute(f"SELECT min({staging.SEQ_COLUMN}), max({staging.SEQ_COLUMN}) FROM {staging_name}")
+            lower, upper = cur.fetchone()
+            merged = 0
+            if lower is not None:
+                merged = self._merge_range(cur, query, staging_name, columns, lower, upper + 1, failed_rows)
+            self._write_dead_letter_table(cur, table_name, columns, failed_rows)
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        self._write_dead_letter_file(table_name, columns, failed_rows)
+        return merged
+
+    def _merge_range(self, cur, query, staging_name, columns, lower, upper, failed_rows):
+        """在保存点内合并写入顺序在[lower, upper)内的暂存行，失败时回滚到保存点并继续二分，直到定位到单行"""
+        cur.execute("SAVEPOINT bisect")
+        try:
+            cur.execute(query, (lower, upper))
+        except self.BISECT_ERRORS as e:
+            cur.execute("ROLLBACK TO SAVEPOINT bisect")
+            cur.execute("RELEASE SAVEPOINT bisect")
+            cur.execute(
+                f"SELECT {staging.SEQ_COLUMN} FROM {staging_name} "
+                f"WHERE {staging.SEQ_COLUMN} >= %s AND {staging.SEQ_COLUMN} < %s ORDER BY {staging.SEQ_COLUMN}",
+                (lower, upper),
+            )
+            seqs = [row[0] for row in cur.fetchall()]
+            if len(seqs) == 1:
+                # 定位到错误行：从暂存表中删除，与合并结果一起提交
+                cur.execute(
+                    f"DELETE FROM {staging_name} WHERE {staging.SEQ_COLUMN} = %s RETURNING {', '.join(columns)}", (seqs[0],)
+                )
+                failed_rows.append((tuple(cur.fetchone()), str(e).strip()))
+                return 0
+            middle = seqs[len(seqs) // 2]
+            return (
+                self._merge_range(cur, query, staging_name, columns, lower, middle, failed_rows)
+                + self._merge_range(cur, query, staging_name, columns, middle, upper, failed_rows)
+            )
+        merged = cur.rowcount
+        cur.execute("RELEASE SAVEPOINT bisect")
+        return merged
+
+    def _build_merge_sql(self, table_name, staging_name, item_cls, on_conflict, columns, seq_range=False):
+        """带ON CONFLICT的合并语句，冲突目标与upsert相同"""
+        conflict_fields = self._get_conflict_fields(table_name, item_cls, on_conflict, columns)
+        return staging.merge_sql(
+            table_name, staging_name, columns, conflict_fields,
+            self._build_conflict_clause(columns, conflict_fields, on_conflict), keep_last=on_conflict == 'update',
+            seq_range=seq_range,
+        )
+
+    def _close_staging_tables(self, spider):
+        """爬虫结束时合并并删除暂存表；合并失败的暂存表保留，数据可由本地日志重放"""
+        for table_name, state in list(self.staging_tables.items()):
+            try:
+                self._merge_staging(table_name)
+                with self._borrow() as (conn, cur):
+                    cur.execute(staging.drop_staging_sql(state['name']))
+                    conn.commit()
+            except Exception as e:
+                spider.logger.error(f"暂存表 {state['name']} 合并失败，数据保留在暂存表中: {str(e)}")
+        self.staging_tables = {}
+
+    def _get_session_tz(self, cur):
+        """获取数据库会话时区，binary格式下无时区的datetime按此时区编码"""
+        if self.session_tz is None:
+            cur.execute("SHOW TimeZone")
+            try:
+                self.session_tz = zoneinfo.ZoneInfo(cur.fetchone()[0])
+            except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+                self.session_tz = timezone.utc
+        return self.session_tz
+
+    def _record_write_stats(self, table_name, write_mode, row_count, elapsed):
+        """记录写入行数、耗时和速率，便于对比INSERT和COPY的性能"""
+        rows_per_sec = row_count / elapsed if elapsed > 0 else 0
+        if self.stats:
+            self.stats.inc_value(f'pipeline/{write_mode}/rows', row_count)
+            self.stats.inc_value(f'pipeline/{write_mode}/seconds', elapsed)
+            self.stats.set_value(f'pipeline/{write_mode}/rows_per_sec', round(rows_per_sec))
+        if self.logger:
+            self.logger.info(f"表 {table_name} 写入{row_count}条 [{write_mode}] 耗时{elapsed:.3f}秒, {rows_per_sec:.0f}条/秒")
 
     def close_spider(self, spider):
         """关闭爬虫时提交剩余数据并关闭数据库连接"""
+        # 进程池模式：先把剩余的原始数据交给进程池，等待所有批次完成后再关闭
+        if self.process_pool is not None and (any(self.raw_batches.values()) or self.encoding):
+            for table_name in list(self.raw_batches):
+                self._submit_raw_batch(table_name)
+            d = defer.DeferredList(list(self.encoding))
+            d.addCallback(lambda _: self.close_spider(spider))
+            return d
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
+
+        if self.flush_loop and self.flush_loop.running:
+            self.flush_loop.stop()
+        if self.retry_loop and self.retry_loop.running:
+            self.retry_loop.stop()
+
         # 提交所有剩余的批量数据
         for table_name in self.batch_data:
             if self.batch_data[table_name]:
+                row_count = len(self.batch_data[table_name])
                 try:
                     self._batch_insert(table_name)
-                    spider.logger.info(f"爬虫结束，提交剩余数据: {table_name} {len(self.batch_data[table_name])}条")
+                    spider.logger.info(f"爬虫结束，提交剩余数据: {table_name} {row_count}条")
                 except Exception as e:
                     spider.logger.error(f"剩余数据提交失败: {str(e)}")
 
-        # 关闭数据库连接
-        if self.cur:
-            self.cur.close()
-        if self.conn:
-            self.conn.close()
\ No newline at end of file
+        # 等待后台写入线程处理完队列中的批次
+        if self.write_thread:
+            self.write_queue.put(None)
+            self.write_thread.join()
+
+        # 暂存表中剩余的数据合并到目标表
+        if self.staging_tables:
+            self._close_staging_tables(spider)
+        self._flush_change_caches()
+
+        # 未能提交的数据保留在日志目录，下次启动时重放
+        if self.journal:
+            if self.spilled:
+                spider.logger.warning(f"{len(self.spilled)}组数据未能提交，保留在日志目录 {self.journal.directory}")
+            self.journal.close()
+
+        # 释放共享连接池，最后一个使用该连接池的爬虫关闭全部连接
+        if self.pool:
+            release_pool(self.pool)
+            self.pool = None
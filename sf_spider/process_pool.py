@@ -0,0 +1,43 @@
+"""进程池验证与编码：Item字段验证、日期解析和COPY编码在工作进程中执行，主进程的reactor只负责调度
+
+工作进程按类路径导入Pipeline和Item类（每个进程只导入一次），因此Item类必须定义在可导入的模块中；
+无法在工作进程中处理的批次由Pipeline退回主进程验证。
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from scrapy.utils.misc import load_object
+
+from sf_spider import pg_copy
+
+_workers = {}  # 工作进程内缓存的验证对象: {(Pipeline类路径, Item类路径): (Pipeline实例, Item类)}
+
+
+def create_executor(max_workers):
+    """创建进程池：使用spawn启动工作进程，避免fork时复制reactor、写入线程和数据库连接的状态"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _get_worker(pipeline_path, item_path):
+    key = (pipeline_path, item_path)
+    worker = _workers.get(key)
+    if worker is None:
+        worker = _workers[key] = (load_object(pipeline_path)(), load_object(item_path))
+    return worker
+
+
+def validate_and_encode(pipeline_path, item_path, raw_rows, copy_format=None, pg_types=None, session_tz=None):
+    """工作进程：按列验证一批原始数据（按Item类列顺序排列的元组），按copy_format编码
+
+    返回(验证通过的数据行列表, {行下标: 错误信息}, COPY数据)；copy_format为None时COPY数据为None。
+    """
+    pipeline, item_cls = _get_worker(pipeline_path, item_path)
+    rows, errors = pipeline._validate_rows(item_cls, raw_rows)
+
+    payload = None
+    if copy_format == 'binary':
+        encoders = [pg_copy.get_binary_encoder(pg_type, session_tz) for pg_type in pg_types]
+        payload = pg_copy.encode_rows(rows, copy_format, encoders)
+    elif copy_format:
+        payload = pg_copy.encode_rows(rows, copy_format)
+    return rows, errors, payload
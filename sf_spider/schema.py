@@ -0,0 +1,289 @@
+"""离线表结构迁移工具：对比BaseItem子类与数据库（或快照）的表结构，输出或执行建表/加字段/索引/约束的DDL
+
+在Scrapy项目目录下运行（读取项目settings中的数据库配置和SPIDER_MODULES）：
+    python -m sf_spider.schema plan                      # 对比线上数据库，输出DDL
+    python -m sf_spider.schema plan --snapshot s.json    # 对比保存的快照，不连接数据库
+    python -m sf_spider.schema apply                     # 在一个事务中执行DDL
+    python -m sf_spider.schema snapshot -o s.json        # 保存线上表结构快照
+    python -m sf_spider.schema detach -t 表名 --keep 30  # 卸载较早的分区（分区表变为独立的普通表）
+
+表结构由本工具提前迁移后，Item可以配置AUTO_CREATE_TABLE = False，运行时不再查询系统表。
+"""
+import argparse
+import json
+import sys
+
+import psycopg2
+from scrapy.utils.misc import walk_modules
+from scrapy.utils.project import get_project_settings
+
+from sf_spider import latest_state, partitions
+from sf_spider.items.items import BaseItem
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+
+def find_item_classes(modules, tables=None):
+    """导入模块（含子模块）并返回其所属项目包中定义的BaseItem子类（配置了TABLE），按表名排序"""
+    packages = set()
+    for module in modules:
+        walk_modules(module)
+        packages.add(module.split('.')[0])
+
+    item_classes = {}
+    pending = list(BaseItem.__subclasses__())
+    while pending:
+        item_cls = pending.pop()
+        pending.extend(item_cls.__subclasses__())
+        if not item_cls.TABLE or item_cls.__module__.split('.')[0] not in packages:
+            continue
+        if tables and item_cls.TABLE not in tables:
+            continue
+        # 同一张表有多个Item类时（如子类新增了字段），以字段最多的为准
+        current = item_classes.get(item_cls.TABLE)
+        if current is None or len(item_cls.fields) > len(current.fields):
+            item_classes[item_cls.TABLE] = item_cls
+    return [item_classes[table_name] for table_name in sorted(item_classes)]
+
+
+def load_catalog(cur, tables):
+    """读取当前schema中指定表的结构: {table_name: {'columns': {字段: 类型}, 'indexes': [...], 'constraints': [...]}}"""
+    catalog = {}
+    cur.execute("""
+        SELECT table_name, column_name, data_type, character_maximum_length
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = ANY(%s)
+        ORDER BY table_name, ordinal_position
+    """, (list(tables),))
+    for table_name, column_name, data_type, max_length in cur.fetchall():
+        table = catalog.setdefault(table_name, {'columns': {}, 'indexes': [], 'constraints': []})
+        table['columns'][column_name] = _format_column_type(data_type, max_length)
+
+    cur.execute("""
+        SELECT tablename, indexname FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = ANY(%s)
+        ORDER BY tablename, indexname
+    """, (list(tables),))
+    for table_name, index_name in cur.fetchall():
+        catalog[table_name]['indexes'].append(index_name)
+
+    cur.execute("""
+        SELECT table_name, constraint_name FROM information_schema.table_constraints
+        WHERE table_schema = current_schema() AND table_name = ANY(%s)
+        ORDER BY table_name, constraint_name
+    """, (list(tables),))
+    for table_name, constraint_name in cur.fetchall():
+        catalog[table_name]['constraints'].append(constraint_name)
+    return catalog
+
+
+def _format_column_type(data_type, max_length):
+    """将information_schema中的类型名转换为与TYPE_MAPPING一致的写法"""
+    if data_type == 'character varying':
+        return f"varchar({max_length})" if max_length else 'varchar'
+    if data_type == 'character':
+        return f"char({max_length})" if max_length else 'char'
+    return data_type
+
+
+def plan_table(pipeline, item_cls, table):
+    """生成一张表的迁移计划，返回(DDL语句列表, 提示信息列表)；table为None表示表不存在"""
+    table_name = item_cls.TABLE
+    statements = []
+    notes = []
+
+    # Item声明的字段及其PostgreSQL类型（未声明类型的字段无法离线推断）
+    columns = {}
+    for field_name in item_cls.fields:
+        pg_type = pipeline._get_pg_type(item_cls, field_name, None)
+        if pg_type:
+            columns[field_name] = pg_type
+        else:
+            notes.append(f"{table_name}.{field_name} 未声明字段类型，已跳过")
+
+    if table is None:
+        columns_def = [f"{field_name} {pg_type}" for field_name, pg_type in columns.items()]
+        if item_cls.ADD_AUTO_INCREMENT_ID:
+            id_def, *primary_key = partitions.primary_key_defs(item_cls)
+            columns_def = [id_def] + columns_def + primary_key
+        statements.append(f"CREATE TABLE {table_name} ({', '.join(columns_def)}){partitions.partition_clause(item_cls)}")
+        if partitions.is_partitioned(item_cls):
+            statements.append(partitions.default_partition_sql(table_name))
+        new_fields = list(columns)
+        existing_indexes = existing_constraints = ()
+    else:
+        new_fields = [field_name for field_name in columns if field_name not in table['columns']]
+        if new_fields:
+            add_columns = [f"ADD COLUMN IF NOT EXISTS {field_name} {columns[field_name]}" for field_name in new_fields]
+            statements.append(f"ALTER TABLE {table_name} {', '.join(add_columns)}")
+        for field_name, pg_type in columns.items():
+            current_type = table['columns'].get(field_name)
+            if current_type and current_type != pg_type:
+                notes.append(f"{table_name}.{field_name} 数据库类型为 {current_type}，Item声明为 {pg_type}（不自动修改）")
+        existing_indexes = table['indexes']
+        existing_constraints = table['constraints']
+
+    # 新字段的注释
+    for field_name in new_fields:
+        comment = item_cls.fields[field_name].get('comment', '').replace("'", "''")
+        if comment:
+            statements.append(f"COMMENT ON COLUMN {table_name}.{field_name} IS '{comment}'")
+
+    # 索引和联合唯一约束，命名规则与运行时建表一致
+    for field in item_cls.INDEXES:
+        index_name = f"idx_{table_name}_{field}"
+        if index_name not in existing_indexes:
+            statements.append(f"CREATE INDEX {index_name} ON {table_name} ({field})")
+    for constraint in item_cls.UNIQUE_CONSTRAINTS:
+        fields, constraint_name = pipeline._parse_constraint(table_name, constraint)
+        if not fields:
+            notes.append(f"{table_name} 无效的约束配置: {constraint}")
+        elif not partitions.supports_unique(item_cls, fields):
+            notes.append(f"{table_name} 分区表的唯一约束必须包含分区字段 {item_cls.PARTITION_KEY}，已跳过: {constraint_name}")
+        elif constraint_name not in existing_constraints:
+            statements.append(f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint_name} UNIQUE ({', '.join(fields)})")
+    return statements, notes
+
+
+def plan_latest_state_table(pipeline, item_cls, table):
+    """生成Item最新状态表（LATEST_STATE_KEY）的迁移计划，返回(DDL语句列表, 提示信息列表)；table为None表示表不存在"""
+    state_table = latest_state.table_name_for(item_cls)
+    field_types = pipeline._latest_state_field_types(item_cls, latest_state.state_columns(item_cls, item_cls.fields))
+    if table is None:
+        return [latest_state.create_table_sql(state_table, field_types[0][0], field_types)], []
+    missing = [(field, pg_type) for field, pg_type in field_types[1:] if field not in table['columns']]
+    if not missing:
+        return [], []
+    add_columns = [f"ADD COLUMN IF NOT EXISTS {field} {pg_type}" for field, pg_type in missing]
+    return [f"ALTER TABLE {state_table} {', '.join(add_columns)}"], []
+
+
+def table_names(item_classes):
+    """迁移涉及的全部表名：Item的表和最新状态表"""
+    names = []
+    for item_cls in item_classes:
+        names.append(item_cls.TABLE)
+        if latest_state.is_enabled(item_cls):
+            names.append(latest_state.table_name_for(item_cls))
+    return names
+
+
+def build_plan(pipeline, item_classes, catalog):
+    """生成所有表的迁移计划: [(table_name, statements, notes)]，最新状态表排在对应的Item表之后"""
+    plan = []
+    for item_cls in item_classes:
+        plan.append((item_cls.TABLE, *plan_table(pipeline, item_cls, catalog.get(item_cls.TABLE))))
+        if latest_state.is_enabled(item_cls):
+            state_table = latest_state.table_name_for(item_cls)
+            plan.append((state_table, *plan_latest_state_table(pipeline, item_cls, catalog.get(state_table))))
+    return plan
+
+
+def print_plan(plan, out=sys.stdout):
+    """以SQL脚本的形式输出迁移计划，返回DDL语句总数"""
+    total = 0
+    for table_name, statements, notes in plan:
+        if not statements and not notes:
+            continue
+        out.write(f"-- 表 {table_name}\n")
+        for note in notes:
+            out.write(f"-- 注意: {note}\n")
+        for statement in statements:
+            out.write(f"{statement};\n")
+        out.write("\n")
+        total += len(statements)
+    if not total:
+        out.write("-- 表结构已是最新，无需迁移\n")
+    return total
+
+
+def detach_partitions(conn, item_cls, keep, dry_run=False):
+    """卸载分区表中较早的分区，只保留最新的keep个范围分区，返回卸载的分区名列表
+
+    DETACH只修改元数据，不删除数据；卸载后的分区是独立的普通表，可以归档或DROP。
+    （存在DEFAULT分区时PostgreSQL不支持DETACH ... CONCURRENTLY，所有分区在一个事务中卸载）
+    """
+    table_name = item_cls.TABLE
+    with conn.cursor() as cur:
+        existing = partitions.load_partitions(cur, table_name)
+    if existing is None:
+        raise ValueError(f"表 {table_name} 不是分区表")
+    ordered = partitions.range_partitions_by_age(existing)
+    to_detach = ordered[:max(0, len(ordered) - keep)]
+    if dry_run:
+        return to_detach
+
+    with conn.cursor() as cur:
+        for name in to_detach:
+            cur.execute(f"ALTER TABLE {table_name} DETACH PARTITION {name}")
+    conn.commit()
+    return to_detach
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sf_spider.schema', description='BaseItem表结构离线迁移')
+    parser.add_argument('command', choices=['plan', 'apply', 'snapshot', 'detach'],
+                        help='plan: 输出DDL；apply: 执行DDL；snapshot: 保存线上表结构；detach: 卸载较早的分区')
+    parser.add_argument('-m', '--module', action='append', help='包含Item/爬虫的模块，可重复，默认使用settings中的SPIDER_MODULES')
+    parser.add_argument('-t', '--table', action='append', help='只处理指定的表，可重复')
+    parser.add_argument('-s', '--snapshot', help='plan时对比的快照文件（不连接数据库）')
+    parser.add_argument('-o', '--output', help='snapshot输出文件，默认输出到标准输出')
+    parser.add_argument('--keep', type=int, help='detach时保留的最新分区数，默认使用Item的PARTITION_RETENTION')
+    parser.add_argument('--dry-run', action='store_true', help='detach时只列出将被卸载的分区')
+    args = parser.parse_args(argv)
+
+    settings = get_project_settings()
+    modules = args.module or settings.getlist('SPIDER_MODULES')
+    if not modules:
+        parser.error("未找到SPIDER_MODULES，请在Scrapy项目目录下运行或通过--module指定模块")
+    item_classes = find_item_classes(modules, args.table)
+    tables = table_names(item_classes)
+    pipeline = UniversalPostgreSQLPipeline()
+
+    if args.command == 'plan' and args.snapshot:
+        with open(args.snapshot, encoding='utf-8') as f:
+            catalog = json.load(f)
+        print_plan(build_plan(pipeline, item_classes, catalog))
+        return 0
+
+    conn = psycopg2.connect(**pipeline._get_connect_kwargs())
+    try:
+        if args.command == 'detach':
+            for item_cls in item_classes:
+                if not partitions.is_partitioned(item_cls):
+                    continue
+                keep = args.keep if args.keep is not None else item_cls.PARTITION_RETENTION
+                if keep is None:
+                    print(f"-- 表 {item_cls.TABLE} 未配置PARTITION_RETENTION，请通过--keep指定保留的分区数")
+                    continue
+                detached = detach_partitions(conn, item_cls, keep, args.dry_run)
+                action = '将卸载' if args.dry_run else '已卸载'
+                print(f"-- 表 {item_cls.TABLE} {action}{len(detached)}个分区: {', '.join(detached)}")
+            return 0
+
+        with conn.cursor() as cur:
+            catalog = load_catalog(cur, tables)
+            if args.command == 'snapshot':
+                data = json.dumps(catalog, ensure_ascii=False, indent=2, sort_keys=True)
+                if args.output:
+                    with open(args.output, 'w', encoding='utf-8') as f:
+                        f.write(data + '\n')
+                else:
+                    print(data)
+                return 0
+
+            plan = build_plan(pipeline, item_classes, catalog)
+            total = print_plan(plan)
+            if args.command == 'apply' and total:
+                # 所有DDL在一个事务中执行，任一语句失败则全部回滚
+                for _, statements, _ in plan:
+                    for statement in statements:
+                        cur.execute(statement)
+                conn.commit()
+                print(f"-- 已执行{total}条DDL")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
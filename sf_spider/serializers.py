@@ -0,0 +1,96 @@
+"""JSON序列化层：安装了orjson时使用orjson，否则使用标准库json
+
+jsonb字段、本地日志和Redis任务解码通过本模块序列化，两种实现都输出紧凑格式（无空格、不转义非ASCII字符、
+日期时间为ISO格式），但个别值的写法不同（如浮点数1e16，orjson输出1e+16），输出不保证逐字节相同。
+任务去重指纹和内容哈希因此不使用本模块，固定用标准库json计算。
+settings中的JSON_SERIALIZER可指定 'auto'（默认）、'orjson'、'json' 或自定义序列化类的路径。
+"""
+import json
+from datetime import datetime, date
+
+from scrapy.utils.misc import load_object
+
+try:
+    import orjson
+except ImportError:  # orjson是可选依赖
+    orjson = None
+
+
+def _default(value):
+    """序列化JSON不支持的类型：日期时间转为ISO格式，其余转为字符串"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class StdlibJSONSerializer:
+    """标准库json实现"""
+    name = 'json'
+
+    def dumps(self, obj, sort_keys=False):
+        return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, separators=(',', ':'), default=_default)
+
+    def dumpb(self, obj, sort_keys=False):
+        return self.dumps(obj, sort_keys).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonSerializer(StdlibJSONSerializer):
+    """orjson实现，orjson无法处理的值（如超过64位的整数）回退到标准库"""
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("未安装orjson")
+
+    def dumps(self, obj, sort_keys=False):
+        return self.dumpb(obj, sort_keys).decode('utf-8')
+
+    def dumpb(self, obj, sort_keys=False):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(obj, default=_default, option=option)
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, sort_keys).encode('utf-8')
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+SERIALIZERS = {'json': StdlibJSONSerializer, 'orjson': OrjsonSerializer}
+
+
+def get_serializer(name=None):
+    """按名称创建序列化器，None或'auto'时优先使用orjson"""
+    if name in (None, 'auto'):
+        return OrjsonSerializer() if orjson is not None else StdlibJSONSerializer()
+    if name in SERIALIZERS:
+        return SERIALIZERS[name]()
+    return load_object(name)()
+
+
+_serializer = get_serializer()
+
+
+def configure(settings):
+    """按settings中的JSON_SERIALIZER切换本模块使用的序列化器"""
+    global _serializer
+    _serializer = get_serializer(settings.get('JSON_SERIALIZER'))
+    return _serializer
+
+
+def dumps(obj, sort_keys=False):
+    """序列化为str"""
+    return _serializer.dumps(obj, sort_keys)
+
+
+def dumpb(obj, sort_keys=False):
+    """序列化为UTF-8 bytes"""
+    return _serializer.dumpb(obj, sort_keys)
+
+
+def loads(data):
+    """反序列化str或bytes"""
+    return _serializer.loads(data)
@@ -13,6 +13,9 @@ SCHEDULER = "scrapy_redis.scheduler.Scheduler"
 # 2. 替换去重器：使用 Redis 集合存储去重指纹
 # DUPEFILTER_CLASS = "scrapy_redis.dupefilter.RFPDupeFilter"
 DUPEFILTER_CLASS = "sf_spider.dupefilters.JSONTaskDupeFilter"
+# DUPEFILTER_CLASS = "sf_spider.dupefilters.BloomJSONTaskDupeFilter"  # 布隆过滤器（Redis位图），内存固定、有少量误判
+# DUPEFILTER_BLOOM_CAPACITY = 1000000  # 第一个子过滤器的容量，写满后自动扩容
+# DUPEFILTER_BLOOM_ERROR_RATE = 0.001  # 总误判率
 
 # 3. Redis 连接配置（根据你的 Redis 服务器修改）
 REDIS_URL = 'redis://:000578@43.138.130.198:6379/0'
@@ -27,6 +30,7 @@ POSTGRESQL_PORT = 5432        # PostgreSQL端口
 POSTGRESQL_DATABASE = 'sf_erp'  # 数据库名
 POSTGRESQL_USER = 'postgres'  # 用户名
 POSTGRESQL_PASSWORD = '000578'  # 密码，需要替换为实际密码
+# POSTGRESQL_WRITE_MODES = {'sf_spider_shipment': 'staging'}  # 按表名指定写入方式，优先于Item的WRITE_MODE
 
 # 4. 可选：任务队列空时不停止爬虫（持续监听新任务）
 SCHEDULER_IDLE_BEFORE_CLOSE = 0  # 0 表示永不关闭
@@ -38,6 +42,7 @@ SCHEDULER_BATCH_SIZE = 5    # 每次取 5 条任务
 ITEM_PIPELINES = {
     # 'scrapy_redis.pipelines.RedisPipeline': 300,  # 结果存入 Redis 列表
     'sf_spider.pipelines.UniversalPostgreSQLPipeline': 300,
+    # 'sf_spider.async_pipelines.AsyncPostgreSQLPipeline': 300,  # asyncio reactor下的异步版本（psycopg3），与上一行二选一
 }
 
 # 启用 Playwright 下载处理器
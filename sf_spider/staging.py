@@ -0,0 +1,59 @@
+"""暂存表写入：批次先COPY到每个爬虫（按主机区分）独有的UNLOGGED暂存表，再按节奏用一条INSERT ... SELECT合并到目标表
+
+暂存表不带约束和索引，COPY写入几乎没有额外开销；合并时一次性处理大量行，ON CONFLICT的索引查找集中在一条语句中完成。
+合并语句用 DELETE ... RETURNING 取出暂存行，合并期间其他线程继续COPY写入的行不可见，留到下一次合并，不需要加锁。
+UNLOGGED表在数据库崩溃恢复时会被清空，未合并的数据由本地日志（JOURNAL_DIR）保护：日志分段在合并成功后才删除。
+"""
+import hashlib
+import socket
+
+SEQ_COLUMN = 'sf_stage_seq'  # 暂存行的写入顺序，合并时同一个键保留最后（或第一）一行
+
+_HOST = socket.gethostname()
+
+
+def staging_table_name(table_name, spider_name):
+    """暂存表名，目标表名截断后再加按主机名和爬虫名计算的后缀，避免超过PostgreSQL 63字节的标识符限制时后缀被截掉
+
+    不同机器上或不同爬虫写入同一张目标表时使用各自的暂存表，互不干扰；同一爬虫重启后沿用同一张暂存表
+    （与本地日志目录一致），上次运行崩溃时遗留的暂存表在首次使用时处理，不会成为无人清理的孤立表。
+    """
+    suffix = hashlib.md5(f"{_HOST}/{spider_name}".encode('utf-8')).hexdigest()[:12]
+    return f"{table_name[:40]}_stg_{suffix}"
+
+
+def create_staging_sql(table_name, staging_name, columns):
+    """创建暂存表：列类型与目标表一致，但不复制NOT NULL、默认值、约束和索引"""
+    return [
+        f"CREATE UNLOGGED TABLE IF NOT EXISTS {staging_name} AS "
+        f"SELECT {', '.join(columns)} FROM {table_name} WITH NO DATA",
+        f"ALTER TABLE {staging_name} ADD COLUMN IF NOT EXISTS {SEQ_COLUMN} bigint GENERATED ALWAYS AS IDENTITY",
+    ]
+
+
+def merge_sql(table_name, staging_name, columns, conflict_fields=None, conflict_clause='', keep_last=True, seq_range=False):
+    """把暂存表中的行合并到目标表的单条语句
+
+    配置了冲突字段时，同一个键只保留写入顺序最后（keep_last）或最早的一行，避免ON CONFLICT DO UPDATE在同一条语句中
+    更新同一行两次；含NULL的键在PostgreSQL中不会冲突，原样保留。
+    seq_range为True时只合并写入顺序在 [%s, %s) 范围内的行（合并失败时二分定位错误行）。
+    """
+    column_list = ', '.join(columns)
+    where = f" WHERE {SEQ_COLUMN} >= %s AND {SEQ_COLUMN} < %s" if seq_range else ''
+    moved = f"WITH moved AS (DELETE FROM {staging_name}{where} RETURNING {column_list}, {SEQ_COLUMN})"
+    if not conflict_fields:
+        return f"{moved} INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM moved ORDER BY {SEQ_COLUMN}"
+
+    order = 'DESC' if keep_last else 'ASC'
+    null_keys = ' OR '.join(f"{field} IS NULL" for field in conflict_fields)
+    return (
+        f"{moved}, ranked AS (SELECT *, row_number() OVER "
+        f"(PARTITION BY {', '.join(conflict_fields)} ORDER BY {SEQ_COLUMN} {order}) AS sf_rank FROM moved) "
+        f"INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM ranked "
+        f"WHERE sf_rank = 1 OR {null_keys} ORDER BY {SEQ_COLUMN} {conflict_clause}"
+    )
+
+
+def drop_staging_sql(staging_name):
+    """删除暂存表"""
+    return f"DROP TABLE IF EXISTS {staging_name}"
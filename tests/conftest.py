@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 测试从项目根目录导入sf_spider（与benchmarks相同，项目没有打包安装）
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
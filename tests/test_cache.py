@@ -0,0 +1,123 @@
+"""内容哈希、LRU缓存与变化检测缓存"""
+from datetime import datetime, timezone
+
+from dateutil import tz
+
+from sf_spider.cache import ChangeCache, LRUCache, content_hash
+from sf_spider.items import models
+from sf_spider.items.items import BaseItem
+from sf_spider.items.records import ItemBatch
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+
+def test_content_hash():
+    assert content_hash([1, 'a', None]) == content_hash([1, 'a', None])
+    assert content_hash([1, 'a']) != content_hash(['1', 'a'])
+    assert -2 ** 63 <= content_hash([{'b': 1, 'a': 2}]) < 2 ** 63
+    assert content_hash([{'b': 1, 'a': 2}]) == content_hash([{'a': 2, 'b': 1}])
+    # dateutil与fromisoformat解析出的tzinfo类型不同，值相同时哈希相同
+    assert content_hash([datetime(2025, 1, 1, tzinfo=timezone.utc)]) == content_hash([datetime(2025, 1, 1, tzinfo=tz.UTC)])
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1 and len(cache) == 2
+    assert cache.pop('a') == 1 and cache.pop('a') is None
+
+
+def test_change_cache_records_hash_after_commit():
+    cache = ChangeCache(10)
+    assert not cache.is_unchanged('k', 1)
+    # 写入途中再次出现相同内容时跳过，但还没有记录为已提交
+    assert cache.is_unchanged('k', 1)
+    assert cache.local.get('k') is None
+    cache.settle([('k', True)])
+    assert cache.local.get('k') == 1 and not cache.staged
+    assert cache.is_unchanged('k', 1)
+
+
+def test_change_cache_discards_failed_rows():
+    cache = ChangeCache(10)
+    assert not cache.is_unchanged('k', 1)
+    cache.settle([('k', False)])
+    assert not cache.staged and cache.local.get('k') is None
+    # 写入失败的内容再次出现时照常写入
+    assert not cache.is_unchanged('k', 1)
+
+
+def test_change_cache_settles_in_order():
+    cache = ChangeCache(10)
+    # 同一个键A -> B -> A依次写入途中
+    assert not cache.is_unchanged('k', 1)
+    assert not cache.is_unchanged('k', 2)
+    assert not cache.is_unchanged('k', 1)
+    assert cache.is_unchanged('k', 1)
+    cache.settle([('k', True), ('k', False)])
+    assert cache.local.get('k') == 1 and list(cache.staged['k']) == [1]
+    cache.settle([('k', True)])
+    assert cache.local.get('k') == 1 and not cache.staged
+    assert not cache.is_unchanged('k', 2)
+
+
+class CountingRedis:
+    """记录调用次数的Redis哈希（只实现ChangeCache用到的命令）"""
+
+    def __init__(self, data=None):
+        self.data = {key: str(value).encode() for key, value in (data or {}).items()}
+        self.calls = []
+
+    def hget(self, name, key):
+        self.calls.append('hget')
+        return self.data.get(key)
+
+    def hmget(self, name, keys):
+        self.calls.append('hmget')
+        return [self.data.get(key) for key in keys]
+
+
+def test_change_cache_unchanged_many_uses_one_hmget():
+    redis = CountingRedis({'a': 1, 'b': 2})
+    cache = ChangeCache(10, redis=redis, redis_key='h')
+    cache.local.set('c', 3)
+    entries = [('a', 1), ('b', 5), ('c', 3), ('d', 4), ('d', 4), ('a', 1)]
+    assert cache.unchanged_many(entries) == [True, False, True, False, True, True]
+    # 本地没有记录的键（a、b、d）只查询一次Redis，批次内重复的键不重复查询
+    assert redis.calls == ['hmget']
+    # Redis中已有的记录缓存到本地，之后不再查询
+    assert cache.unchanged_many([('a', 1)]) == [True]
+    assert redis.calls == ['hmget']
+    # 单行查询仍使用HGET
+    assert not cache.is_unchanged('e', 1)
+    assert redis.calls == ['hmget', 'hget']
+
+
+class ChangeItem(BaseItem):
+    TABLE = 'test_change_cache'
+    CHANGE_KEY = ['tracking_number']
+    tracking_number = models.StringField()
+    status = models.StringField()
+
+
+def test_pipeline_item_batch_queries_redis_once():
+    pipeline = UniversalPostgreSQLPipeline()
+    redis = CountingRedis()
+    pipeline.change_caches[ChangeItem.TABLE] = ChangeCache(100, redis=redis, redis_key='h')
+    pipeline._get_validation_plan(ChangeItem)
+    columns = pipeline.item_columns[ChangeItem]
+    rows = [{'tracking_number': f'T{index}', 'status': 'A'} for index in range(50)]
+    rows += [{'tracking_number': 'T0', 'status': 'A'}, {'tracking_number': None, 'status': 'A'}]
+
+    extracted = pipeline._extract_rows(ItemBatch(ChangeItem, rows), ChangeItem, columns)
+    # 50个新键只查询一次Redis；批次内重复的内容跳过，自然键为None的行不比较
+    assert redis.calls == ['hmget']
+    assert len(extracted) == 51
+
+    # 提交后再次出现的相同内容全部跳过，本地缓存命中时不再查询Redis
+    pipeline.table_items[ChangeItem.TABLE] = ChangeItem
+    pipeline._settle_change_keys(ChangeItem.TABLE, columns, extracted)
+    assert pipeline._extract_rows(ItemBatch(ChangeItem, rows[:50]), ChangeItem, columns) == []
+    assert redis.calls == ['hmget']
@@ -0,0 +1,69 @@
+"""DatetimeParser：结果与dateutil一致、格式学习与解析结果缓存"""
+from datetime import datetime, date, timezone
+
+import pytest
+from dateutil import parser as dateutil_parser
+
+from sf_spider.items.models import DatetimeParser
+
+
+@pytest.mark.parametrize('value', [
+    '2025-09-18 08:15:32',
+    '2025-09-18T08:15:32.123456+08:00',
+    '2025-09-18T08:15:32Z',
+    '2025/09/18 08:15',
+    '09/18/2025 08:15:32',
+    '09/18/2025 8:15 PM',
+    '01/02/2025',
+    'Sep 18, 2025 8:15 PM',
+    'September 18, 2025',
+    'Thu, 18 Sep 2025 08:15:32 +0000',
+    '18 Sep 2025',
+])
+def test_matches_dateutil(value):
+    parser = DatetimeParser()
+    # 第一次可能由dateutil解析并学习格式，第二次按学到的格式或缓存解析
+    assert parser(value) == dateutil_parser.parse(value)
+    assert parser(value) == dateutil_parser.parse(value)
+    assert DatetimeParser(memo_size=0)(value) == dateutil_parser.parse(value)
+
+
+def test_learns_format():
+    parser = DatetimeParser()
+    parser('09/18/2025 08:15:32')
+    assert parser.formats == ['%m/%d/%Y %H:%M:%S']
+    assert parser('12/31/2024 23:59:59') == datetime(2024, 12, 31, 23, 59, 59)
+    assert parser.formats == ['%m/%d/%Y %H:%M:%S']
+
+
+def test_month_first_like_dateutil():
+    assert DatetimeParser()('01/02/2025') == datetime(2025, 1, 2)
+
+
+def test_empty_and_date_only():
+    assert DatetimeParser()('') is None
+    assert DatetimeParser()(None) is None
+    parser = DatetimeParser(date_only=True)
+    assert parser('2025-09-18 08:15:32') == date(2025, 9, 18)
+    assert parser('2025-09-18 08:15:32') == date(2025, 9, 18)
+
+
+def test_keeps_timezone():
+    assert DatetimeParser()('2025-09-18T08:15:32+00:00').tzinfo == timezone.utc
+
+
+def test_memoizes_only_absolute_values():
+    parser = DatetimeParser()
+    parser('2025-09-18 08:15:32')
+    parser('2025/09/18 08:15')
+    assert len(parser.memo) == 2
+    # 缺少日期或年份的字符串按当天补全，不能缓存
+    for value in ('12:30', 'Sep 18', '8:15 PM'):
+        assert parser(value) == dateutil_parser.parse(value)
+    assert len(parser.memo) == 2
+    assert parser.memo.get('12:30') is None
+
+
+def test_invalid_value_raises():
+    with pytest.raises(ValueError):
+        DatetimeParser()('not a date')
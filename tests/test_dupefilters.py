@@ -0,0 +1,74 @@
+"""布隆过滤器去重：Lua脚本与filter_params的参数一致（需要fakeredis[lua]）"""
+import math
+
+import pytest
+from scrapy import Request
+
+from sf_spider.dupefilters import BloomJSONTaskDupeFilter, JSONTaskDupeFilter
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+
+
+@pytest.fixture
+def dupefilter():
+    dupefilter = BloomJSONTaskDupeFilter(fakeredis.FakeRedis(), 'test:dupefilter')
+    dupefilter.capacity, dupefilter.error_rate, dupefilter.growth = 5, 0.0001, 2
+    return dupefilter
+
+
+def task_request(task_id):
+    return Request('https://example.com/api', meta={'task': {'id': task_id, 'name': '任务'}})
+
+
+def bit_positions(dupefilter, request, index):
+    """按request_seen的双重哈希计算指纹在第index个子过滤器中的位置"""
+    _, k, m = dupefilter.filter_params(index)
+    digest = bytes.fromhex(dupefilter.request_fingerprint(request))
+    h1 = int.from_bytes(digest[:4], 'big')
+    h2 = int.from_bytes(digest[4:8], 'big') | 1
+    return [(h1 + j * h2) % m for j in range(k)]
+
+
+def test_task_fingerprint_ignores_key_order():
+    fingerprint = JSONTaskDupeFilter.request_fingerprint
+    a = Request('https://example.com/a', meta={'task': {'a': 1, 'b': 1e16}})
+    b = Request('https://example.com/b', meta={'task': {'b': 1e16, 'a': 1}})
+    assert fingerprint(None, a) == fingerprint(None, b)
+
+
+def test_filter_params(dupefilter):
+    # m向上取整到2的幂：-5·ln(0.00005)/ln²2 ≈ 103位 -> 128位
+    assert [dupefilter.filter_params(index) for index in range(3)] == [(5, 15, 128), (10, 16, 256), (20, 17, 512)]
+    # 各子过滤器误判率之和不超过总误判率
+    assert sum(dupefilter.error_rate * (1 - dupefilter.ratio) * dupefilter.ratio ** i for i in range(50)) < dupefilter.error_rate
+    dupefilter.capacity = 10 ** 12
+    assert dupefilter.filter_params(0)[2] == 2 ** 32
+
+
+def test_script_matches_filter_params(dupefilter):
+    server, key = dupefilter.server, dupefilter.bloom_key
+    for task_id in range(40):
+        request = task_request(task_id)
+        assert not dupefilter.request_seen(request)
+        index = int(server.hget(key, 'filters')) - 1
+        bits = f'{key}:{index}'
+        # 脚本置位的位置与filter_params的k、m计算出的位置相同（k个位置互不重合），位图不超过m位
+        positions = bit_positions(dupefilter, request, index)
+        assert len(set(positions)) == len(positions)
+        assert all(server.getbit(bits, position) for position in positions)
+        assert server.strlen(bits) <= math.ceil(dupefilter.filter_params(index)[2] / 8)
+        assert dupefilter.request_seen(request)
+
+    # 子过滤器按filter_params的容量写满后才追加：5 + 10 + 20 条之后第4个子过滤器写入5条
+    assert int(server.hget(key, 'filters')) == 4
+    assert [int(server.hget(key, f'count:{index}')) for index in range(4)] == [5, 10, 20, 5]
+    assert int(server.hget(key, 'count')) == 40
+
+
+def test_clear(dupefilter):
+    for task_id in range(8):
+        dupefilter.request_seen(task_request(task_id))
+    dupefilter.clear()
+    assert dupefilter.server.keys('test:dupefilter*') == []
+    assert not dupefilter.request_seen(task_request(0))
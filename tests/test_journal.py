@@ -0,0 +1,202 @@
+"""本地追加写日志（SpillJournal）与Pipeline的日志重放"""
+import logging
+import os
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import pytest
+
+from sf_spider.items import models
+from sf_spider.items.items import BaseItem
+from sf_spider.journal import SpillJournal
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+
+class JournalItem(BaseItem):
+    TABLE = 'test_journal'
+    name = models.StringField(max_length=5, required=True)
+    day = models.DateField()
+    updated = models.DatetimeField()
+
+
+COLUMNS = ('name', 'day', 'updated')
+ITEM_PATH = f"{__name__}.JournalItem"
+
+
+def segment_files(directory, suffix=SpillJournal.SUFFIX):
+    return sorted(name for name in os.listdir(directory) if name.endswith(suffix))
+
+
+def test_append_seal_load(tmp_path):
+    journal = SpillJournal(str(tmp_path))
+    journal.append('t', ITEM_PATH, COLUMNS, ('a', None, None))
+    journal.append('t', ITEM_PATH, COLUMNS, ('b', None, None))
+    segments = journal.seal('t')
+    assert len(segments) == 1
+    assert journal.seal('t') == []
+    assert journal.load(segments) == (ITEM_PATH, COLUMNS, [('a', None, None), ('b', None, None)])
+
+    # 封存后的新数据写入新的分段
+    journal.append('t', ITEM_PATH, COLUMNS, ('c', None, None))
+    assert journal.seal('t') != segments
+    journal.close()
+
+
+def test_streams_are_sealed_separately(tmp_path):
+    journal = SpillJournal(str(tmp_path))
+    journal.append('t', ITEM_PATH, COLUMNS, ('row', None, None))
+    journal.append('t', ITEM_PATH, COLUMNS, ('raw', None, None), stream='raw')
+    raw = journal.seal('t', stream='raw')
+    rows = journal.seal('t')
+    assert journal.load(raw)[2] == [('raw', None, None)]
+    assert journal.load(rows)[2] == [('row', None, None)]
+
+
+def test_restore_merges_into_next_batch(tmp_path):
+    journal = SpillJournal(str(tmp_path))
+    journal.append('t', ITEM_PATH, COLUMNS, ('a', None, None))
+    failed = journal.seal('t')
+    journal.restore('t', failed)
+    journal.append('t', ITEM_PATH, COLUMNS, ('b', None, None))
+    segments = journal.seal('t')
+    assert segments[0] == failed[0] and len(segments) == 2
+    assert journal.load(segments)[2] == [('a', None, None), ('b', None, None)]
+    # 已放回的分段不会并入stream缓冲区的批次
+    journal.restore('t', failed)
+    assert journal.seal('t', stream='raw') == []
+
+
+def test_discard_and_quarantine(tmp_path):
+    journal = SpillJournal(str(tmp_path))
+    journal.append('t', ITEM_PATH, COLUMNS, ('a', None, None))
+    committed = journal.seal('t')
+    journal.append('t', ITEM_PATH, COLUMNS, ('b', None, None))
+    failed = journal.seal('t')
+    journal.discard(committed)
+    journal.discard(committed)  # 重复删除不报错
+    journal.quarantine(failed)
+    assert segment_files(str(tmp_path)) == []
+    assert segment_files(str(tmp_path), SpillJournal.FAILED_SUFFIX) == [os.path.basename(failed[0]) + SpillJournal.FAILED_SUFFIX]
+    # 隔离的分段不会在启动时重放
+    assert SpillJournal(str(tmp_path)).recover() == []
+
+
+def test_recover_after_crash_mid_segment(tmp_path):
+    journal = SpillJournal(str(tmp_path))
+    journal.append('t', ITEM_PATH, COLUMNS, ('a', None, None))
+    journal.append('other_table', ITEM_PATH, COLUMNS, ('x', None, None))
+    journal.append('t', ITEM_PATH, COLUMNS, ('b', None, None))
+    # 模拟崩溃：最后一行只写了一半，分段未封存
+    path = journal.active[('t', None)][0]
+    journal.active[('t', None)][1].write('["c", nu')
+    journal.close()
+
+    recovered = SpillJournal(str(tmp_path)).recover()
+    assert sorted(table for table, _ in recovered) == ['other_table', 't']
+    segments = dict(recovered)['t']
+    assert segments == [path]
+    assert SpillJournal.load(segments) == (ITEM_PATH, COLUMNS, [('a', None, None), ('b', None, None)])
+
+
+def test_load_skips_empty_segment(tmp_path):
+    path = tmp_path / f"t.1{SpillJournal.SUFFIX}"
+    path.write_text('')
+    assert SpillJournal.load([str(path)]) == (None, None, [])
+
+
+def make_pipeline(directory):
+    pipeline = UniversalPostgreSQLPipeline()
+    pipeline.logger = logging.getLogger('test_journal')
+    pipeline.journal = SpillJournal(directory)
+    pipeline._get_validation_plan(JournalItem)
+    return pipeline
+
+
+def test_load_journal_rows_round_trip(tmp_path):
+    pipeline = make_pipeline(str(tmp_path))
+    columns = pipeline.item_columns[JournalItem]
+    rows = [
+        {'name': 'a', 'day': date(2025, 9, 18), 'updated': datetime(2025, 9, 18, 8, 15, 32)},
+        {'name': 'b', 'day': None, 'updated': '2025-09-18 08:15:32'},
+    ]
+    for row in rows:
+        pipeline.journal.append(JournalItem.TABLE, ITEM_PATH, columns, tuple(row[field] for field in columns))
+    segments = pipeline.journal.seal(JournalItem.TABLE)
+
+    # 新进程中Item类按日志中记录的路径加载，日期时间值从ISO字符串还原
+    assert JournalItem.TABLE not in pipeline.table_items
+    loaded_columns, data_list = pipeline._load_journal_rows(JournalItem.TABLE, segments)
+    assert pipeline.table_items[JournalItem.TABLE] is JournalItem
+    assert loaded_columns == columns
+    expected = [
+        {'name': 'a', 'day': date(2025, 9, 18), 'updated': datetime(2025, 9, 18, 8, 15, 32)},
+        {'name': 'b', 'day': None, 'updated': datetime(2025, 9, 18, 8, 15, 32)},
+    ]
+    assert [dict(zip(columns, row)) for row in data_list] == expected
+
+
+def test_load_journal_rows_drops_invalid_rows(tmp_path, monkeypatch):
+    pipeline = make_pipeline(str(tmp_path))
+    monkeypatch.setattr(pipeline, '_write_dead_letter_file', lambda *args: None)
+    columns = pipeline.item_columns[JournalItem]
+    for name in ('ok', 'too long', None):
+        pipeline.journal.append(JournalItem.TABLE, ITEM_PATH, columns, tuple(name if field == 'name' else None for field in columns))
+    _, data_list = pipeline._load_journal_rows(JournalItem.TABLE, pipeline.journal.seal(JournalItem.TABLE))
+    assert [row[columns.index('name')] for row in data_list] == ['ok']
+
+
+def crash_and_restart(directory):
+    """上一个进程写入两个批次后崩溃（第二个批次的分段未封存），返回重启后的Pipeline"""
+    previous = make_pipeline(directory)
+    columns = previous.item_columns[JournalItem]
+    for name in ('a', 'b'):
+        previous.journal.append(JournalItem.TABLE, ITEM_PATH, columns, tuple(name if field == 'name' else None for field in columns))
+        previous.journal.seal(JournalItem.TABLE)
+    previous.journal.append(JournalItem.TABLE, ITEM_PATH, columns, tuple('c' if field == 'name' else None for field in columns))
+    previous.journal.close()
+
+    pipeline = make_pipeline(directory)
+    pipeline.table_items.clear()
+
+    @contextmanager
+    def borrow():
+        yield None, None
+
+    pipeline._borrow = borrow
+    pipeline.spilled.extend(pipeline.journal.recover())
+    return pipeline
+
+
+@pytest.mark.parametrize('outcome', ['committed', 'failed', 'spilled'])
+def test_replay_recovered_segments(tmp_path, outcome):
+    pipeline = crash_and_restart(str(tmp_path))
+    assert len(pipeline.spilled) == 3
+    replayed = []
+
+    def commit_batch(table_name, columns, data_list, segments):
+        replayed.append([row[columns.index('name')] for row in data_list])
+        if outcome == 'failed':
+            raise Exception('批量插入失败')
+        if outcome == 'spilled':
+            pipeline._spill(table_name, data_list, segments)
+            return
+        pipeline.journal.discard(segments)
+
+    pipeline._commit_batch = commit_batch
+    pipeline._retry_spilled()
+
+    if outcome == 'committed':
+        # 每个分段单独重放，提交后删除
+        assert replayed == [['a'], ['b'], ['c']]
+        assert segment_files(str(tmp_path)) == []
+        assert not pipeline.spilled
+    elif outcome == 'failed':
+        # 写入失败的分段改名隔离，不再重放
+        assert replayed == [['a'], ['b'], ['c']]
+        assert segment_files(str(tmp_path)) == []
+        assert len(segment_files(str(tmp_path), SpillJournal.FAILED_SUFFIX)) == 3
+    else:
+        # 数据库再次不可用：停止重放，全部分段留在积压队列中
+        assert replayed == [['a']]
+        assert len(pipeline.spilled) == 3
+        assert len(segment_files(str(tmp_path))) == 3
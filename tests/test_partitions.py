@@ -0,0 +1,78 @@
+"""分区边界计算与按下界排序"""
+from datetime import datetime, date, timezone, timedelta
+
+import pytest
+
+from sf_spider import partitions
+
+
+@pytest.mark.parametrize('value, interval, expected', [
+    (1234, 1000, ('1000', '1000', '2000')),
+    (1000, 1000, ('1000', '1000', '2000')),
+    (999, 1000, ('0', '0', '1000')),
+    (-1, 1000, ('m1000', '-1000', '0')),
+    (date(2025, 3, 15), 'day', ('20250315', "'2025-03-15'", "'2025-03-16'")),
+    (date(2025, 3, 15), 'week', ('20250310', "'2025-03-10'", "'2025-03-17'")),
+    (date(2025, 3, 15), 'month', ('202503', "'2025-03-01'", "'2025-04-01'")),
+    (date(2025, 12, 31), 'month', ('202512', "'2025-12-01'", "'2026-01-01'")),
+    (date(2025, 3, 15), 'year', ('2025', "'2025-01-01'", "'2026-01-01'")),
+    (datetime(2025, 3, 15, 23, 59), 'day', ('20250315', "'2025-03-15'", "'2025-03-16'")),
+])
+def test_partition_bounds(value, interval, expected):
+    assert partitions.partition_bounds(value, interval) == expected
+
+
+def test_partition_bounds_converts_to_session_tz():
+    value = datetime(2025, 3, 31, 20, 0, tzinfo=timezone.utc)
+    assert partitions.partition_bounds(value, 'month')[0] == '202503'
+    assert partitions.partition_bounds(value, 'month', timezone(timedelta(hours=8)))[0] == '202504'
+    # 无时区的datetime不转换
+    assert partitions.partition_bounds(value.replace(tzinfo=None), 'month', timezone(timedelta(hours=8)))[0] == '202503'
+
+
+@pytest.mark.parametrize('value, interval', [
+    (date(2025, 1, 1), 1000),
+    (date(2025, 1, 1), 'hour'),
+    (10, 'day'),
+    (10, 0),
+    (True, 10),
+    ('2025-01-01', 'day'),
+])
+def test_partition_bounds_invalid(value, interval):
+    with pytest.raises(ValueError):
+        partitions.partition_bounds(value, interval)
+
+
+def test_range_partitions_by_age():
+    found = {
+        't_default': 'DEFAULT',
+        't_p2000': 'FOR VALUES FROM (2000) TO (3000)',
+        't_pm1000': 'FOR VALUES FROM (-1000) TO (0)',
+        't_p10000': 'FOR VALUES FROM (10000) TO (11000)',
+        't_p0': 'FOR VALUES FROM (0) TO (1000)',
+    }
+    assert partitions.range_partitions_by_age(found) == ['t_pm1000', 't_p0', 't_p2000', 't_p10000']
+
+
+def test_range_partitions_by_age_dates():
+    found = {
+        't_p20250301': "FOR VALUES FROM ('2025-03-01') TO ('2025-04-01')",
+        't_p20241201': "FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')",
+        't_p20250101': "FOR VALUES FROM ('2025-01-01 00:00:00+00') TO ('2025-02-01 00:00:00+00')",
+        't_default': 'DEFAULT',
+        't_other': None,
+    }
+    assert partitions.range_partitions_by_age(found) == ['t_p20241201', 't_p20250101', 't_p20250301']
+
+
+def test_partition_sql():
+    class Item:
+        PARTITION_KEY = 'batch_id'
+
+    assert partitions.partition_clause(Item) == ' PARTITION BY RANGE (batch_id)'
+    assert partitions.primary_key_defs(Item) == ['id SERIAL', 'PRIMARY KEY (id, batch_id)']
+    assert not partitions.supports_unique(Item, ['hash_id'])
+    assert partitions.supports_unique(Item, ['hash_id', 'batch_id'])
+    assert partitions.create_partition_sql('t', '1000', '1000', '2000') == (
+        'CREATE TABLE IF NOT EXISTS t_p1000 PARTITION OF t FOR VALUES FROM (1000) TO (2000)'
+    )
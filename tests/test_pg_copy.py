@@ -0,0 +1,96 @@
+"""pg_copy的text与binary编码（期望值取自PostgreSQL的numeric_send/timestamptz_send）"""
+import struct
+from datetime import datetime, date, timezone, timedelta
+from decimal import Decimal
+
+import pytest
+
+from sf_spider import pg_copy
+
+
+def test_encode_text_value():
+    assert pg_copy.encode_text_value(None) == '\\N'
+    assert pg_copy.encode_text_value(True) == 't'
+    assert pg_copy.encode_text_value(False) == 'f'
+    assert pg_copy.encode_text_value(12) == '12'
+    assert pg_copy.encode_text_value('a\\b\tc\nd\re') == 'a\\\\b\\tc\\nd\\re'
+    assert pg_copy.encode_text_value(date(2025, 1, 2)) == '2025-01-02'
+    assert pg_copy.encode_text_value(datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)) == '2025-01-02T03:04:05+00:00'
+
+
+def test_encode_text_value_json():
+    # dict/list按JSON序列化后再转义（JSON字符串中的\n是两个字符，反斜杠需要转义）
+    assert pg_copy.encode_text_value({'a': [1, '中']}) == '{"a":[1,"中"]}'
+    assert pg_copy.encode_text_value(['x\ny']) == '["x\\\\ny"]'
+
+
+def test_encode_text_row():
+    assert pg_copy.encode_text_row(('a', None, 1)) == 'a\t\\N\t1\n'.encode('utf-8')
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('0', '0000000000000000'),
+    ('1', '00010000000000000001'),
+    ('-1', '00010000400000000001'),
+    ('2.50', '000200000000000200021388'),
+    ('-0.5', '0001ffff400000011388'),
+    ('0.0001', '0001ffff000000040001'),
+    ('0.00012', '0002ffff00000005000107d0'),
+    ('12345.678', '0003000100000003000109291a7c'),
+    ('1000000', '00010001000000000064'),
+    ('1E+5', '0001000100000000000a'),
+    ('123456789.123456789', '0006000200000009000109291a8504d2162e2328'),
+    ('NaN', '00000000c0000000'),
+])
+def test_encode_numeric(value, expected):
+    assert pg_copy.get_binary_encoder('numeric')(Decimal(value)).hex() == expected
+
+
+def test_encode_numeric_float_and_infinity():
+    # float按str()转换，与INSERT时psycopg2发送的文本一致
+    assert pg_copy._encode_numeric(2.5) == pg_copy._encode_numeric(Decimal('2.5'))
+    # 无穷大只比较符号字（PostgreSQL接收时忽略dscale）
+    assert struct.unpack('!hhH', pg_copy._encode_numeric(Decimal('Infinity'))[:6]) == (0, 0, 0xD000)
+    assert struct.unpack('!hhH', pg_copy._encode_numeric(Decimal('-Infinity'))[:6]) == (0, 0, 0xF000)
+
+
+def test_encode_timestamptz():
+    encode = pg_copy.get_binary_encoder('timestamp with time zone')
+    assert encode(datetime(2000, 1, 1, tzinfo=timezone.utc)) == struct.pack('!q', 0)
+    value = datetime(2025, 1, 2, 3, 4, 5, 123456, tzinfo=timezone(timedelta(hours=8)))
+    assert encode(value).hex() == '0002cda87a65f580'
+    assert encode(datetime(1999, 12, 31, 23, 59, 59, tzinfo=timezone.utc)) == struct.pack('!q', -1000000)
+
+
+def test_encode_timestamptz_naive_uses_session_tz():
+    shanghai = timezone(timedelta(hours=8))
+    encode = pg_copy.get_binary_encoder('timestamp with time zone', shanghai)
+    naive = datetime(2025, 1, 2, 3, 4, 5, 123456)
+    assert encode(naive) == encode(naive.replace(tzinfo=shanghai))
+    assert encode(naive) != pg_copy.get_binary_encoder('timestamp with time zone')(naive)
+
+
+def test_encode_binary_row():
+    encoders = [pg_copy.get_binary_encoder(pg_type) for pg_type in ('integer', 'varchar(10)', 'date', 'boolean', 'jsonb')]
+    row = pg_copy.encode_binary_row((7, None, date(2000, 1, 2), True, {'a': 1}), encoders)
+    assert row == b''.join([
+        struct.pack('!h', 5),
+        struct.pack('!ii', 4, 7),
+        pg_copy.BINARY_NULL,
+        struct.pack('!ii', 4, 1),
+        struct.pack('!i', 1) + b'\x01',
+        struct.pack('!i', 8) + b'\x01{"a":1}',
+    ])
+
+
+def test_copy_stream_reads_in_chunks():
+    rows = [('a', 1), ('b', None)]
+    expected = b''.join(pg_copy.encode_text_row(row) for row in rows)
+    stream = pg_copy.text_copy_stream(rows)
+    chunks = iter(lambda: stream.read(3), b'')
+    assert b''.join(chunks) == expected
+
+    stream = pg_copy.binary_copy_stream([(1,)], [pg_copy.get_binary_encoder('integer')])
+    data = stream.read()
+    assert data.startswith(pg_copy.BINARY_HEADER) and data.endswith(pg_copy.BINARY_TRAILER)
+    assert stream.read() == b''
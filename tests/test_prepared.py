@@ -0,0 +1,103 @@
+"""服务端预编译语句：批次按行数分块、语句命名与参数数量上限"""
+import re
+
+import pytest
+
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+
+class FakeConnection:
+    closed = False
+
+
+class FakeCursor:
+    """记录执行的语句和参数"""
+
+    def __init__(self):
+        self.connection = FakeConnection()
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+
+def build_insert(table_name, columns):
+    return lambda values: f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES {values}"
+
+
+@pytest.mark.parametrize('total, max_rows, expected', [
+    (0, 500, []),
+    (1, 500, [1]),
+    (499, 500, [256, 128, 64, 32, 16, 2, 1]),
+    (500, 500, [500]),
+    (501, 500, [500, 1]),
+    (1000, 500, [500, 500]),
+    (1003, 500, [500, 500, 2, 1]),
+    (64, 64, [64]),
+    (127, 64, [64, 32, 16, 8, 4, 2, 1]),
+    (128, 64, [64, 64]),
+])
+def test_prepared_chunk_sizes(total, max_rows, expected):
+    sizes = UniversalPostgreSQLPipeline._prepared_chunk_sizes(total, max_rows)
+    assert sizes == expected
+    assert sum(sizes) == total
+    # 余数部分只出现2的幂，每张表预编译的语句数量有限
+    assert all(size == max_rows or size & (size - 1) == 0 for size in sizes)
+
+
+def test_execute_prepared_chunks_and_reuses_statements():
+    pipeline = UniversalPostgreSQLPipeline()
+    cur = FakeCursor()
+    columns = ('k', 'v')
+    rows = [(index, f'v{index}') for index in range(5)]
+    pipeline._execute_prepared(cur, 'insert', 'test_prepared', columns, rows, build_insert('test_prepared', columns))
+
+    prepares = [sql for sql, _ in cur.executed if sql.startswith('PREPARE')]
+    executes = [(sql, params) for sql, params in cur.executed if sql.startswith('EXECUTE')]
+    assert len(prepares) == 2  # 5行拆分为4+1
+    assert prepares[0].endswith("INSERT INTO test_prepared (k, v) VALUES ($1, $2), ($3, $4), ($5, $6), ($7, $8)")
+    assert prepares[1].endswith("INSERT INTO test_prepared (k, v) VALUES ($1, $2)")
+    # 参数按行展开，顺序与数据行一致
+    assert [params for _, params in executes] == [[0, 'v0', 1, 'v1', 2, 'v2', 3, 'v3'], [4, 'v4']]
+    assert executes[0][0].endswith("(%s, %s, %s, %s, %s, %s, %s, %s)")
+
+    # 同一连接上再次写入相同行数时直接EXECUTE，不再PREPARE
+    cur.executed = []
+    pipeline._execute_prepared(cur, 'insert', 'test_prepared', columns, rows[:4], build_insert('test_prepared', columns))
+    assert [sql.split()[0] for sql, _ in cur.executed] == ['EXECUTE']
+
+    # 新连接需要重新预编译
+    other = FakeCursor()
+    pipeline._execute_prepared(other, 'insert', 'test_prepared', columns, rows[:4], build_insert('test_prepared', columns))
+    assert [sql.split()[0] for sql, _ in other.executed] == ['PREPARE', 'EXECUTE']
+
+
+def test_prepared_statement_names():
+    pipeline = UniversalPostgreSQLPipeline()
+    cur = FakeCursor()
+    for table_name in ('test_prepared_a', 'test_prepared_b'):
+        columns = ('k', 'v')
+        pipeline._execute_prepared(cur, 'upsert_update', table_name, columns, [(1, 2)], build_insert(table_name, columns))
+    names = [sql.split()[1] for sql, _ in cur.executed if sql.startswith('PREPARE')]
+    # 语句名包含类型、行数和SQL文本的哈希：不同表的语句不会重名，且不超过PostgreSQL标识符的63字节
+    assert all(re.fullmatch(r'sf_upsert_update_1_[0-9a-f]{16}', name) for name in names)
+    assert len(set(names)) == 2
+    assert all(len(name) <= 63 for name in names)
+
+
+@pytest.mark.parametrize('column_count', [100, 300])
+def test_prepared_parameter_limit(column_count):
+    class Pipeline(UniversalPostgreSQLPipeline):
+        PREPARED_MAX_ROWS = 10000
+
+    pipeline = Pipeline()
+    cur = FakeCursor()
+    columns = tuple(f'c{index}' for index in range(column_count))
+    rows = [tuple(range(column_count))] * 700
+    pipeline._execute_prepared(cur, 'insert', f'test_prepared_{column_count}', columns, rows, build_insert('t', columns))
+
+    executes = [params for sql, params in cur.executed if sql.startswith('EXECUTE')]
+    assert sum(len(params) for params in executes) == column_count * len(rows)
+    # 每条语句的参数数量不超过PostgreSQL的65535个上限，PREPARED_MAX_ROWS更大时按参数上限分块
+    assert all(len(params) <= 65535 for params in executes)
+    assert max(len(params) for params in executes) == 65535 // column_count * column_count
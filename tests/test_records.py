@@ -0,0 +1,86 @@
+"""记录类与itemadapter适配器"""
+import pytest
+from itemadapter import ItemAdapter
+
+from sf_spider.items import models
+from sf_spider.items.items import BaseItem
+from sf_spider.items.records import Record, RecordAdapter, is_record, record_class
+
+
+class ShipmentItem(BaseItem):
+    TABLE = 'test_records'
+    tracking_number = models.CharField(max_length=50, verbose_name='运单号')
+    status = models.CharField(max_length=50)
+
+
+ShipmentRecord = record_class(ShipmentItem)
+
+
+def test_record_class_is_cached_and_named_after_item():
+    assert record_class(ShipmentItem) is ShipmentRecord
+    assert ShipmentRecord.__name__ == 'ShipmentRecord'
+    assert ShipmentRecord.__module__ == __name__
+    assert ShipmentRecord.item_class is ShipmentItem
+    assert set(ShipmentRecord.__slots__) == set(ShipmentItem.fields)
+
+
+def test_record_behaves_like_item():
+    record = ShipmentRecord(tracking_number='1Z')
+    assert is_record(record) and not is_record(ShipmentItem())
+    assert record['tracking_number'] == '1Z'
+    assert record.get('status') is None
+    # 与Item.get一样只返回字段，方法和类属性不是字段
+    assert record.get('to_item') is None and record.get('item_class', 'x') == 'x'
+    assert 'status' not in record and 'tracking_number' in record
+    assert list(record) == ['tracking_number'] and len(record) == 1
+    with pytest.raises(KeyError):
+        record['status']
+    with pytest.raises(KeyError):
+        record['unknown']
+    with pytest.raises(KeyError):
+        ShipmentRecord(unknown=1)
+    with pytest.raises(KeyError):
+        record['unknown'] = 1
+
+    record['status'] = 'A'
+    assert dict(record.items()) == {'tracking_number': '1Z', 'status': 'A'}
+    del record['status']
+    with pytest.raises(KeyError):
+        del record['status']
+    assert record == ShipmentRecord({'tracking_number': '1Z'})
+    assert record != ShipmentRecord(tracking_number='2Z')
+
+
+def test_to_item():
+    item = ShipmentRecord(tracking_number='1Z', status='A').to_item()
+    assert isinstance(item, ShipmentItem)
+    assert dict(item) == {'tracking_number': '1Z', 'status': 'A'}
+
+
+def test_reserved_field_names():
+    class BadItem(BaseItem):
+        TABLE = 'test_records_bad'
+        keys = models.CharField()
+
+    with pytest.raises(Exception, match='keys'):
+        record_class(BadItem)
+
+
+def test_record_adapter():
+    record = ShipmentRecord(tracking_number='1Z')
+    adapter = ItemAdapter(record)
+    assert isinstance(adapter.adapter, RecordAdapter)
+    assert ItemAdapter.is_item(record)
+    assert ItemAdapter.is_item_class(ShipmentRecord)
+    assert not ItemAdapter.is_item_class(Record)
+    assert list(adapter.field_names()) == list(ShipmentItem.fields)
+    assert adapter.asdict() == {'tracking_number': '1Z'}
+    assert adapter.get_field_meta('tracking_number')['verbose_name'] == '运单号'
+    assert ItemAdapter.get_field_names_from_class(ShipmentRecord) == list(ShipmentItem.fields)
+
+    adapter['status'] = 'A'
+    assert record.status == 'A'
+    del adapter['status']
+    assert 'status' not in record
+    with pytest.raises(KeyError):
+        adapter['unknown'] = 1
@@ -0,0 +1,117 @@
+"""离线表结构迁移：对比Item与表结构快照生成的DDL"""
+import io
+
+import pytest
+
+from sf_spider import schema
+from sf_spider.items import models
+from sf_spider.items.items import BaseItem
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+
+class ShipmentItem(BaseItem):
+    TABLE = 'test_schema_shipment'
+    INDEXES = ['status']
+    UNIQUE_CONSTRAINTS = [['tracking_number']]
+    LATEST_STATE_KEY = 'tracking_number'
+    LATEST_STATE_FIELDS = ['status']
+    tracking_number = models.StringField(max_length=20, comment="运单号")
+    status = models.StringField(max_length=50)
+    weight = models.IntField()
+
+
+class EventItem(BaseItem):
+    TABLE = 'test_schema_event'
+    ADD_AUTO_INCREMENT_ID = True
+    PARTITION_KEY = 'created'
+    PARTITION_INTERVAL = 'month'
+    UNIQUE_CONSTRAINTS = [['code'], ['code', 'created']]
+    code = models.StringField()
+    created = models.DatetimeField()
+
+
+def snapshot_table(columns, indexes=(), constraints=()):
+    return {'columns': dict(columns), 'indexes': list(indexes), 'constraints': list(constraints)}
+
+
+@pytest.fixture
+def pipeline():
+    return UniversalPostgreSQLPipeline()
+
+
+def test_table_names_include_latest_state_tables():
+    assert schema.table_names([ShipmentItem, EventItem]) == [
+        'test_schema_shipment', 'test_schema_shipment_latest', 'test_schema_event',
+    ]
+
+
+def test_plan_new_tables(pipeline):
+    plan = schema.build_plan(pipeline, [ShipmentItem, EventItem], {})
+    assert [table_name for table_name, _, _ in plan] == schema.table_names([ShipmentItem, EventItem])
+    (_, shipment, _), (_, state, _), (_, event, event_notes) = plan
+
+    assert shipment == [
+        "CREATE TABLE test_schema_shipment (status varchar(50), tracking_number varchar(20), weight integer)",
+        "COMMENT ON COLUMN test_schema_shipment.tracking_number IS '运单号'",
+        "CREATE INDEX idx_test_schema_shipment_status ON test_schema_shipment (status)",
+        "ALTER TABLE test_schema_shipment ADD CONSTRAINT uk_test_schema_shipment_tracking_number UNIQUE (tracking_number)",
+    ]
+    # 状态表与其他表一样直接CREATE TABLE（已存在时由计划改为ALTER TABLE）
+    assert state == [
+        "CREATE TABLE test_schema_shipment_latest (tracking_number varchar(20) PRIMARY KEY, status varchar(50), "
+        "state_hash bigint NOT NULL, changed_at timestamp with time zone NOT NULL DEFAULT now())",
+    ]
+    # 分区表：主键包含分区字段，同时创建DEFAULT分区；不含分区字段的唯一约束跳过并提示
+    assert event == [
+        "CREATE TABLE test_schema_event (id SERIAL, code text, created timestamp with time zone, "
+        "PRIMARY KEY (id, created)) PARTITION BY RANGE (created)",
+        "CREATE TABLE IF NOT EXISTS test_schema_event_default PARTITION OF test_schema_event DEFAULT",
+        "ALTER TABLE test_schema_event ADD CONSTRAINT uk_test_schema_event_code_created UNIQUE (code, created)",
+    ]
+    assert event_notes == ["test_schema_event 分区表的唯一约束必须包含分区字段 created，已跳过: uk_test_schema_event_code"]
+
+
+def test_plan_existing_tables(pipeline):
+    catalog = {
+        'test_schema_shipment': snapshot_table(
+            {'tracking_number': 'varchar(20)', 'status': 'varchar(40)'},
+            constraints=['uk_test_schema_shipment_tracking_number'],
+        ),
+        'test_schema_shipment_latest': snapshot_table(
+            {'tracking_number': 'varchar(20)', 'state_hash': 'bigint', 'changed_at': 'timestamp with time zone'},
+        ),
+    }
+    (_, shipment, notes), (_, state, _) = schema.build_plan(pipeline, [ShipmentItem], catalog)
+    # 新字段、新索引；已有的约束不重复创建，类型不一致只提示
+    assert shipment == [
+        "ALTER TABLE test_schema_shipment ADD COLUMN IF NOT EXISTS weight integer",
+        "CREATE INDEX idx_test_schema_shipment_status ON test_schema_shipment (status)",
+    ]
+    assert notes == ["test_schema_shipment.status 数据库类型为 varchar(40)，Item声明为 varchar(50)（不自动修改）"]
+    assert state == ["ALTER TABLE test_schema_shipment_latest ADD COLUMN IF NOT EXISTS status varchar(50)"]
+
+
+def test_plan_up_to_date(pipeline):
+    catalog = {
+        'test_schema_shipment': snapshot_table(
+            {'tracking_number': 'varchar(20)', 'status': 'varchar(50)', 'weight': 'integer'},
+            indexes=['idx_test_schema_shipment_status'],
+            constraints=['uk_test_schema_shipment_tracking_number'],
+        ),
+        'test_schema_shipment_latest': snapshot_table({'tracking_number': 'varchar(20)', 'status': 'varchar(50)'}),
+    }
+    plan = schema.build_plan(pipeline, [ShipmentItem], catalog)
+    assert all(not statements and not notes for _, statements, notes in plan)
+    out = io.StringIO()
+    assert schema.print_plan(plan, out) == 0
+    assert out.getvalue() == "-- 表结构已是最新，无需迁移\n"
+
+
+def test_print_plan(pipeline):
+    out = io.StringIO()
+    total = schema.print_plan(schema.build_plan(pipeline, [EventItem], {}), out)
+    assert total == 3
+    lines = out.getvalue().splitlines()
+    assert lines[0] == "-- 表 test_schema_event"
+    assert lines[1].startswith("-- 注意: ")
+    assert all(line.endswith(';') for line in lines[2:5])
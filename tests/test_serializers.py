@@ -0,0 +1,86 @@
+"""JSON序列化层：后端选择、orjson缺失时的回退与两种实现的一致性"""
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+from scrapy.settings import Settings
+
+from sf_spider import serializers
+
+BACKENDS = [
+    pytest.param('json', id='json'),
+    pytest.param('orjson', id='orjson', marks=pytest.mark.skipif(serializers.orjson is None, reason='未安装orjson')),
+]
+
+DATA = {
+    'tracking_number': '1Z999AA10123456784',
+    'city': '洛杉矶',
+    'count': 3,
+    'weight': 1.5,
+    'delivered': False,
+    'events': [{'time': '2025-09-18 08:15:32', 'location': None}],
+}
+
+
+@pytest.fixture
+def restore_serializer():
+    current = serializers._serializer
+    yield
+    serializers._serializer = current
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_dumps_loads_round_trip(name):
+    serializer = serializers.get_serializer(name)
+    assert serializer.name == name
+    text = serializer.dumps(DATA)
+    assert isinstance(text, str)
+    # 紧凑格式，不转义非ASCII字符
+    assert ', ' not in text and '洛杉矶' in text
+    assert serializer.dumpb(DATA) == text.encode('utf-8')
+    assert serializer.loads(text) == DATA
+    assert serializer.loads(text.encode('utf-8')) == DATA
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_dumps_matches_stdlib(name):
+    serializer = serializers.get_serializer(name)
+    stdlib = serializers.StdlibJSONSerializer()
+    value = {'b': [1, 2], 'a': {'y': 'z', 'x': None}, 'day': date(2025, 9, 18),
+             'at': datetime(2025, 9, 18, 8, 15, 32, tzinfo=timezone.utc)}
+    # 日期时间为ISO格式；sort_keys时键的顺序与标准库一致
+    assert serializer.dumps(value, sort_keys=True) == stdlib.dumps(value, sort_keys=True)
+    assert serializer.dumps(value) == stdlib.dumps(value)
+    assert serializer.loads(serializer.dumps(value))['at'] == '2025-09-18T08:15:32+00:00'
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_dumps_large_integer_and_unknown_types(name):
+    serializer = serializers.get_serializer(name)
+    # orjson不支持超过64位的整数，回退到标准库
+    assert serializer.dumps({'n': 2 ** 70}) == '{"n":%d}' % 2 ** 70
+    # 其他不支持的类型转为字符串
+    assert serializer.dumps([Decimal('1.50')]) == '["1.50"]'
+
+
+def test_auto_prefers_orjson():
+    expected = serializers.OrjsonSerializer if serializers.orjson is not None else serializers.StdlibJSONSerializer
+    assert type(serializers.get_serializer()) is expected
+    assert type(serializers.get_serializer('auto')) is expected
+
+
+def test_fallback_without_orjson(monkeypatch, restore_serializer):
+    monkeypatch.setattr(serializers, 'orjson', None)
+    assert type(serializers.get_serializer()) is serializers.StdlibJSONSerializer
+    with pytest.raises(ImportError):
+        serializers.get_serializer('orjson')
+    # settings未指定时同样回退到标准库
+    assert serializers.configure(Settings()).name == 'json'
+    assert serializers.dumps(DATA) == serializers.StdlibJSONSerializer().dumps(DATA)
+    assert serializers.loads(serializers.dumpb(DATA)) == DATA
+
+
+def test_configure_custom_serializer(restore_serializer):
+    settings = Settings({'JSON_SERIALIZER': 'sf_spider.serializers.StdlibJSONSerializer'})
+    assert isinstance(serializers.configure(settings), serializers.StdlibJSONSerializer)
+    assert serializers.dumps([1]) == '[1]'
@@ -0,0 +1,75 @@
+"""ItemBatch的item_scraped/item_dropped计数"""
+import logging
+
+from scrapy import signals
+from scrapy.settings import Settings
+from scrapy.signalmanager import SignalManager
+from scrapy.statscollectors import MemoryStatsCollector
+
+from sf_spider.items import models
+from sf_spider.items.items import BaseItem
+from sf_spider.items.records import ItemBatch
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+
+class StubCrawler:
+    def __init__(self):
+        self.settings = Settings()
+        self.signals = SignalManager(self)
+        self.stats = MemoryStatsCollector(self)
+
+
+class StubSpider:
+    name = 'test_signals'
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.name)
+        self.crawler = StubCrawler()
+
+
+class CountItem(BaseItem):
+    TABLE = 'test_signals'
+    name = models.StringField()
+
+
+class ArchivePipeline(UniversalPostgreSQLPipeline):
+    """同时启用的第二个PostgreSQL Pipeline（如写入另一个数据库）"""
+
+
+def open_pipelines(spider, *pipeline_classes):
+    pipelines = []
+    for pipeline_cls in pipeline_classes:
+        pipeline = pipeline_cls()
+        pipeline.stats = spider.crawler.stats
+        pipeline._connect_signals(spider)
+        pipelines.append(pipeline)
+    return pipelines
+
+
+def send(spider, signal, item):
+    # Scrapy对每个Item计数一次，Pipeline按ItemBatch的行数补足
+    key = 'item_scraped_count' if signal is signals.item_scraped else 'item_dropped_count'
+    spider.crawler.stats.inc_value(key, spider=spider)
+    spider.crawler.signals.send_catch_log(signal, item=item, response=None, exception=None, spider=spider)
+
+
+def test_item_batch_counts_with_two_pipelines():
+    spider = StubSpider()
+    pipelines = open_pipelines(spider, UniversalPostgreSQLPipeline, ArchivePipeline)  # noqa: F841 信号以弱引用连接，测试期间保持引用
+    stats = spider.crawler.stats
+
+    send(spider, signals.item_scraped, ItemBatch(CountItem, [{'name': str(index)} for index in range(3)]))
+    send(spider, signals.item_scraped, CountItem(name='x'))
+    send(spider, signals.item_scraped, ItemBatch(CountItem, [{'name': 'y'}]))
+    send(spider, signals.item_dropped, ItemBatch(CountItem, [{'name': str(index)} for index in range(5)]))
+
+    # 两个Pipeline都启用时每个ItemBatch只补足一次
+    assert stats.get_value('item_scraped_count') == 5
+    assert stats.get_value('item_dropped_count') == 5
+
+
+def test_connect_signals_without_crawler():
+    spider = StubSpider()
+    spider.crawler = None
+    pipeline = UniversalPostgreSQLPipeline()
+    pipeline._connect_signals(spider)
@@ -0,0 +1,52 @@
+"""暂存表合并语句"""
+from sf_spider import staging
+
+
+def test_merge_sql_without_conflict():
+    sql = staging.merge_sql('t', 't_stg', ('a', 'b'))
+    assert sql == (
+        'WITH moved AS (DELETE FROM t_stg RETURNING a, b, sf_stage_seq) '
+        'INSERT INTO t (a, b) SELECT a, b FROM moved ORDER BY sf_stage_seq'
+    )
+
+
+def test_merge_sql_keeps_last_row_per_key():
+    sql = staging.merge_sql('t', 't_stg', ('k', 'v'), ['k'], 'ON CONFLICT (k) DO UPDATE SET v = EXCLUDED.v')
+    assert sql == (
+        'WITH moved AS (DELETE FROM t_stg RETURNING k, v, sf_stage_seq), '
+        'ranked AS (SELECT *, row_number() OVER (PARTITION BY k ORDER BY sf_stage_seq DESC) AS sf_rank FROM moved) '
+        'INSERT INTO t (k, v) SELECT k, v FROM ranked WHERE sf_rank = 1 OR k IS NULL ORDER BY sf_stage_seq '
+        'ON CONFLICT (k) DO UPDATE SET v = EXCLUDED.v'
+    )
+
+
+def test_merge_sql_keep_first_and_null_keys():
+    sql = staging.merge_sql('t', 't_stg', ('a', 'b', 'v'), ['a', 'b'], 'ON CONFLICT (a, b) DO NOTHING', keep_last=False)
+    assert 'PARTITION BY a, b ORDER BY sf_stage_seq ASC' in sql
+    # 含NULL的键不会冲突，全部保留
+    assert 'WHERE sf_rank = 1 OR a IS NULL OR b IS NULL' in sql
+    assert sql.endswith('ON CONFLICT (a, b) DO NOTHING')
+
+
+def test_merge_sql_seq_range():
+    sql = staging.merge_sql('t', 't_stg', ('a',), seq_range=True)
+    assert sql.startswith('WITH moved AS (DELETE FROM t_stg WHERE sf_stage_seq >= %s AND sf_stage_seq < %s RETURNING')
+    assert sql.count('%s') == 2
+
+
+def test_staging_table_name_fits_identifier_limit():
+    name = staging.staging_table_name('x' * 80, 'gettnship_shipments')
+    assert name.startswith('x' * 40 + '_stg_')
+    assert len(name.encode('utf-8')) <= 63
+
+
+def test_staging_table_name_is_stable_per_spider():
+    # 同一爬虫重启后沿用同一张暂存表，不同爬虫写入同一张目标表时互不干扰
+    assert staging.staging_table_name('t', 'a') == staging.staging_table_name('t', 'a')
+    assert staging.staging_table_name('t', 'a') != staging.staging_table_name('t', 'b')
+
+
+def test_create_staging_sql():
+    create, add_seq = staging.create_staging_sql('t', 't_stg', ('a', 'b'))
+    assert create == 'CREATE UNLOGGED TABLE IF NOT EXISTS t_stg AS SELECT a, b FROM t WITH NO DATA'
+    assert 'sf_stage_seq bigint GENERATED ALWAYS AS IDENTITY' in add_seq
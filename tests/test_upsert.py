@@ -0,0 +1,108 @@
+"""UPSERT写入：批次内冲突行的合并与ON CONFLICT子句"""
+import pytest
+
+from sf_spider.items import models
+from sf_spider.items.items import BaseItem
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+
+class ShipmentItem(BaseItem):
+    TABLE = 'test_upsert'
+    UNIQUE_CONSTRAINTS = [['tracking_number', 'hash_id'], ['status']]
+    ON_CONFLICT = 'update'
+    tracking_number = models.StringField()
+    hash_id = models.StringField()
+    status = models.StringField()
+    update_date = models.StringField()
+
+
+COLUMNS = ('hash_id', 'status', 'tracking_number', 'update_date')
+
+
+@pytest.mark.parametrize('keep_last, expected', [
+    (True, [('h1', 'C', 'T1', 3), ('h2', 'B', 'T1', 2)]),
+    (False, [('h1', 'A', 'T1', 1), ('h2', 'B', 'T1', 2)]),
+])
+def test_collapse_conflicts_within_batch(keep_last, expected):
+    pipeline = UniversalPostgreSQLPipeline()
+    rows = [
+        ('h1', 'A', 'T1', 1),
+        ('h2', 'B', 'T1', 2),
+        ('h1', 'C', 'T1', 3),
+    ]
+    # 冲突键为(tracking_number, hash_id)，同一批次中每个键只保留一行（保持首次出现的位置）
+    assert pipeline._collapse_conflicts(rows, [2, 0], keep_last) == expected
+
+
+def test_collapse_conflicts_keeps_null_keys():
+    pipeline = UniversalPostgreSQLPipeline()
+    rows = [
+        (None, 'A', 'T1', 1),
+        ('h1', 'B', 'T1', 2),
+        (None, 'C', 'T1', 3),
+        ('h1', 'D', 'T1', 4),
+    ]
+    # 含NULL的键在PostgreSQL中不会冲突，全部保留
+    assert pipeline._collapse_conflicts(rows, [2, 0], True) == [
+        ('h1', 'D', 'T1', 4),
+        (None, 'A', 'T1', 1),
+        (None, 'C', 'T1', 3),
+    ]
+
+
+@pytest.mark.parametrize('on_conflict, expected', [
+    ('update', [('h1', 'C', 'T1', 3)]),
+    ('nothing', [('h1', 'A', 'T1', 1)]),
+])
+def test_prepare_upsert_uses_first_constraint(on_conflict, expected):
+    pipeline = UniversalPostgreSQLPipeline()
+    rows = [('h1', 'A', 'T1', 1), ('h1', 'C', 'T1', 3)]
+    conflict_fields, collapsed = pipeline._prepare_upsert(ShipmentItem.TABLE, ShipmentItem, on_conflict, COLUMNS, rows)
+    assert conflict_fields == ('tracking_number', 'hash_id')
+    # DO UPDATE以最后一行为准，DO NOTHING保留第一行（与数据库中先写入的行被保留一致）
+    assert collapsed == expected
+
+
+@pytest.mark.parametrize('on_conflict, columns, message', [
+    ('replace', COLUMNS, '不支持的冲突处理方式'),
+    ('update', ('hash_id', 'status'), '无效的约束配置'),
+])
+def test_conflict_fields_errors(on_conflict, columns, message):
+    pipeline = UniversalPostgreSQLPipeline()
+    with pytest.raises(ValueError, match=message):
+        pipeline._get_conflict_fields(ShipmentItem.TABLE, ShipmentItem, on_conflict, columns)
+
+
+def test_conflict_fields_requires_constraint():
+    class NoConstraintItem(ShipmentItem):
+        UNIQUE_CONSTRAINTS = []
+
+    with pytest.raises(ValueError, match='未配置UNIQUE_CONSTRAINTS'):
+        UniversalPostgreSQLPipeline()._get_conflict_fields('t', NoConstraintItem, 'update', COLUMNS)
+
+
+@pytest.mark.parametrize('columns, on_conflict, expected', [
+    # 更新冲突字段以外的全部列
+    (COLUMNS, 'update',
+     "ON CONFLICT (tracking_number, hash_id) DO UPDATE SET status = EXCLUDED.status, update_date = EXCLUDED.update_date"),
+    # 批次只包含部分字段时只更新这些列，其余列保留数据库中的值
+    (('tracking_number', 'hash_id', 'status'), 'update',
+     "ON CONFLICT (tracking_number, hash_id) DO UPDATE SET status = EXCLUDED.status"),
+    (COLUMNS, 'nothing', "ON CONFLICT (tracking_number, hash_id) DO NOTHING"),
+])
+def test_build_conflict_clause(columns, on_conflict, expected):
+    assert UniversalPostgreSQLPipeline._build_conflict_clause(columns, ('tracking_number', 'hash_id'), on_conflict) == expected
+
+
+def test_build_conflict_clause_without_update_columns():
+    # 批次中只有冲突字段时没有可更新的列，DO UPDATE退化为DO NOTHING
+    clause = UniversalPostgreSQLPipeline._build_conflict_clause(('hash_id', 'tracking_number'), ('tracking_number', 'hash_id'), 'update')
+    assert clause == "ON CONFLICT (tracking_number, hash_id) DO NOTHING"
+
+
+def test_build_upsert_sql():
+    sql = UniversalPostgreSQLPipeline._build_upsert_sql('t', ('k', 'v'), ('k',), 'update', values='($1, $2)')
+    assert sql == "INSERT INTO t (k, v) VALUES ($1, $2) ON CONFLICT (k) DO UPDATE SET v = EXCLUDED.v"
+    assert UniversalPostgreSQLPipeline._build_upsert_sql('t', ('k', 'v'), ('k',), 'nothing').startswith(
+        "INSERT INTO t (k, v) VALUES %s ON CONFLICT"
+    )
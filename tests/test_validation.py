@@ -0,0 +1,83 @@
+"""字段的整列验证（validate_many）与Pipeline写入前的按列验证"""
+from datetime import datetime
+
+import pytest
+
+from sf_spider.items import models
+from sf_spider.items.items import BaseItem
+from sf_spider.pipelines import UniversalPostgreSQLPipeline
+
+
+def test_validate_many_returns_valid_column_unchanged():
+    field = models.StringField(max_length=5)
+    assert field.validate_many(['a', None, 'abcde']) == ['a', None, 'abcde']
+
+
+@pytest.mark.parametrize('field, values, invalid', [
+    (models.StringField(max_length=3), ['abc', 'abcd', None], [1]),
+    (models.IntField(required=True), [1, None, 3], [1]),
+    (models.IntField(), [1, '2', 3], [1]),
+    (models.ListField(item_type=int), [[1, 2], [1, 'x'], None], [1]),
+    (models.DictField(schema={'a': int}), [{'a': 1}, {'a': 'x'}, {'b': 'x'}], [1]),
+    (models.EmailField(), ['a@b.com', 'not-an-email'], [1]),
+    (models.URLField(), ['https://example.com/x', 'not a url'], [1]),
+    (models.ChoiceField(choices=['A', 'B']), ['A', 'C', None, 'B'], [1]),
+    (models.LengthField(min_length=2, max_length=4), ['ab', 'a', 'abcde', 'abcd'], [1, 2]),
+])
+def test_validate_many_collects_errors(field, values, invalid):
+    errors = {}
+    results = field.validate_many(values, errors)
+    assert sorted(errors) == invalid
+    assert len(results) == len(values)
+    for index, value in enumerate(values):
+        assert results[index] == (None if index in invalid else value)
+    # 逐个调用validate()的结果与整列验证一致
+    for index, value in enumerate(values):
+        if index in invalid:
+            with pytest.raises(models.ValidationError):
+                field.validate(value)
+        else:
+            assert field.validate(value) == value
+
+
+def test_validate_many_raises_without_errors_dict():
+    with pytest.raises(models.ValidationError, match='第2个值'):
+        models.IntField().validate_many([1, 'x'])
+
+
+def test_validate_many_applies_validators_and_parser():
+    field = models.StringField(validators=[str.strip])
+    assert field.validate_many([' a ', 'b']) == ['a', 'b']
+    field = models.DatetimeField(parser_func=models.DatetimeParser())
+    assert field.validate_many(['2025-09-18 08:15:32', None]) == [datetime(2025, 9, 18, 8, 15, 32), None]
+
+
+class ValidationItem(BaseItem):
+    TABLE = 'test_validation'
+    name = models.StringField(max_length=5, required=True)
+    count = models.IntField(default=0)
+    updated = models.DatetimeField(parser_func=models.DatetimeParser())
+    status = models.ChoiceField(choices=['A', 'B'])
+
+
+def test_pipeline_validate_rows():
+    pipeline = UniversalPostgreSQLPipeline()
+    pipeline._get_validation_plan(ValidationItem)
+    columns = pipeline.item_columns[ValidationItem]
+    data = [
+        {'name': 'a', 'updated': '2025-09-18 08:15:32', 'status': 'A'},
+        {'count': 1, 'status': 'A'},
+        {'name': 'abcdef', 'count': 1},
+        {'name': 'b', 'count': '7', 'status': 'C'},
+        {'name': 'c', 'count': '8'},
+        {'name': 'd', 'updated': 'not a date'},
+    ]
+    rows, errors = pipeline._validate_rows(ValidationItem, [tuple(row.get(field) for field in columns) for row in data])
+    assert [dict(zip(columns, row)) for row in rows] == [
+        {'name': 'a', 'count': 0, 'updated': datetime(2025, 9, 18, 8, 15, 32), 'status': 'A'},
+        {'name': 'c', 'count': 8, 'updated': None, 'status': None},
+    ]
+    assert sorted(errors) == [1, 2, 3, 5]
+    assert errors[1] == '字段 name 为必填项'
+    assert errors[2] == '字段 name 长度超过限制，最大 5，实际 6'
+    assert errors[3].startswith('字段 status ')